@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Bulk verification of the commuter allowance and Family Bonus Plus.
+Recomputes the amounts a taxpayer is entitled to from raw inputs and
+compares them with what payroll applied. Granting too much makes filing
+mandatory (has_incorrect_commuter_allowance, has_incorrect_family_bonus);
+granting too little is a reason to file voluntarily (has_unclaimed_deductions,
+has_unclaimed_tax_credits). All amounts come from lookup tables built once
+at import, so verification is a handful of fancy-indexing operations.
+"""
+
+from typing import Dict, Optional
+import numpy as np
+
+from compiled_rules import set_flag_column
+
+
+# Commuting distance bands (one way, km): <2, 2-20, 20-40, 40-60, >=60
+DISTANCE_EDGES = np.array([2.0, 20.0, 40.0, 60.0])
+
+# Annual Pendlerpauschale per band; the small one applies when public transport is reasonable
+COMMUTER_TABLE = np.array([
+    [0.0, 0.0, 696.0, 1356.0, 2016.0],     # kleines Pendlerpauschale
+    [0.0, 372.0, 1476.0, 2568.0, 3672.0],  # grosses Pendlerpauschale
+])
+
+# Share of the allowance by commuting days per month: 11+ full, 8-10 two thirds, 4-7 one third
+MAX_COMMUTE_DAYS = 31
+DAY_FRACTION = np.array([0.0] * 4 + [1 / 3] * 4 + [2 / 3] * 3 + [1.0] * (MAX_COMMUTE_DAYS - 10))
+
+# Family Bonus Plus per month and child, up to and from the month of the 18th birthday
+FAMILY_BONUS_MONTHLY_MINOR = 166.68
+FAMILY_BONUS_MONTHLY_ADULT = 58.34
+MAX_CHILD_AGE = 30
+
+
+def _family_bonus_tables():
+    """Annual amounts by [age reached in the year, birth month] for the minor and adult part"""
+    ages = np.arange(MAX_CHILD_AGE + 1)[:, None]
+    months = np.arange(13)[None, :]  # column 0 is unused
+    minor_months = np.where(ages < 18, 12, np.where(ages == 18, months, 0))
+    adult_months = 12 - minor_months
+    minor = np.round(minor_months * FAMILY_BONUS_MONTHLY_MINOR, 2)
+    adult = np.round(adult_months * FAMILY_BONUS_MONTHLY_ADULT, 2)
+    return minor, adult
+
+
+FAMILY_BONUS_MINOR, FAMILY_BONUS_ADULT = _family_bonus_tables()
+
+DEFAULT_TOLERANCE = 1.0
+
+
+def commuter_allowance(distance_km: np.ndarray, public_transport_reasonable: np.ndarray,
+                       commute_days: Optional[np.ndarray] = None) -> np.ndarray:
+    """Annual commuter allowance each person is entitled to"""
+    distance = np.nan_to_num(np.asarray(distance_km, dtype=np.float64))
+    band = np.searchsorted(DISTANCE_EDGES, distance, side="right")
+    large = ~np.asarray(public_transport_reasonable, dtype=bool)
+    amount = COMMUTER_TABLE[large.astype(np.intp), band]
+    if commute_days is not None:
+        days = np.clip(np.asarray(commute_days, dtype=np.intp), 0, MAX_COMMUTE_DAYS)
+        amount = amount * DAY_FRACTION[days]
+    return np.round(amount, 2)
+
+
+def family_bonus(parent_index: np.ndarray, persons: int, child_age: np.ndarray,
+                 birth_month: Optional[np.ndarray] = None,
+                 receives_family_allowance: Optional[np.ndarray] = None,
+                 share: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Annual Family Bonus Plus per person from one row per (parent, child) claim.
+    child_age is the age the child reaches during the year; the adult amount
+    is only due while family allowance is paid (assumed up to 24 by default).
+    share splits a child between two claimants (default: one claimant).
+    """
+    age = np.clip(np.asarray(child_age, dtype=np.intp), 0, MAX_CHILD_AGE)
+    month = np.ones(len(age), dtype=np.intp) if birth_month is None else np.asarray(birth_month, dtype=np.intp)
+    if receives_family_allowance is None:
+        receives_family_allowance = age < 24
+    amount = FAMILY_BONUS_MINOR[age, month] + FAMILY_BONUS_ADULT[age, month] * np.asarray(receives_family_allowance)
+    if share is not None:
+        amount = amount * np.asarray(share, dtype=np.float64)
+    return np.round(np.bincount(np.asarray(parent_index), weights=amount, minlength=persons), 2)
+
+
+def verify_allowances(expected_commuter: np.ndarray, applied_commuter: np.ndarray,
+                      expected_family_bonus: np.ndarray, applied_family_bonus: np.ndarray,
+                      tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, np.ndarray]:
+    """Compare expected and applied amounts and derive the flag columns"""
+    commuter_delta = np.nan_to_num(np.asarray(applied_commuter, dtype=np.float64)) - expected_commuter
+    bonus_delta = np.nan_to_num(np.asarray(applied_family_bonus, dtype=np.float64)) - expected_family_bonus
+    return {
+        "has_incorrect_commuter_allowance": commuter_delta > tolerance,
+        "has_incorrect_family_bonus": bonus_delta > tolerance,
+        "has_unclaimed_deductions": commuter_delta < -tolerance,
+        "has_unclaimed_tax_credits": bonus_delta < -tolerance,
+    }
+
+
+def apply_to_flags(flags: np.ndarray, verified: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Set the verified flag bits in a packed flags column. The unclaimed flags
+    are only ever set, since they may also have other causes.
+    """
+    for field_name in ("has_incorrect_commuter_allowance", "has_incorrect_family_bonus"):
+        flags = set_flag_column(flags, field_name, verified[field_name])
+    for field_name in ("has_unclaimed_deductions", "has_unclaimed_tax_credits"):
+        flags = np.asarray(flags, dtype=np.uint32) | set_flag_column(np.zeros(len(flags), dtype=np.uint32),
+                                                                      field_name, verified[field_name])
+    return flags
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Batch-scoped named graphs.
+Every ingest batch (optionally tagged with a tax year) lives in its own
+graph holding both its asserted facts and the types inferred for them.
+Readers see the union of the shared ontology graph and all batches through
+a read-only aggregate, so dropping or reloading a batch just swaps a
+dictionary entry and publishes a new generation instead of removing triples
+one by one (rdflib's Dataset.remove_graph is linear in the graph size).
+"""
+
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass
+from rdflib import Dataset, Graph, URIRef
+from rdflib.graph import ReadOnlyGraphAggregate
+
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from consistency_validator import ConsistencyValidator
+from session_overlay import OverlayGraph
+
+
+BATCH_NAMESPACE = "urn:austrian-tax:batch:"
+DEFAULT_BATCH = "default"
+HOUSEHOLD_BATCH = "households"
+
+
+def batch_uri(batch_id: str, tax_year: Optional[int] = None) -> URIRef:
+    """Name of the graph holding one batch"""
+    if tax_year is None:
+        return URIRef(f"{BATCH_NAMESPACE}{batch_id}")
+    return URIRef(f"{BATCH_NAMESPACE}{tax_year}:{batch_id}")
+
+
+@dataclass(frozen=True)
+class Batch:
+    """One ingest batch: its graph, validator and bookkeeping"""
+    uri: URIRef
+    batch_id: str
+    tax_year: Optional[int]
+    graph: Graph
+    validator: ConsistencyValidator
+    entities: int
+
+
+class BatchedTaxEngine(TaxReasoningEngine):
+    """
+    Knowledge base split into per-batch named graphs over a shared ontology.
+    The read API of TaxReasoningEngine works unchanged on the union of all
+    batches; plain ingest_entities/add_entity_to_kb write into DEFAULT_BATCH.
+    """
+
+    def __init__(self, shared: TaxReasoningEngine):
+        # The shared engine already parsed and inferred the ontology; batch entities are classified eagerly
+        super().__init__(shared=shared)
+        self.shared = shared
+        self._batches: Dict[URIRef, Batch] = {}
+        self._published = (0, self._union(self._batches))
+
+    def _union(self, batches: Dict[URIRef, Batch]) -> Graph:
+        return ReadOnlyGraphAggregate([self.shared.graph] + [batch.graph for batch in batches.values()])
+
+    def _publish(self, batches: Dict[URIRef, Batch]):
+        self._batches = batches
+        self.graph = self._union(batches)
+
+    def _inference_scope(self, graph: Graph):
+        # Only the batch being ingested is inferred; the shared graph and other batches are already done
+        return graph.overlay_subjects() if isinstance(graph, OverlayGraph) else None
+
+    def compiled_rules(self):
+        return self.shared.compiled_rules()
+
+    def _uses_replaced_rules(self) -> bool:
+        return self.shared._uses_replaced_rules()
+
+    def ingest_entities(self, entities: List[TaxEntity]):
+        self.ingest_batch(DEFAULT_BATCH, entities)
+
+    def add_household_links(self, partners: List[Tuple[str, str]] = (), children: List[Tuple[str, str]] = (),
+                            batch_id: str = HOUSEHOLD_BATCH, tax_year: Optional[int] = None):
+        """
+        Record partner and child relationships in a batch of their own (by default
+        HOUSEHOLD_BATCH), so they survive dropping the batches of the persons they link.
+        Household links do not change the filing classes, so no inference is run.
+        """
+        uri = batch_uri(batch_id, tax_year)
+        with self._write_lock:
+            previous = self._batches.get(uri)
+            graph = Graph(identifier=uri)
+            graph.namespace_manager = self.shared.graph.namespace_manager
+            if previous is not None:
+                Graph.addN(graph, ((s, p, o, graph) for s, p, o in previous.graph))
+            for person_id, partner_id in partners:
+                graph.add((PERSON_KB[person_id], TAX.hasPartner, PERSON_KB[partner_id]))
+                graph.add((PERSON_KB[partner_id], TAX.hasPartner, PERSON_KB[person_id]))
+            for parent_id, child_id in children:
+                graph.add((PERSON_KB[parent_id], TAX.hasChild, PERSON_KB[child_id]))
+            validator = ConsistencyValidator.from_graph(self.shared.graph) if previous is None else previous.validator
+            batches = dict(self._batches)
+            batches[uri] = Batch(uri, batch_id, tax_year, graph, validator,
+                                 previous.entities if previous is not None else 0)
+            self._publish(batches)
+
+    def ingest_batch(self, batch_id: str, entities: Iterable[TaxEntity], tax_year: Optional[int] = None,
+                     replace: bool = False) -> URIRef:
+        """
+        Add entities to a batch (created on first use), running inference on that
+        batch only. With replace=True the previous contents of the batch are discarded.
+        """
+        uri = batch_uri(batch_id, tax_year)
+        entities = list(entities)
+        with self._write_lock:
+            previous = None if replace else self._batches.get(uri)
+            overlay = OverlayGraph(self.shared.graph)
+            validator = ConsistencyValidator.from_graph(self.shared.graph)
+            if previous is not None:
+                Graph.addN(overlay, ((s, p, o, overlay) for s, p, o in previous.graph))
+                validator = previous.validator
+            for entity in entities:
+                self._write_entity(overlay, entity)
+            # Inference reports into the batch's own validator, which is dropped with the batch
+            self.validator = validator
+            self._apply_inference(overlay)
+
+            graph = Graph(identifier=uri)
+            graph.namespace_manager = self.shared.graph.namespace_manager
+            Graph.addN(graph, ((s, p, o, graph) for s, p, o in overlay.overlay_triples()))
+            count = len(entities) + (previous.entities if previous is not None else 0)
+            batches = dict(self._batches)
+            replaced = replace and uri in self._batches
+            batches[uri] = Batch(uri, batch_id, tax_year, graph, validator, count)
+            self._publish(batches)
+            if self._population_counters is not None:
+                if replaced:
+                    # Residents of the old contents may be gone; reseed from the union on next use
+                    self._population_counters = None
+                else:
+                    self._population_counters.update_entities(entities)
+        return uri
+
+    def reload_batch(self, batch_id: str, entities: Iterable[TaxEntity], tax_year: Optional[int] = None) -> URIRef:
+        """Replace a batch with new contents in one generation"""
+        return self.ingest_batch(batch_id, entities, tax_year, replace=True)
+
+    def drop_batch(self, batch_id: str, tax_year: Optional[int] = None) -> bool:
+        """Remove a batch and everything inferred from it; returns whether it existed"""
+        uri = batch_uri(batch_id, tax_year)
+        with self._write_lock:
+            if uri not in self._batches:
+                return False
+            batches = dict(self._batches)
+            del batches[uri]
+            self._publish(batches)
+            self._population_counters = None
+        return True
+
+    def drop_tax_year(self, tax_year: int) -> int:
+        """Remove every batch of a tax year (e.g. for data retention); returns how many"""
+        with self._write_lock:
+            batches = {uri: batch for uri, batch in self._batches.items() if batch.tax_year != tax_year}
+            dropped = len(self._batches) - len(batches)
+            if dropped:
+                self._publish(batches)
+                self._population_counters = None
+        return dropped
+
+    def batches(self, tax_year: Optional[int] = None) -> List[Batch]:
+        """Current batches, optionally restricted to one tax year"""
+        return [batch for batch in self._batches.values() if tax_year is None or batch.tax_year == tax_year]
+
+    def batch_graph(self, batch_id: str, tax_year: Optional[int] = None) -> Graph:
+        """Facts and inferred types of one batch (without the ontology)"""
+        return self._batches[batch_uri(batch_id, tax_year)].graph
+
+    def query_batch(self, sparql: str, batch_id: str, tax_year: Optional[int] = None, **kwargs):
+        """Run SPARQL against the ontology plus a single batch"""
+        graph = ReadOnlyGraphAggregate([self.shared.graph, self.batch_graph(batch_id, tax_year)])
+        return graph.query(sparql, **kwargs)
+
+    def check_consistency(self):
+        return chain.from_iterable(batch.validator.drain() for batch in list(self._batches.values()))
+
+    def to_dataset(self) -> Dataset:
+        """Copy all batches into an rdflib Dataset, one named graph each (e.g. for TriG export)"""
+        dataset = Dataset()
+        for prefix, namespace in self.shared.graph.namespaces():
+            dataset.bind(prefix, namespace)
+        for uri, batch in self._batches.items():
+            named = dataset.graph(uri)
+            named.addN((s, p, o, named) for s, p, o in batch.graph)
+        return dataset
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Compiled filing rules.
+Translates the OWL class definitions of the filer classes into disjunctive
+normal form (income thresholds, flag tests and class references) that can be
+evaluated on a single TaxEntity or vectorized over NumPy columns.
+"""
+
+from typing import Dict, List, Optional, Tuple, Any
+from dataclasses import dataclass
+import numpy as np
+from rdflib import Graph, URIRef, Literal
+from rdflib.collection import Collection
+from rdflib.namespace import RDF, OWL, XSD
+
+from tax_reasoning_engine import TAX, FLAG_PROPERTIES, TaxEntity
+
+
+# Filer classes in priority order, and the bit each one occupies in a membership mask
+FILER_CLASSES = [TAX.MandatoryE1Filer, TAX.MandatoryL1Filer, TAX.VoluntaryL1Filer]
+CLASS_BITS = {class_uri: 1 << i for i, class_uri in enumerate(FILER_CLASSES)}
+
+# Status codes, ordered from least to most demanding
+STATUS_NAMES = ["NoFilingRequired", "VoluntaryFilingL1", "MandatoryFilingL1", "MandatoryFilingE1"]
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+NO_FILING, VOLUNTARY_L1, MANDATORY_L1, MANDATORY_E1 = range(4)
+
+# rdf:type values the reasoner asserts for each filer class
+_DERIVED_BY_CLASS = [
+    (CLASS_BITS[TAX.MandatoryE1Filer], (TAX.MandatoryE1Filer, TAX.MandatoryFilingE1)),
+    (CLASS_BITS[TAX.MandatoryL1Filer], (TAX.MandatoryL1Filer, TAX.MandatoryFilingL1)),
+    (CLASS_BITS[TAX.VoluntaryL1Filer], (TAX.VoluntaryL1Filer, TAX.VoluntaryFilingL1)),
+]
+NO_FILING_TYPES = (TAX.NoFilingRequired,)
+DERIVED_CLASSES = frozenset(c for _, types in _DERIVED_BY_CLASS for c in types) | set(NO_FILING_TYPES)
+
+# Numeric properties and the TaxEntity field they are read from
+NUMERIC_FIELDS = {
+    TAX.hasAnnualWageIncome: "annual_income",
+    TAX.hasNonWageIncome: "has_non_wage_income",
+}
+
+# Flag properties are packed into an integer in FLAG_PROPERTIES order
+FLAG_BITS = {prop: 1 << bit for bit, (_, prop, _) in enumerate(FLAG_PROPERTIES)}
+FLAG_FIELDS = [field_name for field_name, _, _ in FLAG_PROPERTIES]
+DEFAULT_FLAGS = sum(FLAG_BITS[prop] for _, prop, default in FLAG_PROPERTIES if default)
+
+_FACETS = {
+    XSD.minExclusive: ">",
+    XSD.minInclusive: ">=",
+    XSD.maxExclusive: "<",
+    XSD.maxInclusive: "<=",
+}
+
+
+def pack_flags(entity: TaxEntity) -> int:
+    """Pack the boolean TaxEntity fields into an integer bitfield"""
+    flags = 0
+    for field_name, prop, _ in FLAG_PROPERTIES:
+        if getattr(entity, field_name):
+            flags |= FLAG_BITS[prop]
+    return flags
+
+
+def set_flag_column(flags: np.ndarray, field_name: str, values: np.ndarray) -> np.ndarray:
+    """Copy of a packed flags column with one TaxEntity flag replaced by values"""
+    bit = np.uint32(FLAG_BITS[FLAG_PROPERTIES[FLAG_FIELDS.index(field_name)][1]])
+    flags = np.asarray(flags, dtype=np.uint32)
+    return np.where(np.asarray(values, dtype=bool), flags | bit, flags & ~bit).astype(np.uint32)
+
+
+def derived_types(membership: int) -> Tuple[URIRef, ...]:
+    """rdf:type values implied by a filer membership mask"""
+    types = tuple(c for bit, classes in _DERIVED_BY_CLASS if membership & bit for c in classes)
+    return types or NO_FILING_TYPES
+
+
+def status_of(membership: int) -> int:
+    """Map a filer membership mask to its status code (E1 > L1 > Voluntary L1 > none)"""
+    if membership & CLASS_BITS[TAX.MandatoryE1Filer]:
+        return MANDATORY_E1
+    if membership & CLASS_BITS[TAX.MandatoryL1Filer]:
+        return MANDATORY_L1
+    if membership & CLASS_BITS[TAX.VoluntaryL1Filer]:
+        return VOLUNTARY_L1
+    return NO_FILING
+
+
+def status_of_columns(membership: np.ndarray) -> np.ndarray:
+    """Vectorized status_of over a membership column"""
+    status = np.zeros(membership.shape, dtype=np.uint8)
+    status[(membership & CLASS_BITS[TAX.VoluntaryL1Filer]) != 0] = VOLUNTARY_L1
+    status[(membership & CLASS_BITS[TAX.MandatoryL1Filer]) != 0] = MANDATORY_L1
+    status[(membership & CLASS_BITS[TAX.MandatoryE1Filer]) != 0] = MANDATORY_E1
+    return status
+
+
+@dataclass(frozen=True)
+class Threshold:
+    """Comparison of a numeric property against a constant"""
+    prop: URIRef
+    op: str  # ">", ">=", "<" or "<="
+    value: float
+
+    def test(self, x):
+        # Works for floats and NumPy arrays; a missing value (None/NaN) never matches
+        if x is None:
+            return False
+        if self.op == ">":
+            return x > self.value
+        if self.op == ">=":
+            return x >= self.value
+        if self.op == "<":
+            return x < self.value
+        return x <= self.value
+
+    @property
+    def field(self) -> str:
+        return NUMERIC_FIELDS[self.prop]
+
+
+@dataclass(frozen=True)
+class FlagTest:
+    """owl:hasValue restriction on a boolean property"""
+    prop: URIRef
+    value: bool
+
+
+@dataclass(frozen=True)
+class ClassTest:
+    """Membership (or, with negated=True, non-membership) in another filer class"""
+    class_uri: URIRef
+    negated: bool = False
+
+
+@dataclass(frozen=True)
+class Clause:
+    """One conjunctive branch of a class definition"""
+    thresholds: Tuple[Threshold, ...] = ()
+    flags: Tuple[FlagTest, ...] = ()
+    classes: Tuple[ClassTest, ...] = ()
+
+    @property
+    def flag_mask(self) -> int:
+        return sum(FLAG_BITS[f.prop] for f in self.flags)
+
+    @property
+    def flag_bits(self) -> int:
+        return sum(FLAG_BITS[f.prop] for f in self.flags if f.value)
+
+    def describe(self) -> str:
+        """Readable condition, e.g. 'hasAnnualWageIncome > 14517 and hasIncorrectFamilyBonus and not MandatoryE1Filer'"""
+        local = lambda uri: str(uri).split('#')[-1]
+        parts = [f"{local(t.prop)} {t.op} {t.value:g}" for t in self.thresholds]
+        parts += [local(f.prop) if f.value else f"not {local(f.prop)}" for f in self.flags]
+        parts += [f"not {local(c.class_uri)}" if c.negated else local(c.class_uri) for c in self.classes]
+        return " and ".join(parts) or "always"
+
+    def conflicts(self) -> bool:
+        """True if the clause requires a flag to be both true and false"""
+        values = {}
+        for flag in self.flags:
+            if values.setdefault(flag.prop, flag.value) != flag.value:
+                return True
+        return False
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """A filer class as a disjunction of clauses"""
+    class_uri: URIRef
+    clauses: Tuple[Clause, ...]
+
+    @property
+    def name(self) -> str:
+        return str(self.class_uri).split('#')[-1]
+
+    def depends_on(self) -> List[URIRef]:
+        return sorted({c.class_uri for clause in self.clauses for c in clause.classes})
+
+
+class CompiledRuleSet:
+    """
+    Filer rules compiled from the ontology, evaluated in dependency order so
+    complementOf references always see the already computed classes.
+    """
+
+    def __init__(self, rules: List[CompiledRule], version: Optional[str] = None):
+        self.version = version
+        self.rules = self._order(rules)
+        self.by_class = {rule.class_uri: rule for rule in self.rules}
+        # Flattened per-clause masks so evaluation does no attribute lookups
+        self._program = [
+            (CLASS_BITS[rule.class_uri],
+             [(clause.flag_mask, clause.flag_bits, clause.thresholds,
+               sum(CLASS_BITS[c.class_uri] for c in clause.classes if not c.negated),
+               sum(CLASS_BITS[c.class_uri] for c in clause.classes if c.negated))
+              for clause in rule.clauses])
+            for rule in self.rules
+        ]
+        # Every clause is a rule that can fire; rule hit masks use this bit order
+        self.rule_labels = [f"{rule.name}: {clause.describe()}" for rule in self.rules for clause in rule.clauses]
+        if len(self.rule_labels) > 64:
+            raise ValueError(f"{len(self.rule_labels)} rule clauses do not fit a 64-bit rule hit mask")
+
+    @staticmethod
+    def _order(rules: List[CompiledRule]) -> List[CompiledRule]:
+        pending = {rule.class_uri: rule for rule in rules}
+        ordered = []
+        while pending:
+            ready = [uri for uri, rule in pending.items()
+                     if all(dep not in pending for dep in rule.depends_on())]
+            if not ready:
+                raise ValueError(f"Cyclic class references between {sorted(pending)}")
+            for uri in sorted(ready, key=lambda u: FILER_CLASSES.index(u) if u in FILER_CLASSES else len(FILER_CLASSES)):
+                ordered.append(pending.pop(uri))
+        return ordered
+
+    def thresholds(self) -> List[Threshold]:
+        """All distinct numeric thresholds used by the rules"""
+        found = {t for rule in self.rules for clause in rule.clauses for t in clause.thresholds}
+        return sorted(found, key=lambda t: (str(t.prop), t.value, t.op))
+
+    def with_thresholds(self, values: Dict[Tuple[URIRef, float], float],
+                        version: Optional[str] = None) -> "CompiledRuleSet":
+        """Copy of the rules with the thresholds keyed (property, old value) moved to new values"""
+        move = lambda t: Threshold(t.prop, t.op, values.get((t.prop, t.value), t.value))
+        rules = [CompiledRule(rule.class_uri, tuple(
+                     Clause(tuple(move(t) for t in clause.thresholds), clause.flags, clause.classes)
+                     for clause in rule.clauses))
+                 for rule in self.rules]
+        return CompiledRuleSet(rules, version if version is not None else self.version)
+
+    def classify(self, annual_income: Optional[float], non_wage_income: Optional[float], flags: int) -> int:
+        """Evaluate the rules for one taxpayer and return its membership mask"""
+        values = {TAX.hasAnnualWageIncome: annual_income, TAX.hasNonWageIncome: non_wage_income}
+        membership = 0
+        for class_bit, clauses in self._program:
+            for flag_mask, flag_bits, thresholds, required, excluded in clauses:
+                if (flags & flag_mask) != flag_bits:
+                    continue
+                if (membership & required) != required or membership & excluded:
+                    continue
+                if not all(t.test(values[t.prop]) for t in thresholds):
+                    continue
+                membership |= class_bit
+                break
+        return membership
+
+    def classify_entity(self, entity: TaxEntity) -> int:
+        """Membership mask for a TaxEntity"""
+        non_wage = entity.has_non_wage_income if entity.has_non_wage_income is not None else 0.0
+        return self.classify(entity.annual_income, non_wage, pack_flags(entity))
+
+    def classify_columns(self, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                         flags: np.ndarray) -> np.ndarray:
+        """Vectorized classification; NaN incomes never satisfy a threshold"""
+        return self._evaluate_columns(annual_income, non_wage_income, flags)
+
+    def classify_rule_hits(self, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                           flags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Membership masks plus a uint64 mask of the rules (clauses) that fired, in rule_labels order"""
+        hits = np.zeros(len(flags), dtype=np.uint64)
+        return self._evaluate_columns(annual_income, non_wage_income, flags, hits), hits
+
+    def _evaluate_columns(self, annual_income, non_wage_income, flags, hits: Optional[np.ndarray] = None):
+        values = {TAX.hasAnnualWageIncome: annual_income, TAX.hasNonWageIncome: non_wage_income}
+        membership = np.zeros(len(flags), dtype=np.uint8)
+        rule_bit = 0
+        for class_bit, clauses in self._program:
+            matched = np.zeros(len(flags), dtype=bool)
+            for flag_mask, flag_bits, thresholds, required, excluded in clauses:
+                mask = (flags & flag_mask) == flag_bits
+                if required:
+                    mask &= (membership & required) == required
+                if excluded:
+                    mask &= (membership & excluded) == 0
+                for t in thresholds:
+                    mask &= t.test(values[t.prop])
+                matched |= mask
+                if hits is not None:
+                    hits[mask] |= np.uint64(1 << rule_bit)
+                rule_bit += 1
+            membership[matched] |= class_bit
+        return membership
+
+
+def _literal_value(literal: Literal) -> Any:
+    value = literal.toPython()
+    return float(value) if not isinstance(value, bool) else value
+
+
+def _compile_expression(graph: Graph, node, base_class: URIRef) -> List[Clause]:
+    """Translate a class expression into a list of clauses (DNF)"""
+    if isinstance(node, URIRef):
+        if node == base_class:
+            return [Clause()]
+        if node in CLASS_BITS:
+            return [Clause(classes=(ClassTest(node),))]
+        raise ValueError(f"Unsupported class reference {node}")
+
+    members = graph.value(node, OWL.intersectionOf)
+    if members is not None:
+        clauses = [Clause()]
+        for part in Collection(graph, members):
+            branches = _compile_expression(graph, part, base_class)
+            clauses = [Clause(a.thresholds + b.thresholds, a.flags + b.flags, a.classes + b.classes)
+                       for a in clauses for b in branches]
+        return [c for c in clauses if not c.conflicts()]
+
+    members = graph.value(node, OWL.unionOf)
+    if members is not None:
+        return [clause for part in Collection(graph, members)
+                for clause in _compile_expression(graph, part, base_class)]
+
+    complement = graph.value(node, OWL.complementOf)
+    if complement is not None:
+        if complement not in CLASS_BITS:
+            raise ValueError(f"complementOf is only supported for filer classes, got {complement}")
+        return [Clause(classes=(ClassTest(complement, negated=True),))]
+
+    prop = graph.value(node, OWL.onProperty)
+    if prop is not None:
+        has_value = graph.value(node, OWL.hasValue)
+        if has_value is not None:
+            if prop not in FLAG_BITS:
+                raise ValueError(f"hasValue is only supported for flag properties, got {prop}")
+            return [Clause(flags=(FlagTest(prop, bool(has_value.toPython())),))]
+        datatype = graph.value(node, OWL.someValuesFrom)
+        if datatype is not None and prop in NUMERIC_FIELDS:
+            facets = graph.value(datatype, OWL.withRestrictions)
+            thresholds = []
+            for facet in Collection(graph, facets) if facets is not None else []:
+                for facet_prop, value in graph.predicate_objects(facet):
+                    if facet_prop in _FACETS:
+                        thresholds.append(Threshold(prop, _FACETS[facet_prop], _literal_value(value)))
+            return [Clause(thresholds=tuple(thresholds))]
+
+    raise ValueError(f"Unsupported class expression {node}")
+
+
+def compile_rules(graph: Graph, base_class: URIRef = TAX.AustrianResident) -> CompiledRuleSet:
+    """Compile the owl:equivalentClass definitions of the filer classes in an ontology graph"""
+    rules = []
+    for class_uri in FILER_CLASSES:
+        clauses = []
+        for definition in graph.objects(class_uri, OWL.equivalentClass):
+            clauses.extend(_compile_expression(graph, definition, base_class))
+        if clauses:
+            rules.append(CompiledRule(class_uri, tuple(clauses)))
+    version = None
+    for ontology in graph.subjects(RDF.type, OWL.Ontology):
+        version = graph.value(ontology, OWL.versionInfo)
+        if version is not None:
+            version = str(version)
+            break
+    return CompiledRuleSet(rules, version)
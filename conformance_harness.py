@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Differential conformance harness for the filing classification paths.
+Runs the same taxpayers through the graph reasoner, the compiled rules
+(scalar and vectorized) and the columnar store path, reports every
+disagreement and shrinks it to a minimal failing TaxEntity.
+
+The compiled paths check every case; the graph reasoner is orders of
+magnitude slower, so it checks a random sample of each chunk plus every row
+on which the fast paths already disagree.
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from itertools import product
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field
+import numpy as np
+
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, FLAG_PROPERTIES, TAX
+from compiled_rules import (CompiledRuleSet, FLAG_BITS, DEFAULT_FLAGS, STATUS_NAMES, STATUS_CODES,
+                            pack_flags, status_of, status_of_columns)
+from threshold_analysis import relevant_flag_fields, boundary_points, DEFAULT_RESOLUTION
+
+
+PATHS = ("graph", "scalar", "vectorized", "store")
+
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray]  # annual_income, non_wage_income, flags
+
+
+@dataclass
+class Disagreement:
+    """One taxpayer on which the paths return different statuses"""
+    entity: TaxEntity
+    statuses: Dict[str, str]
+    original: Optional[TaxEntity] = None  # the case before shrinking
+
+    def describe(self) -> str:
+        facts = [f"annual_income={self.entity.annual_income}",
+                 f"has_non_wage_income={self.entity.has_non_wage_income}"]
+        for field_name, _, default in FLAG_PROPERTIES:
+            if getattr(self.entity, field_name) != default:
+                facts.append(f"{field_name}={getattr(self.entity, field_name)}")
+        outcome = ", ".join(f"{path}={status}" for path, status in self.statuses.items())
+        return f"{', '.join(facts)}: {outcome}"
+
+
+@dataclass
+class ConformanceReport:
+    """Aggregated result of a harness run"""
+    cases: int = 0
+    graph_cases: int = 0
+    disagreements: List[Disagreement] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.disagreements
+
+    def merge(self, other: "ConformanceReport"):
+        self.cases += other.cases
+        self.graph_cases += other.graph_cases
+        self.disagreements.extend(other.disagreements)
+
+
+def entity_from_row(row_id: str, annual_income: float, non_wage_income: float, flags: int) -> TaxEntity:
+    """Build a TaxEntity from one columnar row (NaN wage means no wage income)"""
+    values = {field_name: bool(flags & FLAG_BITS[prop]) for field_name, prop, _ in FLAG_PROPERTIES}
+    return TaxEntity(
+        id=row_id,
+        name=row_id,
+        entity_type="Person",
+        annual_income=None if np.isnan(annual_income) else float(annual_income),
+        has_non_wage_income=float(non_wage_income),
+        is_austrian_resident=True,
+        **values
+    )
+
+
+def boundary_values(rules: CompiledRuleSet, prop, resolution: float = DEFAULT_RESOLUTION) -> List[float]:
+    """Both sides of every threshold on one income, plus zero (and NaN for the wage)"""
+    values = {0.0}
+    for t in rules.thresholds():
+        if t.prop == prop:
+            values.update(boundary_points(t.op, t.value, resolution))
+    values = sorted(values)
+    values.append(values[-1] + 10000.0)
+    if prop == TAX.hasAnnualWageIncome:
+        values.append(np.nan)
+    return values
+
+
+def exhaustive_cases(rules: CompiledRuleSet, chunk_size: int = 1 << 16) -> Iterator[Chunk]:
+    """Every combination of rule-relevant flags with every boundary income pair"""
+    props = {field_name: prop for field_name, prop, _ in FLAG_PROPERTIES}
+    bits = [FLAG_BITS[props[field_name]] for field_name in relevant_flag_fields(rules)]
+    base = DEFAULT_FLAGS & ~sum(bits)
+    flag_values = np.array([base | sum(b for b, on in zip(bits, combo) if on)
+                            for combo in product((False, True), repeat=len(bits))], dtype=np.uint32)
+    incomes = list(product(boundary_values(rules, TAX.hasAnnualWageIncome),
+                           boundary_values(rules, TAX.hasNonWageIncome)))
+    wage = np.repeat([w for w, _ in incomes], len(flag_values))
+    non_wage = np.repeat([n for _, n in incomes], len(flag_values))
+    flags = np.tile(flag_values, len(incomes))
+    for start in range(0, len(flags), chunk_size):
+        end = start + chunk_size
+        yield wage[start:end], non_wage[start:end], flags[start:end]
+
+
+def random_cases(count: int, seed: int = 0, near_threshold_share: float = 0.3) -> Iterator[Chunk]:
+    """Synthetic population rows, weighted towards the filing thresholds"""
+    from population_generator import PopulationConfig, iter_blocks
+
+    config = PopulationConfig(seed=seed, near_threshold_share=near_threshold_share)
+    for _, wage, non_wage, flags in iter_blocks(count, config):
+        yield wage, non_wage, flags
+
+
+class ConformanceChecker:
+    """Evaluates chunks on every path; one instance per worker process"""
+
+    def __init__(self, ontology_path: str = "austrian_tax_ontology_resident_only.ttl",
+                 paths: Sequence[str] = PATHS, graph_sample: int = 256, seed: int = 0,
+                 rules: Optional[CompiledRuleSet] = None):
+        """With rules given and no graph path, the ontology is not loaded at all"""
+        self.paths = [p for p in PATHS if p in paths]
+        self.engine = None
+        if rules is None or "graph" in self.paths:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.engine = TaxReasoningEngine(ontology_path=ontology_path)
+        self.rules = rules if rules is not None else self.engine.compiled_rules()
+        self.graph_sample = graph_sample
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self._runners: Dict[str, Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]] = {
+            "graph": self.run_graph,
+            "scalar": self.run_scalar,
+            "vectorized": self.run_vectorized,
+            "store": self.run_store,
+        }
+
+    def run_scalar(self, wage: np.ndarray, non_wage: np.ndarray, flags: np.ndarray) -> np.ndarray:
+        # Plain Python values keep per-row overhead close to what a scalar caller pays
+        classify = self.rules.classify
+        return np.array([status_of(classify(None if w != w else w, n, f))
+                         for w, n, f in zip(wage.tolist(), non_wage.tolist(), flags.tolist())], dtype=np.uint8)
+
+    def run_vectorized(self, wage: np.ndarray, non_wage: np.ndarray, flags: np.ndarray) -> np.ndarray:
+        return status_of_columns(self.rules.classify_columns(wage, non_wage, flags))
+
+    def run_store(self, wage: np.ndarray, non_wage: np.ndarray, flags: np.ndarray) -> np.ndarray:
+        from taxpayer_store import ColumnarStoreWriter, ColumnarTaxpayerStore, classify_store
+
+        with tempfile.TemporaryDirectory() as path:
+            with ColumnarStoreWriter(path) as writer:
+                writer.append_columns([f"case_{i}" for i in range(len(flags))], wage, non_wage, flags)
+            store = ColumnarTaxpayerStore(path)
+            return classify_store(store, self.rules, out=np.empty(store.count, dtype=np.uint8))
+
+    def run_graph(self, wage: np.ndarray, non_wage: np.ndarray, flags: np.ndarray) -> np.ndarray:
+        entities = [entity_from_row(f"case_{i}", w, n, int(f))
+                    for i, (w, n, f) in enumerate(zip(wage, non_wage, flags))]
+        with contextlib.redirect_stdout(io.StringIO()), self.engine.session() as session:
+            session.ingest_entities(entities)
+            return np.array([STATUS_CODES[session.determine_filing_requirement(e.id)["filing_requirement"]]
+                             for e in entities], dtype=np.uint8)
+
+    def statuses(self, entity: TaxEntity) -> Dict[str, str]:
+        """Status of a single entity on every configured path"""
+        wage = np.array([np.nan if entity.annual_income is None else entity.annual_income])
+        non_wage = np.array([entity.has_non_wage_income or 0.0])
+        flags = np.array([pack_flags(entity)], dtype=np.uint32)
+        return {path: STATUS_NAMES[int(self._runners[path](wage, non_wage, flags)[0])] for path in self.paths}
+
+    def graph_sample_rows(self, count: int, chunk_index: Optional[int] = None) -> np.ndarray:
+        """
+        Mask of the rows of a chunk that the graph reasoner checks. With a chunk
+        index the sample depends on (seed, chunk_index) only, so it is the same
+        whichever worker process gets the chunk.
+        """
+        rng = self.rng if chunk_index is None else np.random.default_rng([self.seed, chunk_index])
+        sample = np.zeros(count, dtype=bool)
+        sample[rng.choice(count, min(self.graph_sample, count), replace=False)] = True
+        return sample
+
+    def check(self, chunk: Chunk, chunk_index: Optional[int] = None) -> ConformanceReport:
+        """Run one chunk through all paths and shrink every disagreement"""
+        wage, non_wage, flags = (np.asarray(c) for c in chunk)
+        report = ConformanceReport(cases=len(flags))
+        results = {path: self._runners[path](wage, non_wage, flags) for path in self.paths if path != "graph"}
+
+        suspicious = np.zeros(len(flags), dtype=bool)
+        reference = next(iter(results.values()), None)
+        for status in results.values():
+            suspicious |= status != reference
+        if "graph" in self.paths:
+            rows = np.flatnonzero(self.graph_sample_rows(len(flags), chunk_index) | suspicious)
+            graph = self._runners["graph"](wage[rows], non_wage[rows], flags[rows])
+            report.graph_cases = len(rows)
+            for status in results.values():
+                suspicious[rows] |= graph != status[rows]
+
+        for row in np.flatnonzero(suspicious):
+            original = entity_from_row(f"case_{row}", wage[row], non_wage[row], int(flags[row]))
+            report.disagreements.append(self.shrink(original))
+        return report
+
+    def disagrees(self, entity: TaxEntity) -> Optional[Dict[str, str]]:
+        statuses = self.statuses(entity)
+        return statuses if len(set(statuses.values())) > 1 else None
+
+    def shrink(self, entity: TaxEntity) -> Disagreement:
+        """
+        Greedily simplify a failing entity while the paths still disagree:
+        reset flags to their defaults, drop incomes, then snap incomes to thresholds.
+        """
+        current = entity
+        statuses = self.disagrees(current)
+        if statuses is None:
+            return Disagreement(entity, self.statuses(entity), original=entity)
+        wage_points = [None, 0.0] + [v for v in boundary_values(self.rules, TAX.hasAnnualWageIncome) if not np.isnan(v)]
+        non_wage_points = [0.0] + boundary_values(self.rules, TAX.hasNonWageIncome)
+
+        changed = True
+        while changed:
+            changed = False
+            candidates = [{field_name: default} for field_name, _, default in FLAG_PROPERTIES
+                          if getattr(current, field_name) != default]
+            candidates += [{"annual_income": v} for v in wage_points]
+            candidates += [{"has_non_wage_income": v} for v in non_wage_points]
+            for change in candidates:
+                attr, value = next(iter(change.items()))
+                if getattr(current, attr) == value or not self._simpler(attr, value, getattr(current, attr)):
+                    continue
+                candidate = TaxEntity(**{**current.__dict__, **change})
+                found = self.disagrees(candidate)
+                if found is not None:
+                    current, statuses, changed = candidate, found, True
+        return Disagreement(current, statuses, original=entity)
+
+    @staticmethod
+    def _simpler(attr: str, value, old) -> bool:
+        """Only accept moves towards a smaller case so shrinking terminates"""
+        if attr in ("annual_income", "has_non_wage_income"):
+            # No income at all is the simplest value
+            if old is None:
+                return False
+            return value is None or abs(value) < abs(old)
+        return True
+
+
+_checker: Optional[ConformanceChecker] = None
+
+
+def _init_worker(ontology_path: str, paths: Sequence[str], graph_sample: int, seed: int):
+    global _checker
+    _checker = ConformanceChecker(ontology_path, paths, graph_sample, seed)
+
+
+def _check_chunk(indexed: Tuple[int, Chunk]) -> ConformanceReport:
+    chunk_index, chunk = indexed
+    return _checker.check(chunk, chunk_index)
+
+
+def run_conformance(chunks: Iterator[Chunk], ontology_path: str = "austrian_tax_ontology_resident_only.ttl",
+                    paths: Sequence[str] = PATHS, graph_sample: int = 256, processes: Optional[int] = None,
+                    seed: int = 0) -> ConformanceReport:
+    """Check all chunks, in parallel worker processes unless processes == 1"""
+    started = time.perf_counter()
+    report = ConformanceReport()
+    if processes == 1:
+        checker = ConformanceChecker(ontology_path, paths, graph_sample, seed)
+        for chunk_index, chunk in enumerate(chunks):
+            report.merge(checker.check(chunk, chunk_index))
+    else:
+        with Pool(processes, initializer=_init_worker,
+                  initargs=(ontology_path, tuple(paths), graph_sample, seed)) as pool:
+            # Graph samples are drawn per chunk index, so the run does not depend on the worker count
+            for part in pool.imap(_check_chunk, enumerate(chunks)):
+                report.merge(part)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Check that all classification paths agree")
+    parser.add_argument("--ontology", default="austrian_tax_ontology_resident_only.ttl")
+    parser.add_argument("--random", type=int, default=1_000_000, help="number of random cases")
+    parser.add_argument("--no-exhaustive", action="store_true", help="skip the exhaustive boundary cases")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--graph-sample", type=int, default=256, help="graph-checked rows per chunk")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        rules = TaxReasoningEngine(ontology_path=args.ontology).compiled_rules()
+
+    def chunks():
+        if not args.no_exhaustive:
+            yield from exhaustive_cases(rules)
+        yield from random_cases(args.random, seed=args.seed)
+
+    report = run_conformance(chunks(), args.ontology, args.paths, args.graph_sample, args.processes, args.seed)
+    print(f"Checked {report.cases} cases ({report.graph_cases} through the graph reasoner) "
+          f"in {report.seconds:.1f}s")
+    for disagreement in report.disagreements[:20]:
+        print(f"  DISAGREEMENT {disagreement.describe()}")
+    if report.disagreements:
+        print(f"{len(report.disagreements)} disagreement(s)")
+    raise SystemExit(0 if report.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Incremental consistency validation for inferred filer classifications.
+Checks the ontology's DisjointClasses axioms and the filing priority hierarchy
+on per-class membership bitmaps as types are inferred.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+from rdflib import Graph, URIRef
+from rdflib.collection import Collection
+from rdflib.namespace import RDF, OWL
+
+from tax_namespaces import TAX
+
+
+# Priority hierarchy from the ontology: MandatoryE1Filer > MandatoryL1Filer > VoluntaryL1Filer.
+# NoFilingRequired is the implicit bottom rung asserted by the engine when nothing else applies.
+FILER_PRIORITY = [
+    TAX.MandatoryE1Filer,
+    TAX.MandatoryL1Filer,
+    TAX.VoluntaryL1Filer,
+    TAX.NoFilingRequired,
+]
+
+
+@dataclass(frozen=True)
+class ConsistencyViolation:
+    """A pair of classes that must not hold together for one entity"""
+    entity: URIRef
+    kind: str  # "disjoint" (declared axiom) or "priority" (hierarchy only)
+    classes: Tuple[URIRef, URIRef]
+    preferred: URIRef  # class that wins according to the priority hierarchy
+
+    @property
+    def entity_id(self) -> str:
+        return str(self.entity).split('#')[-1]
+
+    def describe(self) -> str:
+        names = [str(c).split('#')[-1] for c in self.classes]
+        return (f"{self.entity_id}: {self.kind} violation between {names[0]} and {names[1]} "
+                f"(expected {str(self.preferred).split('#')[-1]})")
+
+
+def read_disjoint_pairs(graph: Graph) -> List[Tuple[URIRef, URIRef]]:
+    """Collect pairwise disjointness from owl:AllDisjointClasses and owl:disjointWith"""
+    pairs = set()
+    for axiom in graph.subjects(RDF.type, OWL.AllDisjointClasses):
+        members = graph.value(axiom, OWL.members)
+        if members is None:
+            continue
+        classes = list(Collection(graph, members))
+        for i, first in enumerate(classes):
+            for second in classes[i + 1:]:
+                pairs.add(tuple(sorted((first, second))))
+    for first, _, second in graph.triples((None, OWL.disjointWith, None)):
+        pairs.add(tuple(sorted((first, second))))
+    return sorted(pairs)
+
+
+class ConsistencyValidator:
+    """
+    Tracks class membership as one bitmap per class, indexed by entity position.
+    Each observed type assertion is checked against the bitmaps of its
+    conflicting classes in O(1); violations are queued and consumed as a stream.
+    """
+
+    def __init__(self, disjoint_pairs: List[Tuple[URIRef, URIRef]],
+                 priority: Optional[List[URIRef]] = None):
+        self.priority = list(FILER_PRIORITY if priority is None else priority)
+        self._rank = {cls: rank for rank, cls in enumerate(self.priority)}
+
+        # conflicts[cls] -> list of (other class, kind)
+        self.conflicts: Dict[URIRef, List[Tuple[URIRef, str]]] = {}
+        declared = set()
+        for first, second in disjoint_pairs:
+            declared.add(frozenset((first, second)))
+            self._add_conflict(first, second, "disjoint")
+        for i, first in enumerate(self.priority):
+            for second in self.priority[i + 1:]:
+                if frozenset((first, second)) not in declared:
+                    self._add_conflict(first, second, "priority")
+
+        self._bitmaps: Dict[URIRef, bytearray] = {cls: bytearray() for cls in self.conflicts}
+        self._index: Dict[URIRef, int] = {}
+        self._entities: List[URIRef] = []
+        self._pending: List[ConsistencyViolation] = []
+        self.violation_count = 0
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> "ConsistencyValidator":
+        """Build a validator from the disjointness axioms declared in an ontology graph"""
+        return cls(read_disjoint_pairs(graph))
+
+    def _add_conflict(self, first: URIRef, second: URIRef, kind: str):
+        self.conflicts.setdefault(first, []).append((second, kind))
+        self.conflicts.setdefault(second, []).append((first, kind))
+
+    def _slot(self, entity: URIRef) -> int:
+        idx = self._index.get(entity)
+        if idx is None:
+            idx = len(self._entities)
+            self._index[entity] = idx
+            self._entities.append(entity)
+        return idx
+
+    @staticmethod
+    def _get(bitmap: bytearray, idx: int) -> bool:
+        byte = idx >> 3
+        return byte < len(bitmap) and bool(bitmap[byte] & (1 << (idx & 7)))
+
+    @staticmethod
+    def _set(bitmap: bytearray, idx: int, value: bool):
+        byte = idx >> 3
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte - len(bitmap) + 1))
+        if value:
+            bitmap[byte] |= 1 << (idx & 7)
+        else:
+            bitmap[byte] &= ~(1 << (idx & 7)) & 0xFF
+
+    def _preferred(self, first: URIRef, second: URIRef) -> URIRef:
+        return min((first, second), key=lambda c: self._rank.get(c, len(self._rank)))
+
+    def _violation(self, entity: URIRef, first: URIRef, second: URIRef, kind: str) -> ConsistencyViolation:
+        pair = tuple(sorted((first, second), key=lambda c: self._rank.get(c, len(self._rank))))
+        return ConsistencyViolation(entity, kind, pair, self._preferred(first, second))
+
+    def observe(self, entity: URIRef, class_uri: URIRef) -> List[ConsistencyViolation]:
+        """Record that entity has been typed with class_uri and return any new violations"""
+        bitmap = self._bitmaps.get(class_uri)
+        if bitmap is None:
+            return []
+        idx = self._slot(entity)
+        if self._get(bitmap, idx):
+            return []
+        self._set(bitmap, idx, True)
+
+        found = []
+        for other, kind in self.conflicts[class_uri]:
+            if self._get(self._bitmaps[other], idx):
+                found.append(self._violation(entity, class_uri, other, kind))
+        self._pending.extend(found)
+        self.violation_count += len(found)
+        return found
+
+    def retract(self, entity: URIRef, class_uri: URIRef):
+        """Clear a membership bit, e.g. when an entity is reclassified"""
+        bitmap = self._bitmaps.get(class_uri)
+        idx = self._index.get(entity)
+        if bitmap is not None and idx is not None:
+            self._set(bitmap, idx, False)
+
+    def is_member(self, entity: URIRef, class_uri: URIRef) -> bool:
+        bitmap = self._bitmaps.get(class_uri)
+        idx = self._index.get(entity)
+        return bitmap is not None and idx is not None and self._get(bitmap, idx)
+
+    def drain(self) -> Iterator[ConsistencyViolation]:
+        """Yield and clear the violations found since the last drain"""
+        pending, self._pending = self._pending, []
+        yield from pending
+
+    def audit(self) -> Iterator[ConsistencyViolation]:
+        """Full check over all tracked entities by intersecting whole bitmaps"""
+        seen = set()
+        for first, others in self.conflicts.items():
+            for second, kind in others:
+                key = frozenset((first, second))
+                if key in seen:
+                    continue
+                seen.add(key)
+                both = (int.from_bytes(self._bitmaps[first], "little")
+                        & int.from_bytes(self._bitmaps[second], "little"))
+                while both:
+                    low = both & -both
+                    yield self._violation(self._entities[low.bit_length() - 1], first, second, kind)
+                    both ^= low
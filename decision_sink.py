@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Durable classification decisions.
+A DecisionSink keeps one row per (entity id, tax year) in a local SQLite
+database: the filing status, the mask of rules that fired (bit i is
+CompiledRuleSet.rule_labels[i]), the ontology version and when the decision
+was made. Bulk rows are buffered and written with one executemany upsert per
+batch in WAL mode, so downstream readers can query the table while bulk runs
+keep writing; single decisions are committed right away.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from compiled_rules import CompiledRuleSet, STATUS_NAMES, STATUS_CODES
+from taxpayer_store import classify_chunks
+
+
+DEFAULT_BATCH_SIZE = 50000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    entity_id TEXT NOT NULL,
+    tax_year INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    rule_mask INTEGER NOT NULL,
+    ontology_version TEXT,
+    decided_at TEXT NOT NULL,
+    PRIMARY KEY (entity_id, tax_year)
+) WITHOUT ROWID
+"""
+
+_UPSERT = """
+INSERT INTO decisions (entity_id, tax_year, status, rule_mask, ontology_version, decided_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (entity_id, tax_year) DO UPDATE SET
+    status = excluded.status,
+    rule_mask = excluded.rule_mask,
+    ontology_version = excluded.ontology_version,
+    decided_at = excluded.decided_at
+"""
+
+Row = Tuple[str, int, str, int, Optional[str], str]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _signed(masks: np.ndarray) -> List[int]:
+    # SQLite integers are signed 64-bit; rule 63 is stored in the sign bit
+    return np.asarray(masks, dtype=np.uint64).view(np.int64).tolist()
+
+
+class DecisionSink:
+    """Buffered upserts of classification decisions into SQLite"""
+
+    def __init__(self, path: str, tax_year: int, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.tax_year = tax_year
+        self.batch_size = batch_size
+        self.written = 0
+        self._pending: List[Row] = []
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent with NORMAL; only the last commits can be lost on power failure
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._connection.commit()
+
+    def record(self, entity_id: str, status: str, rule_mask: int, ontology_version: Optional[str] = None,
+               tax_year: Optional[int] = None):
+        """Write one decision (together with anything still queued), visible to other connections on return"""
+        self._extend([(entity_id, self.tax_year if tax_year is None else tax_year, status,
+                       _signed(np.array([rule_mask]))[0], ontology_version, _now())], flush=True)
+
+    def record_columns(self, entity_ids: Sequence[str], status: np.ndarray, rule_masks: np.ndarray,
+                       ontology_version: Optional[str] = None, tax_year: Optional[int] = None):
+        """Queue decisions given as status codes and rule hit masks, one per entity id"""
+        if not len(entity_ids) == len(status) == len(rule_masks):
+            raise ValueError("entity_ids, status and rule_masks must have the same length")
+        year = self.tax_year if tax_year is None else tax_year
+        names = np.array(STATUS_NAMES, dtype=object)[np.asarray(status)].tolist()
+        decided_at = _now()
+        self._extend([(entity_id, year, name, mask, ontology_version, decided_at)
+                      for entity_id, name, mask in zip(entity_ids, names, _signed(rule_masks))])
+
+    def record_store(self, store, rules: CompiledRuleSet, tax_year: Optional[int] = None,
+                     chunk_size: int = DEFAULT_BATCH_SIZE, out: Optional[np.ndarray] = None) -> int:
+        """
+        Classify every row of a columnar taxpayer store and record the decisions;
+        returns the row count. The status codes are also written into out if given,
+        so callers that need them do not classify the store a second time.
+        """
+        for start, status, hits in classify_chunks(store, rules, chunk_size, rule_hits=True):
+            if out is not None:
+                out[start:start + len(status)] = status
+            ids = store.entity_ids(start, start + len(status))
+            self.record_columns(ids, status, hits, rules.version, tax_year)
+        if isinstance(out, np.memmap):
+            out.flush()
+        self.flush()
+        return store.count
+
+    def _extend(self, rows: List[Row], flush: bool = False):
+        with self._lock:
+            self._pending.extend(rows)
+            if flush or len(self._pending) >= self.batch_size:
+                self._write()
+
+    def _write(self):
+        rows, self._pending = self._pending, []
+        with self._connection:
+            self._connection.executemany(_UPSERT, rows)
+        self.written += len(rows)
+
+    def flush(self):
+        """Write all queued decisions"""
+        with self._lock:
+            if self._pending:
+                self._write()
+
+    def decision(self, entity_id: str, tax_year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Stored decision of an entity (queued ones are flushed first)"""
+        self.flush()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status, rule_mask, ontology_version, decided_at FROM decisions "
+                "WHERE entity_id = ? AND tax_year = ?",
+                (entity_id, self.tax_year if tax_year is None else tax_year)).fetchone()
+        if row is None:
+            return None
+        status, mask, version, decided_at = row
+        return {"status": status, "status_code": STATUS_CODES[status], "rule_mask": mask & (2 ** 64 - 1),
+                "ontology_version": version, "decided_at": decided_at}
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> "DecisionSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Household joins for the single-earner and single-parent credits.
+The Alleinverdienerabsetzbetrag and Alleinerzieherabsetzbetrag depend on a
+partner's income and on children, i.e. on links between persons. Instead of
+one SPARQL join per person, the whole population is joined at once: person
+ids are hashed into a row index, every link list is probed against it, and
+child counts are aggregated with bincount.
+"""
+
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+from dataclasses import dataclass
+import numpy as np
+from rdflib import Graph
+from rdflib.namespace import RDF
+
+from tax_reasoning_engine import TAX, PERSON_KB
+from compiled_rules import set_flag_column
+
+
+NO_CREDIT, SINGLE_EARNER, SINGLE_PARENT = range(3)
+UNKNOWN_PARTNER = -2  # partner is not part of the joined population
+NO_PARTNER = -1
+
+DEFAULT_TOLERANCE = 1.0
+
+
+@dataclass(frozen=True)
+class HouseholdCredits:
+    """Credit parameters for one year"""
+    year: int
+    partner_income_limit: float  # single-earner credit only while the partner earns at most this
+    one_child: float
+    two_children: float
+    per_further_child: float
+
+    def amounts(self, children: np.ndarray) -> np.ndarray:
+        """Credit amount by number of children"""
+        children = np.asarray(children)
+        return np.where(children <= 0, 0.0,
+                        np.where(children == 1, self.one_child,
+                                 self.two_children + np.maximum(children - 2, 0) * self.per_further_child))
+
+
+CREDIT_YEARS: Dict[int, HouseholdCredits] = {
+    2024: HouseholdCredits(2024, partner_income_limit=6937.0, one_child=572.0, two_children=774.0,
+                           per_further_child=255.0),
+    2025: HouseholdCredits(2025, partner_income_limit=7284.0, one_child=601.0, two_children=813.0,
+                           per_further_child=268.0),
+}
+
+
+@dataclass
+class Households:
+    """Result of joining household links onto a population"""
+    person_ids: List[str]
+    partner_row: np.ndarray  # NO_PARTNER, UNKNOWN_PARTNER or the partner's row
+    children: np.ndarray  # number of distinct children of the person and their partner together
+
+    @property
+    def has_partner(self) -> np.ndarray:
+        return self.partner_row != NO_PARTNER
+
+
+def join_households(person_ids: Sequence[str], partners: Iterable[Tuple[str, str]],
+                    children: Iterable[Tuple[str, str]]) -> Households:
+    """Hash-join partner and child links onto the population rows"""
+    row_of = {person_id: row for row, person_id in enumerate(person_ids)}
+    partner_row = np.full(len(person_ids), NO_PARTNER, dtype=np.int64)
+    for person_id, partner_id in partners:
+        for a, b in ((person_id, partner_id), (partner_id, person_id)):
+            row = row_of.get(a)
+            if row is not None:
+                partner_row[row] = row_of.get(b, UNKNOWN_PARTNER)
+
+    # Children belong to the couple, whichever partner the link was recorded on: count
+    # distinct (household, child) pairs, a household being keyed by its lower row
+    rows = np.arange(len(person_ids), dtype=np.int64)
+    household = np.where(partner_row >= 0, np.minimum(rows, partner_row), rows)
+    links = {(int(household[row_of[parent_id]]), child_id) for parent_id, child_id in children
+             if parent_id in row_of}
+    counts = np.bincount(np.fromiter((key for key, _ in links), dtype=np.int64, count=len(links)),
+                         minlength=len(person_ids))
+    return Households(list(person_ids), partner_row, counts[household])
+
+
+def entitled_credits(households: Households, income: np.ndarray,
+                     year: Union[int, HouseholdCredits] = 2025) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Credit kind and amount each person is entitled to. The single-earner
+    credit goes to the higher earner of a couple whose partner stays under
+    the limit (on equal incomes, to the partner listed first); a person
+    without a partner gets the single-parent credit.
+    Amounts are NaN where the partner's income is unknown.
+    """
+    params = year if isinstance(year, HouseholdCredits) else CREDIT_YEARS[year]
+    income = np.nan_to_num(np.asarray(income, dtype=np.float64))
+    partner = households.partner_row
+    known = partner >= 0
+    partner_income = np.where(known, income[np.where(known, partner, 0)], np.inf)
+    first_listed = np.arange(len(partner)) < partner
+    higher_earner = (income > partner_income) | ((income == partner_income) & first_listed)
+    with_children = households.children > 0
+
+    kind = np.full(len(partner), NO_CREDIT, dtype=np.uint8)
+    kind[with_children & (partner == NO_PARTNER)] = SINGLE_PARENT
+    single_earner = (with_children & known & (partner_income <= params.partner_income_limit)
+                     & higher_earner)
+    kind[single_earner] = SINGLE_EARNER
+
+    amount = np.where(kind != NO_CREDIT, params.amounts(households.children), 0.0)
+    amount[partner == UNKNOWN_PARTNER] = np.nan
+    return kind, amount
+
+
+def verify_credits(entitled: np.ndarray, applied: np.ndarray,
+                   tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, np.ndarray]:
+    """Compare the credits applied by payroll with the entitlement (NaN never flags)"""
+    delta = np.nan_to_num(np.asarray(applied, dtype=np.float64)) - entitled
+    with np.errstate(invalid="ignore"):
+        return {
+            "has_incorrect_tax_credits": delta > tolerance,
+            "has_unclaimed_tax_credits": delta < -tolerance,
+        }
+
+
+def apply_to_flags(flags: np.ndarray, verified: Dict[str, np.ndarray]) -> np.ndarray:
+    """Set the verified flag bits; both flags may have other causes, so they are never cleared"""
+    flags = np.asarray(flags, dtype=np.uint32)
+    zeros = np.zeros(len(flags), dtype=np.uint32)
+    for field_name in ("has_incorrect_tax_credits", "has_unclaimed_tax_credits"):
+        flags = flags | set_flag_column(zeros, field_name, verified[field_name])
+    return flags
+
+
+def _local_id(uri) -> str:
+    return str(uri)[len(str(PERSON_KB)):]
+
+
+def household_links(graph: Graph) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Partner and child links stored in a knowledge base graph, one triple scan each"""
+    partners = [(_local_id(s), _local_id(o)) for s, _, o in graph.triples((None, TAX.hasPartner, None))]
+    children = [(_local_id(s), _local_id(o)) for s, _, o in graph.triples((None, TAX.hasChild, None))]
+    return partners, children
+
+
+def verify_graph_households(graph: Graph, applied: Dict[str, float],
+                            year: Union[int, HouseholdCredits] = 2025,
+                            tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, Dict[str, bool]]:
+    """
+    Run the household checks on every resident of a knowledge base graph.
+    applied maps entity ids to the single-earner/single-parent credit payroll applied.
+    Returns the derived flags per entity id.
+    """
+    person_ids = [_local_id(s) for s in graph.subjects(RDF.type, TAX.AustrianResident)
+                  if str(s).startswith(str(PERSON_KB))]
+    incomes: Dict[str, float] = {}
+    for prop in (TAX.hasAnnualWageIncome, TAX.hasNonWageIncome):
+        for s, _, value in graph.triples((None, prop, None)):
+            key = _local_id(s)
+            incomes[key] = incomes.get(key, 0.0) + float(value)
+
+    households = join_households(person_ids, *household_links(graph))
+    income = np.array([incomes.get(person_id, 0.0) for person_id in person_ids])
+    _, amount = entitled_credits(households, income, year)
+    verified = verify_credits(amount, np.array([applied.get(person_id, 0.0) for person_id in person_ids]),
+                              tolerance)
+    return {person_id: {field_name: bool(values[row]) for field_name, values in verified.items()}
+            for row, person_id in enumerate(person_ids)}
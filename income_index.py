@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Sorted numeric index over the income properties.
+For hasAnnualWageIncome and hasNonWageIncome every (value, subject) pair of
+a graph generation is kept in value order, so range and near-threshold
+cohort lookups are two binary searches instead of a FILTER over every
+resident. Indexes are immutable per generation; ingest derives the next one
+by inserting only the new pairs.
+
+Once install_filter_pushdown() has run (TaxReasoningEngine.income_index does
+this), registered indexes are also used by SPARQL: a FILTER of numeric
+comparisons on the object of an indexed income triple pattern is answered by
+seeding the BGP with the index candidates (the FILTER is still applied).
+"""
+
+import weakref
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from rdflib import Graph, Literal, URIRef, Variable
+from rdflib.plugins.sparql import CUSTOM_EVALS
+from rdflib.plugins.sparql.evaluate import evalBGP
+from rdflib.plugins.sparql.evalutils import _ebv
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import AlreadyBound
+
+from tax_reasoning_engine import TAX
+
+
+INDEXED_PROPERTIES = (TAX.hasAnnualWageIncome, TAX.hasNonWageIncome)
+
+Range = Tuple[Optional[float], Optional[float]]
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value.toPython() if isinstance(value, Literal) else value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SortedNumericIndex:
+    """(value, subject, literal) triples of one property, ordered by value"""
+
+    def __init__(self, values: np.ndarray, subjects: np.ndarray, literals: np.ndarray,
+                 objects_of: Dict[URIRef, Tuple[Literal, ...]]):
+        self.values = values
+        self.subjects = subjects
+        self.literals = literals
+        self._objects_of = objects_of
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[URIRef, Literal]]) -> "SortedNumericIndex":
+        rows = [(number, subject, literal) for subject, literal in pairs
+                if (number := _number(literal)) is not None]
+        values = np.array([row[0] for row in rows], dtype=np.float64)
+        order = np.argsort(values, kind="stable")
+        subjects = np.empty(len(rows), dtype=object)
+        literals = np.empty(len(rows), dtype=object)
+        subjects[:] = [rows[i][1] for i in order]
+        literals[:] = [rows[i][2] for i in order]
+        objects_of: Dict[URIRef, Tuple[Literal, ...]] = {}
+        for _, subject, literal in rows:
+            objects_of[subject] = objects_of.get(subject, ()) + (literal,)
+        return cls(values[order], subjects, literals, objects_of)
+
+    def with_pairs(self, pairs: Iterable[Tuple[URIRef, Literal]]) -> "SortedNumericIndex":
+        """New index with the pairs added (pairs already present are ignored)"""
+        objects_of = dict(self._objects_of)
+        added = []
+        for subject, literal in pairs:
+            number = _number(literal)
+            if number is None or literal in objects_of.get(subject, ()):
+                continue
+            objects_of[subject] = objects_of.get(subject, ()) + (literal,)
+            added.append((number, subject, literal))
+        if not added:
+            return SortedNumericIndex(self.values, self.subjects, self.literals, objects_of)
+        added.sort(key=lambda row: row[0])
+        new_values = np.array([row[0] for row in added], dtype=np.float64)
+        positions = np.searchsorted(self.values, new_values, side="right")
+        new_subjects = np.empty(len(added), dtype=object)
+        new_literals = np.empty(len(added), dtype=object)
+        new_subjects[:] = [row[1] for row in added]
+        new_literals[:] = [row[2] for row in added]
+        return SortedNumericIndex(np.insert(self.values, positions, new_values),
+                                  np.insert(self.subjects, positions, new_subjects),
+                                  np.insert(self.literals, positions, new_literals), objects_of)
+
+    def bounds(self, low: Optional[float] = None, high: Optional[float] = None,
+               include_low: bool = True, include_high: bool = True) -> Tuple[int, int]:
+        """Slice [start, stop) of the entries within the range"""
+        start = 0 if low is None else int(np.searchsorted(self.values, low, side="left" if include_low else "right"))
+        stop = len(self.values) if high is None else \
+            int(np.searchsorted(self.values, high, side="right" if include_high else "left"))
+        return start, max(start, stop)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class IncomeIndex:
+    """Income indexes of one graph generation"""
+
+    def __init__(self, generation: int, indexes: Dict[URIRef, SortedNumericIndex]):
+        self.generation = generation
+        self.indexes = indexes
+
+    @classmethod
+    def from_graph(cls, graph: Graph, generation: int) -> "IncomeIndex":
+        indexes = {prop: SortedNumericIndex.build((s, o) for s, _, o in graph.triples((None, prop, None)))
+                   for prop in INDEXED_PROPERTIES}
+        return register(graph, cls(generation, indexes))
+
+    def updated(self, graph: Graph, subjects: Iterable[URIRef], generation: int) -> "IncomeIndex":
+        """Index of the next generation, given the subjects whose facts were written"""
+        subjects = list(subjects)
+        indexes = {prop: index.with_pairs((s, o) for s in subjects for o in graph.objects(s, prop))
+                   for prop, index in self.indexes.items()}
+        return register(graph, IncomeIndex(generation, indexes))
+
+    def range(self, prop: URIRef, low: Optional[float] = None, high: Optional[float] = None,
+              include_low: bool = True, include_high: bool = True) -> List[URIRef]:
+        """Subjects with a value of prop in the range, in value order"""
+        index = self.indexes[prop]
+        start, stop = index.bounds(low, high, include_low, include_high)
+        return list(index.subjects[start:stop])
+
+    def count(self, prop: URIRef, low: Optional[float] = None, high: Optional[float] = None,
+              include_low: bool = True, include_high: bool = True) -> int:
+        start, stop = self.indexes[prop].bounds(low, high, include_low, include_high)
+        return stop - start
+
+    def cohort(self, wage: Optional[Range] = None, non_wage: Optional[Range] = None) -> Set[URIRef]:
+        """Subjects within both (inclusive) ranges; a range left as None is not restricted"""
+        result: Optional[Set[URIRef]] = None
+        for prop, bounds in ((TAX.hasAnnualWageIncome, wage), (TAX.hasNonWageIncome, non_wage)):
+            if bounds is None:
+                continue
+            subjects = set(self.range(prop, *bounds))
+            result = subjects if result is None else result & subjects
+        if result is None:
+            raise ValueError("A cohort needs at least one income range")
+        return result
+
+
+# Graph generation -> its index, consulted by the SPARQL pushdown
+_REGISTRY: "weakref.WeakKeyDictionary[Graph, IncomeIndex]" = weakref.WeakKeyDictionary()
+
+
+def register(graph: Graph, index: IncomeIndex) -> IncomeIndex:
+    """Make the index available to SPARQL queries on graph (the graph must not change afterwards)"""
+    _REGISTRY[graph] = index
+    return index
+
+
+_OPERATORS = {">": "low", ">=": "low", "<": "high", "<=": "high", "=": "both"}
+_FLIPPED = {">": "<", ">=": "<=", "<": ">", "<=": ">=", "=": "="}
+
+
+def _conjuncts(expr) -> Iterable:
+    if isinstance(expr, CompValue) and expr.name == "ConditionalAndExpression":
+        yield from _conjuncts(expr.expr)
+        for other in expr.other or ():
+            yield from _conjuncts(other)
+    else:
+        yield expr
+
+
+def range_constraints(expr) -> Dict[Variable, List[Optional[float]]]:
+    """Inclusive [low, high] bounds the top-level conjuncts of a FILTER put on variables"""
+    constraints: Dict[Variable, List[Optional[float]]] = {}
+    for term in _conjuncts(expr):
+        if not (isinstance(term, CompValue) and term.name == "RelationalExpression" and term.op in _OPERATORS):
+            continue
+        left, op, right = term.expr, term.op, term.other
+        if isinstance(right, Variable) and isinstance(left, Literal):
+            left, right, op = right, left, _FLIPPED[op]
+        if not (isinstance(left, Variable) and isinstance(right, Literal)):
+            continue
+        number = _number(right)
+        if number is None:
+            continue
+        bounds = constraints.setdefault(left, [None, None])
+        if _OPERATORS[op] in ("low", "both"):
+            bounds[0] = number if bounds[0] is None else max(bounds[0], number)
+        if _OPERATORS[op] in ("high", "both"):
+            bounds[1] = number if bounds[1] is None else min(bounds[1], number)
+    return constraints
+
+
+def _evaluate_filter(ctx, part):
+    """CUSTOM_EVALS hook: FILTER over a BGP with an indexed income pattern"""
+    if part.name != "Filter" or part.p is None or part.p.name != "BGP" or part.no_isolated_scope:
+        raise NotImplementedError()
+    index = _REGISTRY.get(ctx.graph) if isinstance(ctx.graph, Graph) else None
+    if index is None:
+        raise NotImplementedError()
+    constraints = range_constraints(part.expr)
+    best = None
+    for triple in part.p.triples:
+        subject, prop, obj = triple
+        if prop in index.indexes and isinstance(obj, Variable) and obj in constraints and ctx[obj] is None:
+            start, stop = index.indexes[prop].bounds(*constraints[obj])
+            if best is None or stop - start < best[1] - best[0]:
+                best = (start, stop, triple)
+    if best is None:
+        raise NotImplementedError()
+    return _seeded(ctx, part, *best, index)
+
+
+def _seeded(ctx, part, start, stop, triple, index):
+    subject, prop, obj = triple
+    entries = index.indexes[prop]
+    rest = [t for t in part.p.triples if t is not triple]
+    # Blank nodes in a BGP are variables too; the context resolves both (and returns constants as is)
+    bound = ctx[subject]
+    for row in range(start, stop):
+        c = ctx.push()
+        try:
+            if bound is None:
+                c[subject] = entries.subjects[row]
+            elif bound != entries.subjects[row]:
+                continue
+            c[obj] = entries.literals[row]
+        except AlreadyBound:
+            continue
+        for solution in evalBGP(c, rest):
+            if _ebv(part.expr, solution.forget(ctx, _except=part._vars)):
+                yield solution
+
+
+def install_filter_pushdown():
+    """Let rdflib answer range FILTERs from registered indexes (idempotent)"""
+    CUSTOM_EVALS["income_range_index"] = _evaluate_filter
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Austrian progressive income tax estimates.
+Applies the year's tariff, the Verkehrsabsetzbetrag, the non-wage allowance
+and the SV refund (negative tax) to whole populations at once, so voluntary
+filers can be ranked by expected refund. Amounts are annual and in euro;
+wage income is the taxable wage base, as in the filing thresholds.
+
+These are estimates: special payments taxed at fixed rates (13th/14th
+salary), allowances beyond the credits modelled here and monthly wage tax
+rounding are not taken into account.
+"""
+
+from typing import Dict, Optional, Tuple, Union
+from dataclasses import dataclass
+import numpy as np
+
+from tax_reasoning_engine import TaxEntity, TAX
+from compiled_rules import CompiledRuleSet, FLAG_BITS, VOLUNTARY_L1, pack_flags, status_of_columns
+
+
+ArrayLike = Union[float, np.ndarray]
+
+# Employee social insurance contributions relative to the taxable wage base
+DEFAULT_SV_RATE = 0.22
+
+
+@dataclass(frozen=True)
+class TaxYear:
+    """Tariff and credit parameters for one assessment year"""
+    year: int
+    limits: Tuple[float, ...]  # upper bounds of every bracket but the last
+    rates: Tuple[float, ...]  # one marginal rate per bracket
+    traffic_credit: float  # Verkehrsabsetzbetrag
+    traffic_credit_supplement: float  # Zuschlag for low incomes
+    supplement_full_up_to: float
+    supplement_none_from: float
+    sv_refund_cap: float
+    sv_refund_rate: float = 0.55
+    non_wage_allowance: float = 730.0  # Veranlagungsfreibetrag
+
+    def __post_init__(self):
+        if len(self.rates) != len(self.limits) + 1:
+            raise ValueError(f"Tax year {self.year}: expected {len(self.limits) + 1} rates, got {len(self.rates)}")
+        if list(self.limits) != sorted(self.limits):
+            raise ValueError(f"Tax year {self.year}: bracket limits must be increasing")
+
+    def bracket_bases(self) -> np.ndarray:
+        """Tax due at the lower bound of each bracket"""
+        lower = np.concatenate(([0.0], self.limits))
+        widths = np.diff(lower)
+        return np.concatenate(([0.0], np.cumsum(widths * np.asarray(self.rates[:-1]))))
+
+
+TAX_YEARS: Dict[int, TaxYear] = {
+    2024: TaxYear(
+        year=2024,
+        limits=(12816.0, 20818.0, 34513.0, 66612.0, 99266.0, 1000000.0),
+        rates=(0.0, 0.20, 0.30, 0.40, 0.48, 0.50, 0.55),
+        traffic_credit=463.0,
+        traffic_credit_supplement=726.0,
+        supplement_full_up_to=18499.0,
+        supplement_none_from=28326.0,
+        sv_refund_cap=1550.0,
+    ),
+    2025: TaxYear(
+        year=2025,
+        limits=(13308.0, 21617.0, 35836.0, 69166.0, 103072.0, 1000000.0),
+        rates=(0.0, 0.20, 0.30, 0.40, 0.48, 0.50, 0.55),
+        traffic_credit=487.0,
+        traffic_credit_supplement=790.0,
+        supplement_full_up_to=19424.0,
+        supplement_none_from=29743.0,
+        sv_refund_cap=1633.0,
+    ),
+}
+
+
+def tax_year(year: Union[int, TaxYear]) -> TaxYear:
+    """Look up the parameters for a year (TaxYear instances pass through)"""
+    if isinstance(year, TaxYear):
+        return year
+    if year not in TAX_YEARS:
+        raise ValueError(f"No tax parameters for {year}; known years: {sorted(TAX_YEARS)}")
+    return TAX_YEARS[year]
+
+
+def _income(values: ArrayLike) -> np.ndarray:
+    """Income as a float array; missing values (None/NaN) count as zero"""
+    array = np.asarray(values, dtype=np.float64)
+    return np.maximum(np.nan_to_num(array), 0.0)
+
+
+def tariff_tax(income: ArrayLike, year: Union[int, TaxYear] = 2025) -> np.ndarray:
+    """Progressive tariff on a taxable income"""
+    params = tax_year(year)
+    income = _income(income)
+    lower = np.concatenate(([0.0], params.limits))
+    bracket = np.searchsorted(params.limits, income, side="left")
+    rates = np.asarray(params.rates)
+    return params.bracket_bases()[bracket] + (income - lower[bracket]) * rates[bracket]
+
+
+def non_wage_allowance(non_wage_income: ArrayLike, year: Union[int, TaxYear] = 2025) -> np.ndarray:
+    """
+    Veranlagungsfreibetrag: non-wage income up to the allowance is tax free,
+    and the allowance shrinks euro for euro above it (gone at twice the allowance).
+    """
+    params = tax_year(year)
+    non_wage = _income(non_wage_income)
+    allowance = params.non_wage_allowance
+    return np.clip(2 * allowance - non_wage, 0.0, np.minimum(non_wage, allowance))
+
+
+def traffic_credit(annual_income: ArrayLike, year: Union[int, TaxYear] = 2025) -> np.ndarray:
+    """Verkehrsabsetzbetrag plus its supplement, phased out linearly over the supplement band"""
+    params = tax_year(year)
+    wage = _income(annual_income)
+    band = params.supplement_none_from - params.supplement_full_up_to
+    share = np.clip((params.supplement_none_from - wage) / band, 0.0, 1.0)
+    credit = params.traffic_credit + params.traffic_credit_supplement * share
+    return np.where(wage > 0.0, credit, 0.0)
+
+
+def sv_refund(annual_income: ArrayLike, year: Union[int, TaxYear] = 2025,
+              sv_contributions: Optional[ArrayLike] = None, sv_rate: float = DEFAULT_SV_RATE) -> np.ndarray:
+    """Maximum SV refund (negative tax): a share of the contributions, capped"""
+    params = tax_year(year)
+    if sv_contributions is None:
+        contributions = _income(annual_income) * sv_rate
+    else:
+        contributions = _income(sv_contributions)
+    return np.minimum(contributions * params.sv_refund_rate, params.sv_refund_cap)
+
+
+def withheld_tax(annual_income: ArrayLike, year: Union[int, TaxYear] = 2025) -> np.ndarray:
+    """Wage tax an employer withholds on a steady wage (tariff minus Verkehrsabsetzbetrag)"""
+    wage = _income(annual_income)
+    return np.maximum(tariff_tax(wage, year) - traffic_credit(wage, year), 0.0)
+
+
+def assessed_tax(annual_income: ArrayLike, non_wage_income: ArrayLike = 0.0,
+                 year: Union[int, TaxYear] = 2025, deductions: ArrayLike = 0.0,
+                 sv_eligible: ArrayLike = False, sv_contributions: Optional[ArrayLike] = None,
+                 sv_rate: float = DEFAULT_SV_RATE) -> np.ndarray:
+    """
+    Income tax after assessment. Negative values are SV refunds paid out to
+    eligible taxpayers whose credits exceed the tariff tax.
+    """
+    wage = _income(annual_income)
+    non_wage = _income(non_wage_income)
+    taxable = np.maximum(wage + non_wage - non_wage_allowance(non_wage, year) - _income(deductions), 0.0)
+    tax = tariff_tax(taxable, year) - traffic_credit(wage, year)
+    refund_floor = np.where(np.asarray(sv_eligible, dtype=bool),
+                            -sv_refund(wage, year, sv_contributions, sv_rate), 0.0)
+    return np.maximum(tax, refund_floor)
+
+
+def refund_estimate(annual_income: ArrayLike, non_wage_income: ArrayLike = 0.0,
+                    flags: Optional[ArrayLike] = None, year: Union[int, TaxYear] = 2025,
+                    deductions: ArrayLike = 0.0, withheld: Optional[ArrayLike] = None,
+                    sv_contributions: Optional[ArrayLike] = None,
+                    sv_rate: float = DEFAULT_SV_RATE) -> np.ndarray:
+    """
+    Expected refund (positive) or payment (negative) from filing.
+    SV refund eligibility is read from the packed flags; withheld tax
+    defaults to what a single steady employment would have withheld.
+    """
+    wage = _income(annual_income)
+    if flags is None:
+        eligible = False
+    else:
+        eligible = (np.asarray(flags) & FLAG_BITS[TAX.hasSVRepaymentEligibility]) != 0
+    if withheld is None:
+        withheld = withheld_tax(wage, year)
+    assessed = assessed_tax(wage, non_wage_income, year, deductions, eligible, sv_contributions, sv_rate)
+    return _income(withheld) - assessed
+
+
+def estimate_entity(entity: TaxEntity, year: Union[int, TaxYear] = 2025,
+                    deductions: float = 0.0) -> Dict[str, float]:
+    """Tax breakdown for a single TaxEntity"""
+    wage = entity.annual_income or 0.0
+    non_wage = entity.has_non_wage_income or 0.0
+    flags = pack_flags(entity)
+    eligible = bool(flags & FLAG_BITS[TAX.hasSVRepaymentEligibility])
+    return {
+        "year": tax_year(year).year,
+        "tariff_tax": float(tariff_tax(wage + non_wage - float(non_wage_allowance(non_wage, year)) - deductions, year)),
+        "traffic_credit": float(traffic_credit(wage, year)),
+        "withheld_tax": float(withheld_tax(wage, year)),
+        "assessed_tax": float(assessed_tax(wage, non_wage, year, deductions, eligible)),
+        "refund": float(refund_estimate(wage, non_wage, flags, year, deductions)),
+    }
+
+
+def rank_voluntary_refunds(rules: CompiledRuleSet, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                           flags: np.ndarray, year: Union[int, TaxYear] = 2025,
+                           top: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows classified VoluntaryFilingL1, ordered by expected refund (largest first).
+    Returns (row indices, refunds); top limits the result without a full sort.
+    """
+    status = status_of_columns(rules.classify_columns(annual_income, non_wage_income, flags))
+    rows = np.flatnonzero(status == VOLUNTARY_L1)
+    refunds = refund_estimate(annual_income[rows], non_wage_income[rows], flags[rows], year)
+    if top is not None and top < len(rows):
+        keep = np.argpartition(-refunds, top)[:top]
+        rows, refunds = rows[keep], refunds[keep]
+    order = np.argsort(-refunds, kind="stable")
+    return rows[order], refunds[order]
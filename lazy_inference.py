@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Lazy (backward-chaining) classification.
+A LazyInferenceGraph stores only asserted facts. Filer and filing types are
+derived from the compiled rules the first time a triple pattern asks for
+them, and memoized per entity until one of its triples is added or removed.
+Ingest becomes pure writes; only entities that are actually read are
+classified. A LazyOverlayGraph takes those writes without copying the
+published generation.
+"""
+
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import RDF
+
+from tax_reasoning_engine import TAX, FLAG_PROPERTIES
+from compiled_rules import CompiledRuleSet, FLAG_BITS, DERIVED_CLASSES, derived_types
+
+
+# A lazy overlay is flattened into a full copy once it holds more than 1/FLATTEN_RATIO of its base
+FLATTEN_RATIO = 8
+
+
+class LazyInferenceGraph(Graph):
+    """
+    Graph of asserted facts that answers rdf:type patterns for residents
+    with types derived on demand. len() counts asserted triples only.
+    """
+
+    def __init__(self, rules: Callable[[], CompiledRuleSet]):
+        super().__init__()
+        self._rules = rules
+        self._memo: Dict[URIRef, Tuple[URIRef, ...]] = {}
+        self.classified = 0  # entities classified (memo misses), for monitoring
+
+    @classmethod
+    def copy_of(cls, graph: Graph, rules: Callable[[], CompiledRuleSet]) -> "LazyInferenceGraph":
+        """Writable copy of the asserted triples of graph, keeping its memo"""
+        lazy = LazyInferenceGraph(rules)
+        lazy.namespace_manager = graph.namespace_manager
+        if isinstance(graph, LazyInferenceGraph):
+            Graph.addN(lazy, ((s, p, o, lazy) for s, p, o in graph.asserted_triples()))
+            lazy._memo = graph._memo_items()
+        else:
+            Graph.addN(lazy, ((s, p, o, lazy) for s, p, o in graph))
+        return lazy
+
+    def asserted_triples(self, triple=(None, None, None)):
+        """Stored triples only, without derived types"""
+        return Graph.triples(self, triple)
+
+    def _memo_items(self) -> Dict[URIRef, Tuple[URIRef, ...]]:
+        return dict(self._memo)
+
+    def _memo_get(self, subject) -> Optional[Tuple[URIRef, ...]]:
+        return self._memo.get(subject)
+
+    def _memo_put(self, subject, types: Tuple[URIRef, ...]):
+        self._memo[subject] = types
+
+    def forget(self, subject):
+        """Drop the derived types of subject, e.g. after its rules changed"""
+        self._memo.pop(subject, None)
+
+    def add(self, triple):
+        self._memo.pop(triple[0], None)
+        return super().add(triple)
+
+    def addN(self, quads):
+        for s, p, o, _ in quads:
+            self.add((s, p, o))
+        return self
+
+    def remove(self, triple):
+        if triple[0] is None:
+            self._memo.clear()
+        else:
+            self._memo.pop(triple[0], None)
+        return super().remove(triple)
+
+    def _is_resident(self, subject) -> bool:
+        return any(True for _ in self.asserted_triples((subject, RDF.type, TAX.AustrianResident)))
+
+    def _stored_value(self, subject, prop) -> Optional[Literal]:
+        for _, _, value in self.asserted_triples((subject, prop, None)):
+            return value
+        return None
+
+    def types_of(self, subject: URIRef) -> Tuple[URIRef, ...]:
+        """Derived filer and filing types of a resident (memoized)"""
+        types = self._memo_get(subject)
+        if types is None:
+            wage = self._stored_value(subject, TAX.hasAnnualWageIncome)
+            non_wage = self._stored_value(subject, TAX.hasNonWageIncome)
+            flags = 0
+            rules = self._rules()
+            for _, prop, default in FLAG_PROPERTIES:
+                value = self._stored_value(subject, prop)
+                if (default if value is None else bool(value.toPython())):
+                    flags |= FLAG_BITS[prop]
+            membership = rules.classify(None if wage is None else float(wage),
+                                        0.0 if non_wage is None else float(non_wage), flags)
+            types = derived_types(membership)
+            self._memo_put(subject, types)
+            self.classified += 1
+        return types
+
+    def triples(self, triple) -> Iterator[Tuple]:
+        s, p, o = triple
+        yield from self.asserted_triples(triple)
+        if p not in (None, RDF.type) or (o is not None and o not in DERIVED_CLASSES):
+            return
+        if s is None:
+            subjects = [subject for subject, _, _ in self.asserted_triples((None, RDF.type, TAX.AustrianResident))]
+        elif self._is_resident(s):
+            subjects = [s]
+        else:
+            return
+        for subject in subjects:
+            for class_uri in self.types_of(subject):
+                if o is not None and class_uri != o:
+                    continue
+                derived = (subject, RDF.type, class_uri)
+                # Skip types that are also asserted, they were yielded above
+                if not any(True for _ in self.asserted_triples(derived)):
+                    yield derived
+
+
+class LazyOverlayGraph(LazyInferenceGraph):
+    """
+    Writable lazy graph over a published LazyInferenceGraph, the lazy
+    counterpart of session_overlay.OverlayGraph: reads see base + overlay,
+    writes go to the overlay, and removed base triples are only hidden.
+    Derived types of subjects the overlay never touched are shared with the
+    base memo; touched subjects are memoized here.
+    """
+
+    def __init__(self, base: LazyInferenceGraph, rules: Callable[[], CompiledRuleSet]):
+        super().__init__(rules)
+        self.base = base
+        self.namespace_manager = base.namespace_manager
+        self.hidden = set()  # base triples removed through this overlay
+        self._touched: Set[URIRef] = set()  # subjects whose base memo entry no longer applies
+        self._base_memo = True  # False once a wildcard remove invalidated every memo entry
+
+    @classmethod
+    def over(cls, graph: Graph, rules: Callable[[], CompiledRuleSet]) -> LazyInferenceGraph:
+        """
+        Writable next generation of graph without copying its asserted triples.
+        An existing overlay is copied instead of stacked, and flattened into a
+        full copy once it outgrows its base.
+        """
+        if isinstance(graph, LazyOverlayGraph):
+            if graph.overlay_size() * FLATTEN_RATIO > len(graph.base):
+                return LazyInferenceGraph.copy_of(graph, rules)
+            return graph.copy()
+        if isinstance(graph, LazyInferenceGraph):
+            return cls(graph, rules)
+        return LazyInferenceGraph.copy_of(graph, rules)
+
+    def copy(self) -> "LazyOverlayGraph":
+        """New overlay on the same base holding a copy of this overlay's triples and memo"""
+        clone = LazyOverlayGraph(self.base, self._rules)
+        Graph.addN(clone, ((s, p, o, clone) for s, p, o in Graph.triples(self, (None, None, None))))
+        clone.hidden = set(self.hidden)
+        clone._memo = dict(self._memo)
+        clone._touched = set(self._touched)
+        clone._base_memo = self._base_memo
+        return clone
+
+    def asserted_triples(self, triple=(None, None, None)):
+        # Overlay triples never duplicate visible base triples, so plain chaining is enough
+        if self.hidden:
+            yield from (found for found in self.base.asserted_triples(triple) if found not in self.hidden)
+        else:
+            yield from self.base.asserted_triples(triple)
+        yield from Graph.triples(self, triple)
+
+    def _shares_base_memo(self, subject) -> bool:
+        return self._base_memo and subject not in self._touched
+
+    def _memo_items(self) -> Dict[URIRef, Tuple[URIRef, ...]]:
+        memo = {}
+        if self._base_memo:
+            memo.update((s, types) for s, types in self.base._memo_items().items() if s not in self._touched)
+        memo.update(self._memo)
+        return memo
+
+    def _memo_get(self, subject) -> Optional[Tuple[URIRef, ...]]:
+        if self._shares_base_memo(subject):
+            return self.base._memo_get(subject)
+        return self._memo.get(subject)
+
+    def _memo_put(self, subject, types: Tuple[URIRef, ...]):
+        if self._shares_base_memo(subject):
+            # Same facts and rules as in the base, so the entry is valid there too
+            self.base._memo_put(subject, types)
+        else:
+            self._memo[subject] = types
+
+    def forget(self, subject):
+        self._memo.pop(subject, None)
+        self._touched.add(subject)
+
+    def add(self, triple):
+        self.forget(triple[0])
+        if any(True for _ in self.base.asserted_triples(triple)):
+            self.hidden.discard(triple)
+            return self
+        return Graph.add(self, triple)
+
+    def remove(self, triple):
+        if triple[0] is None:
+            self._memo.clear()
+            self._base_memo = False
+        else:
+            self.forget(triple[0])
+        Graph.remove(self, triple)
+        self.hidden.update(self.base.asserted_triples(triple))
+        return self
+
+    def overlay_size(self) -> int:
+        return Graph.__len__(self)
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.hidden) + self.overlay_size()
+
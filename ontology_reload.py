@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Hot reload of the ontology.
+An OntologyReloader parses and compiles a new ontology version on its own
+worker thread, checks the compiled rules with the conformance harness and
+only then swaps them into the engine (TaxReasoningEngine.reclassify), which
+publishes the new ontology triples and the retyped residents as one new
+generation. Readers never wait: requests that already hold a snapshot finish
+on the old version, later ones see the new one. A failed parse or check
+leaves the active version untouched.
+
+The reloader can also watch the ontology file and reload whenever it changes.
+"""
+
+import contextlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from rdflib import Graph
+
+from tax_reasoning_engine import TaxReasoningEngine
+from compiled_rules import FILER_CLASSES, compile_rules
+from conformance_harness import ConformanceChecker, ConformanceReport, exhaustive_cases
+from reclassification import Reclassification
+
+
+# Conformance paths run before a swap. "scalar" (Threshold.test per row) takes a few seconds on the
+# exhaustive cases, which is fine on the reload thread; "graph" also runs the built-in reasoner of an
+# engine loaded from the new file on a sample of them
+DEFAULT_CHECKS = ("scalar", "vectorized", "store")
+
+
+@dataclass
+class ReloadResult:
+    """Outcome of one reload attempt"""
+    path: str
+    version: Optional[str] = None
+    error: Optional[str] = None
+    report: Optional[ConformanceReport] = None
+    reclassification: Optional[Reclassification] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _parse(path: str) -> Graph:
+    graph = Graph()
+    graph.parse(path, format="xml" if path.endswith(".owl") else "turtle")
+    return graph
+
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class OntologyReloader:
+    """Background reloads of one engine's ontology, one at a time"""
+
+    def __init__(self, engine: TaxReasoningEngine, path: Optional[str] = None,
+                 checks: Sequence[str] = DEFAULT_CHECKS, poll_interval: float = 1.0):
+        self.engine = engine
+        self.path = path or engine.ontology_path
+        self.checks = tuple(checks)
+        self.poll_interval = poll_interval
+        self.history: List[ReloadResult] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ontology-reload")
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def reload(self, path: Optional[str] = None) -> "Future[ReloadResult]":
+        """Queue a reload of path (default: the watched file); the future resolves once it is live or rejected"""
+        return self._executor.submit(self._reload, path or self.path)
+
+    def _reload(self, path: str) -> ReloadResult:
+        started = time.perf_counter()
+        result = ReloadResult(path)
+        try:
+            ontology = _parse(path)
+            rules = compile_rules(ontology)
+            result.version = rules.version
+            missing = [c for c in FILER_CLASSES if c not in rules.by_class]
+            if missing:
+                raise ValueError(f"No definition for {', '.join(str(c).split('#')[-1] for c in missing)}")
+            result.report = self._check(path, rules)
+            if not result.report.ok:
+                raise ValueError(f"{len(result.report.disagreements)} conformance disagreement(s), e.g. "
+                                 f"{result.report.disagreements[0].describe()}")
+            # The engine keeps the parsed ontology, so its blank nodes match the published graph
+            active = self.engine.ontology
+            changes = (active - ontology, ontology - active)
+            with contextlib.redirect_stdout(io.StringIO()):
+                result.reclassification = self.engine.reclassify(rules, ontology_changes=changes)
+            self.engine.ontology = ontology
+            self.engine.ontology_path = path
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.seconds = time.perf_counter() - started
+        self.history.append(result)
+        if result.ok:
+            print(f"Reloaded ontology from {path} (version {result.version}): "
+                  f"{len(result.reclassification.changes)} status change(s)")
+        else:
+            print(f"Kept the active ontology, reloading {path} failed: {result.error}")
+        return result
+
+    def _check(self, path: str, rules) -> ConformanceReport:
+        checker = ConformanceChecker(path, paths=self.checks, rules=rules)
+        report = ConformanceReport()
+        for chunk in exhaustive_cases(rules):
+            report.merge(checker.check(chunk))
+            if not report.ok:
+                # One shrunk counterexample is enough to reject the version
+                break
+        return report
+
+    def start(self) -> "OntologyReloader":
+        """Watch the ontology file and reload it after every change"""
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, args=(_file_state(self.path),),
+                                             name="ontology-watch", daemon=True)
+            self._watcher.start()
+        return self
+
+    def _watch(self, state: Optional[Tuple[int, int]]):
+        while not self._stop.wait(self.poll_interval):
+            current = _file_state(self.path)
+            if current is not None and current != state:
+                state = current
+                self.reload().result()
+
+    def stop(self):
+        """Stop watching and wait for a queued reload to finish"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "OntologyReloader":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Payroll-line aggregation.
+Turns unsorted employer payroll slips (one L16-style line per employment
+period) into one TaxEntity per person. Lines are hash-aggregated in memory;
+when more than max_groups people are buffered, the partial aggregates are
+spilled to hash-partitioned files and merged one partition at a time, so
+memory stays bounded for any input size.
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional
+from dataclasses import dataclass, field
+
+from tax_reasoning_engine import TaxEntity
+
+
+ALL_MONTHS = (1 << 12) - 1
+
+
+@dataclass(frozen=True)
+class PayrollLine:
+    """One payroll slip: an employment of a person with one employer over a range of months"""
+    person_id: str
+    employer_id: str
+    taxable_wage: float  # steuerpflichtige Bezuege (KZ 245)
+    start_month: int = 1
+    end_month: int = 12
+    joint_taxation: bool = False  # employments already taxed together by the payer
+
+    def month_mask(self) -> int:
+        if not 1 <= self.start_month <= self.end_month <= 12:
+            raise ValueError(f"Invalid employment period {self.start_month}-{self.end_month} "
+                             f"for {self.person_id}/{self.employer_id}")
+        return ((1 << self.end_month) - 1) & ~((1 << (self.start_month - 1)) - 1)
+
+
+@dataclass
+class PersonPayroll:
+    """Mergeable partial aggregate of all payroll lines seen for one person"""
+    wage: float = 0.0
+    joint_taxation: bool = False
+    employers: Dict[str, int] = field(default_factory=dict)  # employer -> months employed
+
+    def add(self, line: PayrollLine):
+        self.wage += line.taxable_wage
+        self.joint_taxation |= line.joint_taxation
+        self.employers[line.employer_id] = self.employers.get(line.employer_id, 0) | line.month_mask()
+
+    def merge(self, other: "PersonPayroll"):
+        self.wage += other.wage
+        self.joint_taxation |= other.joint_taxation
+        for employer, months in other.employers.items():
+            self.employers[employer] = self.employers.get(employer, 0) | months
+
+    def has_overlap(self) -> bool:
+        """Whether two different employers paid wages in the same month"""
+        seen = 0
+        for months in self.employers.values():
+            if seen & months:
+                return True
+            seen |= months
+        return False
+
+    def to_entity(self, person_id: str) -> TaxEntity:
+        concurrent = len(self.employers) > 1 and self.has_overlap()
+        return TaxEntity(
+            id=person_id,
+            name=person_id,
+            entity_type="Person",
+            annual_income=round(self.wage, 2),
+            is_austrian_resident=True,
+            has_filed_employment_tax=True,
+            has_single_employer=len(self.employers) == 1,
+            has_multiple_employments_without_joint_tax=concurrent and not self.joint_taxation,
+            has_employer_change=len(self.employers) > 1 and not concurrent,
+        )
+
+    def to_json(self, person_id: str) -> str:
+        return json.dumps([person_id, self.wage, self.joint_taxation, self.employers])
+
+    @classmethod
+    def from_json(cls, line: str):
+        person_id, wage, joint, employers = json.loads(line)
+        return person_id, cls(wage, joint, employers)
+
+
+class PayrollAggregator:
+    """Streaming group-by over payroll lines with spill-to-disk"""
+
+    def __init__(self, max_groups: int = 1_000_000, partitions: int = 64, spill_dir: Optional[str] = None):
+        self.max_groups = max_groups
+        self.partitions = partitions
+        self.spill_dir = spill_dir
+        self.groups: Dict[str, PersonPayroll] = {}
+        self.lines = 0
+        self.spills = 0
+        self._spill_path: Optional[str] = None
+
+    def add(self, line: PayrollLine):
+        group = self.groups.get(line.person_id)
+        if group is None:
+            if len(self.groups) >= self.max_groups:
+                self._spill()
+            group = self.groups[line.person_id] = PersonPayroll()
+        group.add(line)
+        self.lines += 1
+
+    def extend(self, lines: Iterable[PayrollLine]):
+        for line in lines:
+            self.add(line)
+
+    def _partition(self, person_id: str) -> int:
+        return zlib.crc32(person_id.encode("utf-8")) % self.partitions
+
+    def _partition_file(self, partition: int) -> str:
+        return os.path.join(self._spill_path, f"part-{partition:04d}.jsonl")
+
+    def _spill(self):
+        """Append the buffered partial aggregates to their partition files"""
+        if self._spill_path is None:
+            self._spill_path = tempfile.mkdtemp(prefix="payroll-spill-", dir=self.spill_dir)
+        buckets: List[List[str]] = [[] for _ in range(self.partitions)]
+        for person_id, group in self.groups.items():
+            buckets[self._partition(person_id)].append(group.to_json(person_id))
+        for partition, rows in enumerate(buckets):
+            if rows:
+                with open(self._partition_file(partition), "a", encoding="utf-8") as f:
+                    f.write("\n".join(rows) + "\n")
+        self.groups = {}
+        self.spills += 1
+
+    def results(self) -> Iterator[TaxEntity]:
+        """Emit one TaxEntity per person; consumes the aggregator"""
+        if self._spill_path is None:
+            groups, self.groups = self.groups, {}
+            for person_id, group in groups.items():
+                yield group.to_entity(person_id)
+            return
+        try:
+            self._spill()
+            for partition in range(self.partitions):
+                path = self._partition_file(partition)
+                if not os.path.exists(path):
+                    continue
+                merged: Dict[str, PersonPayroll] = {}
+                with open(path, encoding="utf-8") as f:
+                    for row in f:
+                        person_id, group = PersonPayroll.from_json(row)
+                        if person_id in merged:
+                            merged[person_id].merge(group)
+                        else:
+                            merged[person_id] = group
+                for person_id, group in merged.items():
+                    yield group.to_entity(person_id)
+        finally:
+            shutil.rmtree(self._spill_path, ignore_errors=True)
+            self._spill_path = None
+
+
+def aggregate_payroll(lines: Iterable[PayrollLine], max_groups: int = 1_000_000,
+                      partitions: int = 64, spill_dir: Optional[str] = None) -> Iterator[TaxEntity]:
+    """Aggregate payroll lines into one TaxEntity per person"""
+    aggregator = PayrollAggregator(max_groups, partitions, spill_dir)
+    aggregator.extend(lines)
+    return aggregator.results()
+
+
+def read_payroll_csv(path: str) -> Iterator[PayrollLine]:
+    """
+    Stream payroll lines from a CSV file with the columns person_id, employer_id,
+    taxable_wage and optionally start_month, end_month and joint_taxation
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield PayrollLine(
+                person_id=row["person_id"],
+                employer_id=row["employer_id"],
+                taxable_wage=float(row["taxable_wage"]),
+                start_month=int(row.get("start_month") or 1),
+                end_month=int(row.get("end_month") or 12),
+                joint_taxation=(row.get("joint_taxation") or "").strip().lower() in ("1", "true", "yes"),
+            )
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Running population aggregates for dashboards.
+PopulationCounters keeps counts by filing status, by rule (clause of the
+compiled rules) that fired, and a wage-band histogram per status. Every
+classified resident contributes once; classifying it again replaces its
+previous contribution, so the counts always describe the latest facts and
+reading them never touches the graph.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF
+
+from tax_reasoning_engine import TaxEntity, TAX, PERSON_KB, FLAG_PROPERTIES
+from compiled_rules import (CompiledRuleSet, STATUS_NAMES, FLAG_BITS, DEFAULT_FLAGS, pack_flags,
+                            status_of_columns)
+
+
+# Wage band edges around the filing thresholds; a band includes its lower edge
+BAND_EDGES = (10000.0, 13308.0, 14517.0, 20000.0, 30000.0, 50000.0, 100000.0)
+
+
+def band_labels(edges: Sequence[float] = BAND_EDGES) -> List[str]:
+    labels = [f"< {edges[0]:g}"]
+    labels += [f"{low:g} - {high:g}" for low, high in zip(edges, edges[1:])]
+    return labels + [f">= {edges[-1]:g}", "no wage income"]
+
+
+def resident_columns(graph: Graph, subjects: Optional[Iterable[URIRef]] = None
+                     ) -> Tuple[List[URIRef], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Subjects, wage, non-wage income and packed flags of residents.
+    Without subjects every resident is read with one triple scan per property;
+    with subjects only those that are residents are looked up.
+    """
+    if subjects is None:
+        subjects = list(graph.subjects(RDF.type, TAX.AustrianResident))
+        scan = lambda prop: graph.triples((None, prop, None))
+    else:
+        subjects = [s for s in subjects if (s, RDF.type, TAX.AustrianResident) in graph]
+        scan = lambda prop: (triple for s in subjects for triple in graph.triples((s, prop, None)))
+    row_of = {subject: row for row, subject in enumerate(subjects)}
+    wage = np.full(len(subjects), np.nan)
+    non_wage = np.zeros(len(subjects))
+    flags = np.full(len(subjects), DEFAULT_FLAGS, dtype=np.uint32)
+    # The first stored value wins, as during inference
+    for prop, column in ((TAX.hasAnnualWageIncome, wage), (TAX.hasNonWageIncome, non_wage)):
+        seen = set()
+        for s, _, value in scan(prop):
+            row = row_of.get(s)
+            if row is not None and row not in seen:
+                seen.add(row)
+                column[row] = float(value)
+    for _, prop, _ in FLAG_PROPERTIES:
+        bit = np.uint32(FLAG_BITS[prop])
+        for s, _, value in scan(prop):
+            row = row_of.get(s)
+            if row is not None:
+                flags[row] = flags[row] | bit if value.toPython() else flags[row] & ~bit
+    return subjects, wage, non_wage, flags
+
+
+class PopulationCounters:
+    """Status, rule-hit and wage-band counts, maintained per resident"""
+
+    def __init__(self, rules: CompiledRuleSet, edges: Sequence[float] = BAND_EDGES):
+        self.rules = rules
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.rule_labels = list(rules.rule_labels)
+        self.band_labels = band_labels(edges)
+        self.status_counts = np.zeros(len(STATUS_NAMES), dtype=np.int64)
+        self.rule_hits = np.zeros(len(self.rule_labels), dtype=np.int64)
+        self.income_bands = np.zeros((len(STATUS_NAMES), len(self.band_labels)), dtype=np.int64)
+        self._row_of: Dict[Any, int] = {}
+        # Last contribution of every resident, so reclassification can subtract it
+        self._status = np.zeros(0, dtype=np.uint8)
+        self._hits = np.zeros(0, dtype=np.uint64)
+        self._band = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_graph(cls, graph: Graph, rules: CompiledRuleSet, edges: Sequence[float] = BAND_EDGES) -> "PopulationCounters":
+        """Counters for the residents already stored in a graph"""
+        counters = cls(rules, edges)
+        counters.update(*resident_columns(graph))
+        return counters
+
+    def _bands(self, wage: np.ndarray) -> np.ndarray:
+        bands = np.searchsorted(self.edges, np.nan_to_num(wage, nan=0.0), side="right")
+        bands[np.isnan(wage)] = len(self.band_labels) - 1
+        return bands
+
+    def _rule_counts(self, hits: np.ndarray) -> np.ndarray:
+        bits = np.uint64(1) << np.arange(len(self.rule_labels), dtype=np.uint64)
+        return ((hits[:, None] & bits) != 0).sum(axis=0)
+
+    def update(self, keys: Sequence, annual_income: np.ndarray, non_wage_income: np.ndarray,
+               flags: np.ndarray) -> np.ndarray:
+        """Classify residents and fold them into the counts; returns their status codes"""
+        wage = np.asarray(annual_income, dtype=np.float64)
+        membership, hits = self.rules.classify_rule_hits(wage, np.asarray(non_wage_income, dtype=np.float64),
+                                                         np.asarray(flags, dtype=np.uint32))
+        status = status_of_columns(membership)
+        bands = self._bands(wage)
+        with self._lock:
+            known = len(self._row_of)
+            last: Dict[int, int] = {}  # row -> last position in the batch, so repeats count once
+            for i, key in enumerate(keys):
+                row = self._row_of.get(key)
+                if row is None:
+                    row = self._row_of[key] = len(self._row_of)
+                last[row] = i
+            new_rows = np.fromiter(last.keys(), dtype=np.int64, count=len(last))
+            positions = np.fromiter(last.values(), dtype=np.int64, count=len(last))
+            old = new_rows[new_rows < known]
+            if len(old):
+                np.subtract.at(self.status_counts, self._status[old], 1)
+                self.rule_hits -= self._rule_counts(self._hits[old])
+                np.subtract.at(self.income_bands, (self._status[old], self._band[old]), 1)
+
+            if len(self._row_of) > len(self._status):
+                # Grow geometrically so single-entity updates stay amortized O(1)
+                grow = max(len(self._row_of), 2 * len(self._status), 1024) - len(self._status)
+                self._status = np.concatenate([self._status, np.zeros(grow, dtype=np.uint8)])
+                self._hits = np.concatenate([self._hits, np.zeros(grow, dtype=np.uint64)])
+                self._band = np.concatenate([self._band, np.zeros(grow, dtype=np.int64)])
+            status, hits, bands = status[positions], hits[positions], bands[positions]
+            self._status[new_rows], self._hits[new_rows], self._band[new_rows] = status, hits, bands
+            np.add.at(self.status_counts, status, 1)
+            self.rule_hits += self._rule_counts(hits)
+            np.add.at(self.income_bands, (status, bands), 1)
+        return status_of_columns(membership)
+
+    def update_entities(self, entities: Iterable[TaxEntity]) -> np.ndarray:
+        """Fold TaxEntity objects in (keyed by their knowledge base URI); non-persons are skipped"""
+        people = [e for e in entities if e.entity_type == "Person"]
+        return self.update([PERSON_KB[e.id] for e in people],
+                           np.array([np.nan if e.annual_income is None else e.annual_income for e in people]),
+                           np.array([e.has_non_wage_income or 0.0 for e in people]),
+                           np.array([pack_flags(e) for e in people], dtype=np.uint32))
+
+    @property
+    def total(self) -> int:
+        return int(self.status_counts.sum())
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Consistent copy of all counts, keyed by readable names"""
+        with self._lock:
+            return {
+                "total": self.total,
+                "status": dict(zip(STATUS_NAMES, self.status_counts.tolist())),
+                "rules": dict(zip(self.rule_labels, self.rule_hits.tolist())),
+                "income_bands": {name: dict(zip(self.band_labels, row))
+                                 for name, row in zip(STATUS_NAMES, self.income_bands.tolist())},
+            }
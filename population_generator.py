@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Synthetic Austrian taxpayer population generator.
+Streams reproducible, PII-free populations to JSONL, Turtle or the columnar
+taxpayer store for load tests and capacity planning. Rows are produced in
+fixed-size blocks, each seeded from (seed, block index), so memory stays
+bounded and the same seed yields the same population in every format.
+"""
+
+import argparse
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field
+import numpy as np
+
+from tax_reasoning_engine import TaxEntity, FLAG_PROPERTIES, TAX, PERSON_KB
+from compiled_rules import FLAG_BITS, FLAG_FIELDS
+
+
+BLOCK_ROWS = 65536
+
+# Share of taxpayers with each flag set (has_filed_employment_tax is mostly true)
+DEFAULT_FLAG_PREVALENCE = {
+    "has_incorrect_tax_credits": 0.02,
+    "has_multiple_employments_without_joint_tax": 0.06,
+    "has_incorrect_commuter_allowance": 0.02,
+    "has_incorrect_family_bonus": 0.015,
+    "has_filed_employment_tax": 0.98,
+    "has_special_payment_situations": 0.04,
+    "has_discretionary_assessment": 0.01,
+    "has_single_employer": 0.75,
+    "has_correct_wage_tax": 0.9,
+    "has_varying_income_no_rollup": 0.05,
+    "has_employer_change": 0.12,
+    "has_sv_repayment_eligibility": 0.08,
+    "has_unclaimed_tax_credits": 0.05,
+    "has_unclaimed_deductions": 0.2,
+}
+
+
+@dataclass
+class PopulationConfig:
+    """Distribution parameters for a synthetic population"""
+    seed: int = 0
+    id_prefix: str = "synthetic_"
+    # Wage income: log-normal around the median, some residents without wage income
+    wage_median: float = 32000.0
+    wage_sigma: float = 0.6
+    no_wage_share: float = 0.05
+    # Non-wage income: only a share of residents have any
+    non_wage_share: float = 0.15
+    non_wage_median: float = 1500.0
+    non_wage_sigma: float = 1.0
+    flag_prevalence: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_FLAG_PREVALENCE))
+    # Extra mass placed right around the filing thresholds
+    near_threshold_share: float = 0.1
+    near_threshold_width: float = 250.0
+    wage_thresholds: Tuple[float, ...] = (13308.0, 14517.0)
+    non_wage_thresholds: Tuple[float, ...] = (730.0,)
+
+
+def _generate_block(config: PopulationConfig, block: int, rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Incomes and packed flags for one block; depends only on (seed, block)"""
+    rng = np.random.default_rng([config.seed, block])
+
+    wage = rng.lognormal(np.log(config.wage_median), config.wage_sigma, rows)
+    near = rng.random(rows) < config.near_threshold_share
+    if config.wage_thresholds:
+        centers = rng.choice(np.asarray(config.wage_thresholds), rows)
+        offsets = rng.uniform(-config.near_threshold_width, config.near_threshold_width, rows)
+        wage = np.where(near, centers + offsets, wage)
+    wage = np.round(wage, 2)
+    wage[rng.random(rows) < config.no_wage_share] = np.nan
+
+    has_non_wage = rng.random(rows) < config.non_wage_share
+    non_wage = rng.lognormal(np.log(config.non_wage_median), config.non_wage_sigma, rows)
+    if config.non_wage_thresholds:
+        near = rng.random(rows) < config.near_threshold_share
+        centers = rng.choice(np.asarray(config.non_wage_thresholds), rows)
+        offsets = rng.uniform(-config.near_threshold_width, config.near_threshold_width, rows)
+        non_wage = np.where(near, np.maximum(centers + offsets, 0.0), non_wage)
+    non_wage = np.where(has_non_wage, np.round(non_wage, 2), 0.0)
+
+    flags = np.zeros(rows, dtype=np.uint32)
+    props = {field_name: prop for field_name, prop, _ in FLAG_PROPERTIES}
+    drawn = {}
+    for field_name in FLAG_FIELDS:
+        drawn[field_name] = rng.random(rows) < config.flag_prevalence.get(field_name, 0.0)
+    # A single employer excludes parallel employments and employer changes
+    drawn["has_single_employer"] &= ~(drawn["has_multiple_employments_without_joint_tax"]
+                                      | drawn["has_employer_change"])
+    for field_name, values in drawn.items():
+        flags[values] |= FLAG_BITS[props[field_name]]
+    return wage, non_wage, flags
+
+
+def iter_blocks(count: int, config: Optional[PopulationConfig] = None) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (ids, annual_income, non_wage_income, flags) blocks covering count rows"""
+    config = config or PopulationConfig()
+    for block, start in enumerate(range(0, count, BLOCK_ROWS)):
+        rows = min(BLOCK_ROWS, count - start)
+        wage, non_wage, flags = _generate_block(config, block, rows)
+        ids = [f"{config.id_prefix}{i}" for i in range(start, start + rows)]
+        yield ids, wage, non_wage, flags
+
+
+def _row_entity(entity_id: str, wage: float, non_wage: float, flags: int) -> TaxEntity:
+    values = {field_name: bool(flags & FLAG_BITS[prop]) for field_name, prop, _ in FLAG_PROPERTIES}
+    return TaxEntity(
+        id=entity_id,
+        name=entity_id,
+        entity_type="Person",
+        annual_income=None if np.isnan(wage) else float(wage),
+        has_non_wage_income=float(non_wage),
+        is_austrian_resident=True,
+        **values
+    )
+
+
+def generate_entities(count: int, config: Optional[PopulationConfig] = None) -> Iterator[TaxEntity]:
+    """Stream the population as TaxEntity objects"""
+    for ids, wage, non_wage, flags in iter_blocks(count, config):
+        for row, entity_id in enumerate(ids):
+            yield _row_entity(entity_id, wage[row], non_wage[row], int(flags[row]))
+
+
+def write_jsonl(path: str, count: int, config: Optional[PopulationConfig] = None) -> int:
+    """Write one JSON object per taxpayer, using the TaxEntity field names (TaxEntity(**record) reads it back)"""
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for ids, wage, non_wage, flags in iter_blocks(count, config):
+            lines = []
+            for row, entity_id in enumerate(ids):
+                record = {"id": entity_id, "name": entity_id, "entity_type": "Person",
+                          "annual_income": None if np.isnan(wage[row]) else float(wage[row]),
+                          "has_non_wage_income": float(non_wage[row]), "is_austrian_resident": True}
+                bits = int(flags[row])
+                for field_name, prop, _ in FLAG_PROPERTIES:
+                    record[field_name] = bool(bits & FLAG_BITS[prop])
+                lines.append(json.dumps(record))
+            f.write("\n".join(lines) + "\n")
+            written += len(ids)
+    return written
+
+
+def write_ttl(path: str, count: int, config: Optional[PopulationConfig] = None) -> int:
+    """Write taxpayers as Turtle individuals, listing only non-default flags"""
+    local_names = [(field_name, str(prop).split('#')[-1], default) for field_name, prop, default in FLAG_PROPERTIES]
+    bits = {field_name: FLAG_BITS[prop] for field_name, prop, _ in FLAG_PROPERTIES}
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"@prefix : <{TAX}> .\n")
+        f.write(f"@prefix kb: <{PERSON_KB}> .\n")
+        f.write("@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .\n")
+        f.write("@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .\n\n")
+        for ids, wage, non_wage, flags in iter_blocks(count, config):
+            blocks = []
+            for row, entity_id in enumerate(ids):
+                lines = [f"kb:{entity_id} rdf:type :AustrianResident"]
+                if not np.isnan(wage[row]):
+                    lines.append(f':hasAnnualWageIncome "{wage[row]:.2f}"^^xsd:decimal')
+                if non_wage[row]:
+                    lines.append(f':hasNonWageIncome "{non_wage[row]:.2f}"^^xsd:decimal')
+                row_flags = int(flags[row])
+                for field_name, local_name, default in local_names:
+                    value = bool(row_flags & bits[field_name])
+                    if value != default:
+                        lines.append(f":{local_name} {'true' if value else 'false'}")
+                blocks.append(" ;\n    ".join(lines) + " .\n")
+            f.write("\n".join(blocks) + "\n")
+            written += len(ids)
+    return written
+
+
+def write_columnar(path: str, count: int, config: Optional[PopulationConfig] = None) -> int:
+    """Write the population into a columnar taxpayer store directory"""
+    from taxpayer_store import ColumnarStoreWriter
+
+    with ColumnarStoreWriter(path) as writer:
+        for ids, wage, non_wage, flags in iter_blocks(count, config):
+            writer.append_columns(ids, wage, non_wage, flags)
+    return writer.count
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Generate a synthetic Austrian taxpayer population")
+    parser.add_argument("count", type=int, help="number of taxpayers")
+    parser.add_argument("output", help="output file (jsonl/ttl) or directory (columnar)")
+    parser.add_argument("--format", choices=["jsonl", "ttl", "columnar"], default="jsonl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--near-threshold-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    config = PopulationConfig(seed=args.seed, near_threshold_share=args.near_threshold_share)
+    writers = {"jsonl": write_jsonl, "ttl": write_ttl, "columnar": write_columnar}
+    written = writers[args.format](args.output, args.count, config)
+    print(f"Wrote {written} taxpayers to {args.output} ({args.format})")
+
+
+if __name__ == "__main__":
+    main()
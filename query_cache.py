@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Generation-aware SPARQL cache.
+Audit queries are re-run verbatim against a knowledge base that changes
+only when a new graph generation is published. QueryCache keeps the parsed
+algebra of each query text and the materialized results per (query text,
+bindings); results are dropped as soon as the engine's generation moves
+on, so a hit can never return rows from an older graph.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.sparql import Query
+from rdflib.query import Result
+
+
+DEFAULT_MAX_PLANS = 256
+DEFAULT_MAX_RESULTS = 1024
+
+
+@dataclass
+class CacheStats:
+    """Counters for monitoring; hit rates are 0.0 before the first lookup"""
+    hits: int = 0
+    misses: int = 0
+    plan_hits: int = 0
+    plan_misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0  # result sets dropped because a new generation was published
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def plan_hit_rate(self) -> float:
+        lookups = self.plan_hits + self.plan_misses
+        return self.plan_hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), hit_rate=self.hit_rate, plan_hit_rate=self.plan_hit_rate)
+
+
+@dataclass(frozen=True)
+class _CachedResult:
+    """Materialized query result, rebuilt into a fresh rdflib Result on every hit"""
+    type: str
+    vars: Optional[Tuple]
+    bindings: Optional[Tuple]
+    ask_answer: Optional[bool]
+    graph: Any
+
+    @classmethod
+    def of(cls, result: Result) -> "_CachedResult":
+        bindings = tuple(result.bindings) if result.type == "SELECT" else None
+        return cls(result.type, tuple(result.vars) if result.vars else None, bindings,
+                   result.askAnswer, result.graph)
+
+    def result(self) -> Result:
+        result = Result(self.type)
+        if self.type == "SELECT":
+            result.vars = list(self.vars or ())
+            result.bindings = list(self.bindings)
+        elif self.type == "ASK":
+            result.askAnswer = self.ask_answer
+        else:
+            result.graph = self.graph
+        return result
+
+
+def _bindings_key(bindings: Optional[Mapping]) -> Tuple:
+    if not bindings:
+        return ()
+    return tuple(sorted((str(name), value) for name, value in bindings.items()))
+
+
+class QueryCache:
+    """
+    LRU cache of query plans and results for one engine (anything with
+    snapshot() returning (generation, graph)). CONSTRUCT/DESCRIBE graphs
+    are shared between hits and must be treated as read-only.
+    """
+
+    def __init__(self, engine, max_plans: int = DEFAULT_MAX_PLANS, max_results: int = DEFAULT_MAX_RESULTS):
+        self.engine = engine
+        self.max_plans = max_plans
+        self.max_results = max_results
+        self.stats = CacheStats()
+        self._plans: "OrderedDict[Hashable, Query]" = OrderedDict()
+        self._results: "OrderedDict[Hashable, _CachedResult]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _remember(self, entries: OrderedDict, key: Hashable, value, limit: int):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def prepare(self, sparql: str, initNs: Optional[Mapping[str, Any]] = None) -> Query:
+        """Parsed and translated query (the plan survives new generations)"""
+        key = (sparql, _bindings_key(initNs))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.stats.plan_hits += 1
+                return plan
+        if initNs is None:
+            initNs = dict(self.engine.graph.namespaces())
+        plan = prepareQuery(sparql, initNs=initNs)
+        with self._lock:
+            self.stats.plan_misses += 1
+            self._remember(self._plans, key, plan, self.max_plans)
+        return plan
+
+    def _observe(self, generation: int):
+        """Drop all results once a newer generation is seen (caller holds the lock)"""
+        if self._generation is None or generation > self._generation:
+            self.stats.invalidations += len(self._results)
+            self._results.clear()
+            self._generation = generation
+
+    def query(self, sparql: str, initBindings: Optional[Mapping] = None,
+              initNs: Optional[Mapping[str, Any]] = None) -> Result:
+        """Run a query against the current generation, answering repeats from the cache"""
+        generation, graph = self.engine.snapshot()
+        key = (sparql, _bindings_key(initBindings), _bindings_key(initNs))
+        with self._lock:
+            self._observe(generation)
+            cached = self._results.get(key) if generation == self._generation else None
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.stats.hits += 1
+                return cached.result()
+            self.stats.misses += 1
+
+        cached = _CachedResult.of(graph.query(self.prepare(sparql, initNs), initBindings=initBindings))
+        with self._lock:
+            self._observe(generation)
+            # A reader that raced a publish must not store rows of an older generation
+            if generation == self._generation:
+                self._remember(self._results, key, cached, self.max_results)
+        return cached.result()
+
+    def clear(self):
+        """Forget all plans and results (the counters are kept)"""
+        with self._lock:
+            self._plans.clear()
+            self._results.clear()
+            self._generation = None
+
+    def __len__(self) -> int:
+        return len(self._results)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Incremental reclassification after a rule change.
+The filing status is piecewise constant between the rule thresholds, so two
+compiled rule sets can be compared exactly on one probe per income cell (the
+open intervals between the thresholds of both sets, and the thresholds
+themselves) and per combination of the flags the rules test. Only residents
+whose incomes fall in a cell where the rule sets disagree can change status;
+the income index finds them without scanning the knowledge base.
+"""
+
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Set
+from dataclasses import dataclass, field
+import numpy as np
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF
+
+from tax_reasoning_engine import TAX, FLAG_PROPERTIES
+from compiled_rules import CompiledRuleSet, FLAG_BITS, STATUS_NAMES, status_of_columns
+from income_index import IncomeIndex
+from population_counters import resident_columns
+
+
+@dataclass(frozen=True)
+class Cell:
+    """Income interval between two neighbouring thresholds (or a single threshold value)"""
+    low: Optional[float]
+    high: Optional[float]
+    include_low: bool
+    include_high: bool
+
+    @property
+    def probe(self) -> float:
+        """A value inside the interval"""
+        if self.low is None:
+            return 0.0 if self.high is None else self.high - 1.0
+        if self.high is None:
+            return self.low + 1.0
+        return (self.low + self.high) / 2
+
+    def contains(self, value: float) -> bool:
+        if self.low is not None and (value < self.low or (value == self.low and not self.include_low)):
+            return False
+        return self.high is None or value < self.high or (value == self.high and self.include_high)
+
+    def describe(self) -> str:
+        if self.low == self.high:
+            return f"= {self.low:g}"
+        low = "(-inf" if self.low is None else f"{'[' if self.include_low else '('}{self.low:g}"
+        high = "inf)" if self.high is None else f"{self.high:g}{']' if self.include_high else ')'}"
+        return f"{low}, {high}"
+
+
+def income_cells(values: Sequence[float]) -> List[Cell]:
+    """Cells that partition the real line at the given threshold values"""
+    cells = []
+    previous = None
+    for value in sorted(set(values)):
+        cells.append(Cell(previous, value, False, False))
+        cells.append(Cell(value, value, True, True))
+        previous = value
+    cells.append(Cell(previous, None, False, False))
+    return cells
+
+
+@dataclass
+class AffectedCell:
+    """Income cell in which the old and new rules decide differently for some flag patterns"""
+    wage: Optional[Cell]  # None: residents without a wage income
+    non_wage: Cell
+    flag_patterns: np.ndarray  # packed flags (restricted to the tested flags) whose status changes
+
+    def required_flags(self, flag_mask: int) -> Dict[str, bool]:
+        """Tested flags that have the same value in every changed pattern"""
+        ones = int(np.bitwise_and.reduce(self.flag_patterns))
+        zeros = int(np.bitwise_and.reduce(~self.flag_patterns)) & flag_mask
+        return {name: bool(ones & FLAG_BITS[prop]) for name, prop, _ in FLAG_PROPERTIES
+                if (ones | zeros) & FLAG_BITS[prop]}
+
+    def describe(self) -> str:
+        wage = "no wage income" if self.wage is None else f"hasAnnualWageIncome {self.wage.describe()}"
+        return f"{wage}, hasNonWageIncome {self.non_wage.describe()} ({len(self.flag_patterns)} flag patterns)"
+
+
+@dataclass
+class RuleDiff:
+    """Where two compiled rule sets can decide differently"""
+    old: CompiledRuleSet
+    new: CompiledRuleSet
+    flag_mask: int
+    cells: List[AffectedCell] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not self.cells
+
+    def candidates(self, graph: Graph, index: IncomeIndex) -> Set[URIRef]:
+        """Subjects whose incomes fall in an affected cell (a superset of the residents that change)"""
+        found: Set[URIRef] = set()
+        for cell in self.cells:
+            subjects = None
+            if cell.wage is not None:
+                subjects = set(index.range(TAX.hasAnnualWageIncome, cell.wage.low, cell.wage.high,
+                                           cell.wage.include_low, cell.wage.include_high))
+            # A missing non-wage income counts as 0, so the index only covers cells without 0
+            if not cell.non_wage.contains(0.0):
+                by_non_wage = set(index.range(TAX.hasNonWageIncome, cell.non_wage.low, cell.non_wage.high,
+                                              cell.non_wage.include_low, cell.non_wage.include_high))
+                subjects = by_non_wage if subjects is None else subjects & by_non_wage
+            if subjects is None:
+                # Residents without a wage income and with little non-wage income: no index covers them
+                wage_indexed = set(index.indexes[TAX.hasAnnualWageIncome].subjects)
+                subjects = {s for s in graph.subjects(RDF.type, TAX.AustrianResident) if s not in wage_indexed}
+            found |= subjects
+        return found
+
+
+@dataclass(frozen=True)
+class StatusChange:
+    """One entry of the change feed"""
+    entity: URIRef
+    old_status: str
+    new_status: str
+    membership: int  # filer membership mask under the new rules
+
+
+@dataclass
+class Reclassification:
+    """Change feed of a rule switch and how much of the knowledge base it had to read"""
+    diff: RuleDiff
+    changes: List[StatusChange]
+    candidates: int
+
+
+def _flag_patterns(mask: int) -> np.ndarray:
+    bits = [bit for bit in (1 << i for i in range(32)) if mask & bit]
+    patterns = np.zeros(1 << len(bits), dtype=np.uint32)
+    for i, bit in enumerate(bits):
+        patterns[(np.arange(len(patterns)) >> i) & 1 == 1] |= np.uint32(bit)
+    return patterns
+
+
+def diff_rules(old: CompiledRuleSet, new: CompiledRuleSet) -> RuleDiff:
+    """Evaluate both rule sets on every income cell and flag pattern and keep the cells that differ"""
+    tested = lambda rules: {f.prop for rule in rules.rules for clause in rule.clauses for f in clause.flags}
+    flag_mask = sum(FLAG_BITS[prop] for prop in tested(old) | tested(new))
+    thresholds = old.thresholds() + new.thresholds()
+    wage_cells = [None] + income_cells([t.value for t in thresholds if t.prop == TAX.hasAnnualWageIncome])
+    non_wage_cells = income_cells([t.value for t in thresholds if t.prop == TAX.hasNonWageIncome])
+    patterns = _flag_patterns(flag_mask)
+    pairs = list(product(wage_cells, non_wage_cells))
+
+    # One row per (cell pair, flag pattern)
+    wage = np.repeat([np.nan if w is None else w.probe for w, _ in pairs], len(patterns))
+    non_wage = np.repeat([n.probe for _, n in pairs], len(patterns))
+    flags = np.tile(patterns, len(pairs))
+    before = status_of_columns(old.classify_columns(wage, non_wage, flags))
+    after = status_of_columns(new.classify_columns(wage, non_wage, flags))
+    changed = (before != after).reshape(len(pairs), len(patterns))
+
+    diff = RuleDiff(old, new, flag_mask)
+    for (wage_cell, non_wage_cell), row in zip(pairs, changed):
+        if row.any():
+            diff.cells.append(AffectedCell(wage_cell, non_wage_cell, patterns[row]))
+    return diff
+
+
+def reclassify(graph: Graph, index: IncomeIndex, old: CompiledRuleSet, new: CompiledRuleSet) -> Reclassification:
+    """Change feed of the residents of graph whose status differs between two rule sets"""
+    diff = diff_rules(old, new)
+    if diff.empty:
+        return Reclassification(diff, [], 0)
+    candidates = diff.candidates(graph, index)
+    subjects, wage, non_wage, flags = resident_columns(graph, candidates)
+    before = status_of_columns(old.classify_columns(wage, non_wage, flags))
+    membership = new.classify_columns(wage, non_wage, flags)
+    after = status_of_columns(membership)
+    changes = [StatusChange(subjects[row], STATUS_NAMES[before[row]], STATUS_NAMES[after[row]], int(membership[row]))
+               for row in np.flatnonzero(before != after)]
+    return Reclassification(diff, changes, len(subjects))
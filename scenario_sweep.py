@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+What-if sweeps over threshold scenarios.
+A ScenarioSweep loads one population and answers, for every combination of
+candidate threshold values, how many residents move between the filing
+statuses. Residents are grouped into segments that share the tested flags,
+the non-wage income cell and the current status, with the wages of each
+segment sorted once. Within a segment the status of a scenario only changes
+at its wage thresholds, so a scenario costs a few binary searches per
+segment and one rule evaluation per wage cell, independent of the number of
+residents.
+"""
+
+from itertools import product
+from typing import Dict, List, Sequence, Tuple
+from dataclasses import dataclass
+import numpy as np
+from rdflib import Graph, URIRef
+
+from tax_reasoning_engine import TAX
+from compiled_rules import CompiledRuleSet, FLAG_BITS, STATUS_NAMES, status_of_columns
+from population_counters import resident_columns
+from reclassification import income_cells
+
+ThresholdKey = Tuple[URIRef, float]  # (property, threshold value in the loaded rules)
+
+
+@dataclass
+class ScenarioResult:
+    """Transition counts from the current status (rows) to the scenario status (columns)"""
+    thresholds: Dict[ThresholdKey, float]
+    matrix: np.ndarray
+
+    @property
+    def moved(self) -> int:
+        return int(self.matrix.sum() - np.trace(self.matrix))
+
+    def as_dict(self) -> Dict:
+        local = lambda uri: str(uri).split('#')[-1]
+        return {
+            "thresholds": {f"{local(prop)} {value:g}": new for (prop, value), new in self.thresholds.items()},
+            "moved": self.moved,
+            "transitions": {old: dict(zip(STATUS_NAMES, row)) for old, row in zip(STATUS_NAMES, self.matrix.tolist())},
+        }
+
+
+@dataclass
+class _Segments:
+    flags: np.ndarray          # per segment: packed tested flags
+    non_wage: np.ndarray       # per segment: a non-wage income inside its cell
+    status: np.ndarray         # per segment: current status code
+    missing_wage: np.ndarray   # per segment: residents without a wage income
+    wages: np.ndarray          # distinct wages of the population, sorted
+    keys: np.ndarray           # segment * (len(wages) + 1) + wage rank, sorted
+
+
+def _cell_of(values: np.ndarray, edges: Sequence[float]) -> np.ndarray:
+    """Index into income_cells(edges) for every value"""
+    edges = np.asarray(edges, dtype=np.float64)
+    left = np.searchsorted(edges, values, side="left")
+    right = np.searchsorted(edges, values, side="right")
+    return 2 * left + (right > left)
+
+
+class ScenarioSweep:
+    """One population, evaluated under many threshold scenarios"""
+
+    def __init__(self, rules: CompiledRuleSet, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                 flags: np.ndarray):
+        self.rules = rules
+        self.annual_income = np.asarray(annual_income, dtype=np.float64)
+        self.non_wage_income = np.nan_to_num(np.asarray(non_wage_income, dtype=np.float64))
+        tested = sum(FLAG_BITS[f.prop] for rule in rules.rules for clause in rule.clauses for f in clause.flags)
+        self.flags = np.asarray(flags, dtype=np.uint32) & np.uint32(tested)
+        self.status = status_of_columns(rules.classify_columns(self.annual_income, self.non_wage_income, self.flags))
+
+    @classmethod
+    def from_graph(cls, graph: Graph, rules: CompiledRuleSet) -> "ScenarioSweep":
+        _, wage, non_wage, flags = resident_columns(graph)
+        return cls(rules, wage, non_wage, flags)
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def _segments(self, non_wage_edges: Sequence[float]) -> _Segments:
+        n_cells = 2 * len(non_wage_edges) + 1
+        cells = income_cells(non_wage_edges)
+        key = (self.flags.astype(np.int64) * n_cells + _cell_of(self.non_wage_income, non_wage_edges)) * 4 + self.status
+        segment_keys, segment = np.unique(key, return_inverse=True)
+
+        missing = np.isnan(self.annual_income)
+        wages = np.unique(self.annual_income[~missing])
+        rows = np.flatnonzero(~missing)
+        ranks = np.searchsorted(wages, self.annual_income[rows])
+        keys = np.sort(segment[rows].astype(np.int64) * (len(wages) + 1) + ranks)
+        probes = np.array([cell.probe for cell in cells])
+        return _Segments(
+            flags=(segment_keys // 4 // n_cells).astype(np.uint32),
+            non_wage=probes[segment_keys // 4 % n_cells],
+            status=(segment_keys % 4).astype(np.uint8),
+            missing_wage=np.bincount(segment[missing], minlength=len(segment_keys)),
+            wages=wages,
+            keys=keys,
+        )
+
+    def _transitions(self, rules: CompiledRuleSet, segments: _Segments) -> np.ndarray:
+        edges = sorted({t.value for t in rules.thresholds() if t.prop == TAX.hasAnnualWageIncome})
+        cells = income_cells(edges)
+        # Wage rank boundaries of the cells: [0, first >= e0, first > e0, ..., len(wages)]
+        bounds = [0]
+        for edge in edges:
+            bounds += [np.searchsorted(segments.wages, edge, side="left"),
+                       np.searchsorted(segments.wages, edge, side="right")]
+        bounds.append(len(segments.wages))
+        n_segments = len(segments.status)
+        queries = np.arange(n_segments, dtype=np.int64)[:, None] * (len(segments.wages) + 1) + np.array(bounds)
+        counts = np.diff(np.searchsorted(segments.keys, queries), axis=1)
+        counts = np.hstack([counts, segments.missing_wage[:, None]])
+
+        # One probe per (segment, wage cell), the last column being the residents without a wage
+        wage_probes = np.array([cell.probe for cell in cells] + [np.nan])
+        width = len(wage_probes)
+        status = status_of_columns(rules.classify_columns(
+            np.tile(wage_probes, n_segments), np.repeat(segments.non_wage, width),
+            np.repeat(segments.flags, width))).reshape(n_segments, width)
+        matrix = np.zeros((len(STATUS_NAMES), len(STATUS_NAMES)), dtype=np.int64)
+        np.add.at(matrix, (np.repeat(segments.status, width), status.ravel()), counts.ravel())
+        return matrix
+
+    def sweep(self, grid: Dict[ThresholdKey, Sequence[float]]) -> List[ScenarioResult]:
+        """
+        Transition matrix for every combination of the candidate values in grid,
+        which maps thresholds of the loaded rules, e.g. (TAX.hasAnnualWageIncome,
+        14517.0), to the values to try.
+        """
+        keys = list(grid)
+        unknown = [key for key in keys if key not in {(t.prop, t.value) for t in self.rules.thresholds()}]
+        if unknown:
+            raise ValueError(f"Not a threshold of the loaded rules: {unknown}")
+        scenarios = [dict(zip(keys, values)) for values in product(*(grid[key] for key in keys))]
+        rule_sets = [self.rules.with_thresholds(values) for values in scenarios]
+        # Non-wage cells fine enough for every scenario keep the status constant within a segment
+        non_wage_edges = sorted({t.value for rules in [self.rules] + rule_sets for t in rules.thresholds()
+                                 if t.prop == TAX.hasNonWageIncome})
+        segments = self._segments(non_wage_edges)
+        return [ScenarioResult(values, self._transitions(rules, segments))
+                for values, rules in zip(scenarios, rule_sets)]
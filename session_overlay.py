@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Copy-on-write session knowledge bases.
+A TaxSession layers a small writable graph over the graph of a shared,
+already loaded TaxReasoningEngine, so many isolated sessions can run without
+re-parsing the ontology or duplicating its triples.
+"""
+
+from typing import Iterable, List
+from rdflib import Graph
+
+from tax_reasoning_engine import TaxReasoningEngine
+from consistency_validator import ConsistencyValidator
+
+
+class OverlayGraph(Graph):
+    """
+    Graph whose reads see base + overlay and whose writes go to the overlay only.
+    Triples already present in the base are never copied; removing them only
+    hides them in this overlay. The base must not be modified while overlays
+    are in use.
+    """
+
+    def __init__(self, base: Graph):
+        super().__init__()
+        self.base = base
+        self.namespace_manager = base.namespace_manager
+        self.hidden = set()  # base triples removed through this overlay
+
+    def add(self, triple):
+        if triple in self.base:
+            self.hidden.discard(triple)
+            return self
+        return super().add(triple)
+
+    def remove(self, triple):
+        super().remove(triple)
+        self.hidden.update(self.base.triples(triple))
+        return self
+
+    def addN(self, quads: Iterable):
+        for s, p, o, _ in quads:
+            self.add((s, p, o))
+        return self
+
+    def triples(self, triple):
+        # Overlay triples never duplicate base triples, so plain chaining is enough
+        if self.hidden:
+            yield from (found for found in self.base.triples(triple) if found not in self.hidden)
+        else:
+            yield from self.base.triples(triple)
+        yield from super().triples(triple)
+
+    def copy(self) -> "OverlayGraph":
+        """New overlay on the same base holding a copy of this overlay's triples"""
+        clone = OverlayGraph(self.base)
+        Graph.addN(clone, ((s, p, o, clone) for s, p, o in self.overlay_triples()))
+        clone.hidden = set(self.hidden)
+        return clone
+
+    def overlay_triples(self, triple=(None, None, None)):
+        """Triples written to this overlay, without the base"""
+        return super().triples(triple)
+
+    def overlay_subjects(self) -> List:
+        """Subjects with at least one triple in this overlay"""
+        return list(dict.fromkeys(s for s, _, _ in self.overlay_triples()))
+
+    def overlay_size(self) -> int:
+        return super().__len__()
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.hidden) + self.overlay_size()
+
+
+class TaxSession(TaxReasoningEngine):
+    """
+    Isolated scratch knowledge base sharing the ontology of another engine.
+    Entities and inferred types live only in the session overlay; discard()
+    drops them in O(1) by replacing the overlay.
+    """
+
+    def __init__(self, shared: TaxReasoningEngine):
+        # The shared engine already parsed and inferred the ontology; overlay entities are classified eagerly
+        super().__init__(shared=shared)
+        self.shared = shared
+        self._published = (0, OverlayGraph(shared.graph))
+
+    def _next_generation_graph(self) -> Graph:
+        # Only the overlay is copied; the shared generation stays the common base
+        return self.graph.copy()
+
+    def _inference_scope(self, graph: Graph):
+        # The shared graph is already inferred; only subjects written in the session can change
+        return graph.overlay_subjects() if isinstance(graph, OverlayGraph) else None
+
+    def compiled_rules(self):
+        return self.shared.compiled_rules()
+
+    def _uses_replaced_rules(self) -> bool:
+        return self.shared._uses_replaced_rules()
+
+    def discard(self):
+        """Forget everything written in this session"""
+        self.graph = OverlayGraph(self.shared.graph)
+        self.validator = ConsistencyValidator.from_graph(self.shared.graph)
+        self._population_counters = None
+
+    def __enter__(self) -> "TaxSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.discard()
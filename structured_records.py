@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Classification of fixed-layout binary taxpayer records.
+Accepts NumPy structured arrays, or any buffer-protocol object together
+with its dtype, whose field names follow TaxEntity. Fields are read as
+strided views and flags are packed per chunk, so no per-row Python objects
+are created; status codes go straight into a caller-provided buffer.
+
+Layouts: annual_income (NaN = no wage income) and optional
+has_non_wage_income as floats, plus either one boolean field per flag
+(missing flags take their TaxEntity default) or a packed "flags" word in
+FLAG_PROPERTIES bit order.
+"""
+
+from typing import Iterable, Optional
+import numpy as np
+
+from tax_reasoning_engine import TaxEntity, FLAG_PROPERTIES
+from compiled_rules import CompiledRuleSet, DEFAULT_FLAGS, pack_flags, set_flag_column, status_of_columns
+
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# One boolean per flag, mirroring the TaxEntity fields
+TAXPAYER_DTYPE = np.dtype([("annual_income", "<f8"), ("has_non_wage_income", "<f8")]
+                          + [(field_name, "?") for field_name, _, _ in FLAG_PROPERTIES])
+
+# Flags packed into one word, as in the columnar taxpayer store
+PACKED_TAXPAYER_DTYPE = np.dtype([("annual_income", "<f8"), ("has_non_wage_income", "<f8"), ("flags", "<u4")])
+
+
+def as_records(records, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """View records as a structured array without copying"""
+    if isinstance(records, np.ndarray) and records.dtype.names:
+        return records
+    if dtype is None:
+        raise ValueError("A dtype is required for buffer input that is not a structured array")
+    dtype = np.dtype(dtype)
+    if not dtype.names or "annual_income" not in dtype.names:
+        raise ValueError("Record dtype must be structured and contain an annual_income field")
+    return np.frombuffer(records, dtype=dtype)
+
+
+def _check_fields(records: np.ndarray):
+    names = set(records.dtype.names)
+    if "annual_income" not in names:
+        raise ValueError("Records have no annual_income field")
+    known = {"annual_income", "has_non_wage_income", "flags"} | {f for f, _, _ in FLAG_PROPERTIES}
+    unknown = names - known
+    if unknown:
+        raise ValueError(f"Unknown record fields: {sorted(unknown)}")
+    if "flags" in names and names & {f for f, _, _ in FLAG_PROPERTIES}:
+        raise ValueError("Records must use either a packed flags field or per-flag fields, not both")
+
+
+def pack_record_flags(records: np.ndarray) -> np.ndarray:
+    """Packed flags for a chunk of records (defaults for flags without a field)"""
+    if "flags" in records.dtype.names:
+        return records["flags"].astype(np.uint32, copy=False)
+    flags = np.full(len(records), DEFAULT_FLAGS, dtype=np.uint32)
+    for field_name, _, _ in FLAG_PROPERTIES:
+        if field_name in records.dtype.names:
+            flags = set_flag_column(flags, field_name, records[field_name] != 0)
+    return flags
+
+
+def classify_structured(rules: CompiledRuleSet, records, out=None, dtype: Optional[np.dtype] = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Write one status code per record into out (any writable uint8 buffer;
+    allocated when omitted) and return it as an array.
+    """
+    records = as_records(records, dtype)
+    _check_fields(records)
+    if out is None:
+        out = np.empty(len(records), dtype=np.uint8)
+    result = out if isinstance(out, np.ndarray) else np.frombuffer(out, dtype=np.uint8)
+    if result.dtype != np.uint8 or len(result) < len(records):
+        raise ValueError(f"Output buffer must hold {len(records)} uint8 status codes")
+    has_non_wage = "has_non_wage_income" in records.dtype.names
+
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        wage = chunk["annual_income"].astype(np.float64, copy=False)
+        non_wage = chunk["has_non_wage_income"].astype(np.float64, copy=False) if has_non_wage \
+            else np.zeros(len(chunk))
+        membership = rules.classify_columns(wage, non_wage, pack_record_flags(chunk))
+        result[start:start + len(chunk)] = status_of_columns(membership)
+    return result
+
+
+def to_records(entities: Iterable[TaxEntity], dtype: np.dtype = TAXPAYER_DTYPE) -> np.ndarray:
+    """Build a structured array from TaxEntity objects (for tests and adapters)"""
+    entities = list(entities)
+    records = np.zeros(len(entities), dtype=dtype)
+    records["annual_income"] = [np.nan if e.annual_income is None else e.annual_income for e in entities]
+    records["has_non_wage_income"] = [e.has_non_wage_income or 0.0 for e in entities]
+    if "flags" in dtype.names:
+        records["flags"] = [pack_flags(e) for e in entities]
+    else:
+        for field_name, _, _ in FLAG_PROPERTIES:
+            records[field_name] = [bool(getattr(e, field_name)) for e in entities]
+    return records
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+RDF namespaces of the tax ontology and the person knowledge base.
+Kept apart from tax_reasoning_engine so modules the engine itself imports
+(e.g. consistency_validator) can use them without a circular import.
+"""
+
+from rdflib import Namespace
+
+
+TAX = Namespace("http://example.org/austrian-tax-resident#")
+PERSON_KB = Namespace("http://example.org/person-kb#")
@@ -5,15 +5,15 @@ Uses basic RDF inference to determine filing obligations for individuals and ent
 """
 
 import sys
+import threading
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
-from rdflib import Graph, Namespace, Literal, URIRef, BNode
+from rdflib import Graph, Literal, URIRef, BNode
 from rdflib.namespace import RDF, RDFS, OWL, XSD
 
-
-# Define namespaces
-TAX = Namespace("http://example.org/austrian-tax-resident#")
-PERSON_KB = Namespace("http://example.org/person-kb#")
+from tax_namespaces import TAX, PERSON_KB
+from consistency_validator import ConsistencyValidator
 
 
 @dataclass
@@ -50,19 +50,127 @@ class TaxEntity:
     has_self_employment_income: bool = False
 
 
+# Boolean TaxEntity fields with their ontology property and documented default.
+# In sparse mode only values that differ from the default are written to the graph.
+FLAG_PROPERTIES: List[Tuple[str, URIRef, bool]] = [
+    # L1 Mandatory Filing Conditions
+    ("has_incorrect_tax_credits", TAX.hasIncorrectTaxCredits, False),
+    ("has_multiple_employments_without_joint_tax", TAX.hasMultipleEmploymentsWithoutJointTax, False),
+    ("has_incorrect_commuter_allowance", TAX.hasIncorrectCommuterAllowance, False),
+    ("has_incorrect_family_bonus", TAX.hasIncorrectFamilyBonus, False),
+    # Additional L1 Mandatory Filing Conditions
+    ("has_filed_employment_tax", TAX.hasFiledEmploymentTax, True),
+    ("has_special_payment_situations", TAX.hasSpecialPaymentSituations, False),
+    ("has_discretionary_assessment", TAX.hasDiscretionaryAssessment, False),
+    # Voluntary L1 Filing Conditions
+    ("has_single_employer", TAX.hasSingleEmployer, False),
+    ("has_correct_wage_tax", TAX.hasCorrectWageTax, False),
+    ("has_varying_income_no_rollup", TAX.hasVaryingIncomeNoRollup, False),
+    ("has_employer_change", TAX.hasEmployerChange, False),
+    ("has_sv_repayment_eligibility", TAX.hasSVRepaymentEligibility, False),
+    ("has_unclaimed_tax_credits", TAX.hasUnclaimedTaxCredits, False),
+    ("has_unclaimed_deductions", TAX.hasUnclaimedDeductions, False),
+]
+
+# Interned literals shared by every entity instead of one object per triple
+TRUE_LITERAL = Literal(True, datatype=XSD.boolean)
+FALSE_LITERAL = Literal(False, datatype=XSD.boolean)
+
+
+@lru_cache(maxsize=4096)
+def decimal_literal(value: float) -> Literal:
+    """Return a shared xsd:decimal literal for an income amount"""
+    return Literal(value, datatype=XSD.decimal)
+
+
 class TaxReasoningEngine:
     """
     Main reasoning engine for Austrian tax filing requirements.
     Uses basic RDF inference to determine filing obligations.
     """
     
-    def __init__(self, ontology_path: str = "austrian_tax_ontology.ttl"):
-        """Initialize the reasoning engine with the ontology"""
-        self.graph = Graph()
+    def __init__(self, ontology_path: str = "austrian_tax_ontology.ttl", sparse: bool = False,
+                 lazy: bool = False, shared: Optional["TaxReasoningEngine"] = None):
+        """
+        Initialize the reasoning engine with the ontology.
+        With sparse=True entities are stored with only their non-default facts.
+        With lazy=True filer types are not materialized but derived when queried.
+        With shared=another engine the ontology is not loaded again: the new
+        engine starts empty and takes the ontology settings of shared (the
+        subclasses layer their graphs over shared.graph).
+        """
+        # (generation, graph) is swapped as one tuple so readers always see a consistent pair
+        self._published = (0, Graph())
+        self._write_lock = threading.Lock()
         self.ontology_path = ontology_path
+        self.sparse = sparse
+        self.lazy = lazy
+        self._compiled_rules = None
+        self._query_cache = None
+        self._income_index = None
+        self._population_counters = None
+        self._rules_replaced = False
+        # Optional DecisionSink that persists every filing decision
+        self.decision_sink = None
+        if shared is not None:
+            self.ontology_path = shared.ontology_path
+            self.sparse = shared.sparse
+            self.ontology = shared.ontology
+            self.validator = ConsistencyValidator.from_graph(shared.graph)
+            return
         self.load_ontology()
+        self.validator = ConsistencyValidator.from_graph(self.graph)
         self.setup_reasoner()
     
+    @property
+    def graph(self) -> Graph:
+        """The currently published, fully inferred graph generation"""
+        return self._published[1]
+    
+    @graph.setter
+    def graph(self, graph: Graph):
+        self._published = (self._published[0] + 1, graph)
+    
+    @property
+    def generation(self) -> int:
+        """Counter bumped every time a new graph generation is published"""
+        return self._published[0]
+    
+    def snapshot(self) -> Tuple[int, Graph]:
+        """
+        Return (generation, graph) for a consistent read.
+        The returned graph is never mutated again; later ingests publish a new one.
+        """
+        return self._published
+    
+    def _next_generation_graph(self) -> Graph:
+        """Private copy of the published graph for a writer to build on"""
+        if self.lazy:
+            from lazy_inference import LazyOverlayGraph
+            
+            # Nothing is materialized, so writes go to an overlay instead of a copy
+            return LazyOverlayGraph.over(self.graph, self.compiled_rules)
+        graph = Graph()
+        graph.namespace_manager = self.graph.namespace_manager
+        graph += self.graph
+        return graph
+    
+    def _delta_graph(self) -> Graph:
+        """
+        Writable overlay on the published graph for writers that touch few triples.
+        Unlike _next_generation_graph() this does not copy the published graph:
+        the new generation reads through to it (an existing overlay is copied
+        instead of stacked, and the next full copy flattens it again).
+        Lazy engines always write through an overlay (LazyOverlayGraph).
+        """
+        from session_overlay import OverlayGraph
+        
+        if self.lazy:
+            return self._next_generation_graph()
+        if isinstance(self.graph, OverlayGraph):
+            return self.graph.copy()
+        return OverlayGraph(self.graph)
+    
     def load_ontology(self):
         """Load the OWL ontology from file"""
         try:
@@ -74,7 +182,10 @@ class TaxReasoningEngine:
             else:
                 format_type = "turtle"  # default to turtle
                 
-            self.graph.parse(self.ontology_path, format=format_type)
+            # Kept apart as well, so a reload can tell which triples a new version removes
+            self.ontology = Graph()
+            self.ontology.parse(self.ontology_path, format=format_type)
+            self.graph += self.ontology
             print(f"Loaded ontology from {self.ontology_path} (format: {format_type})")
             print(f"Graph contains {len(self.graph)} triples")
         except Exception as e:
@@ -82,153 +193,360 @@ class TaxReasoningEngine:
             sys.exit(1)
     
     def setup_reasoner(self):
-        """Setup basic RDF inference"""
+        """Setup basic RDF inference and publish the result as a new generation"""
+        with self._write_lock:
+            graph = self._next_generation_graph()
+            if not self.lazy:
+                self._apply_inference(graph)
+            self.graph = graph
+    
+    def _apply_inference(self, graph: Graph):
+        """Apply basic RDF inference to a graph that is not yet visible to readers"""
         try:
+            violations_before = self.validator.violation_count
+            
+            scope = self._inference_scope(graph)
+            
             # Apply basic RDFS inference
-            for s, p, o in self.graph.triples((None, RDFS.subClassOf, None)):
-                for s2, p2, o2 in self.graph.triples((None, RDF.type, s)):
-                    self.graph.add((s2, RDF.type, o))
+            for s, p, o in graph.triples((None, RDFS.subClassOf, None)):
+                for s2, p2, o2 in self._scoped_triples(graph, scope, (None, RDF.type, s)):
+                    graph.add((s2, RDF.type, o))
             
             # Apply basic property inference
-            for s, p, o in self.graph.triples((None, RDFS.subPropertyOf, None)):
-                for s2, p2, o2 in self.graph.triples((None, s, None)):
-                    self.graph.add((s2, o, o2))
+            for s, p, o in graph.triples((None, RDFS.subPropertyOf, None)):
+                for s2, p2, o2 in self._scoped_triples(graph, scope, (None, s, None)):
+                    graph.add((s2, o, o2))
+            
+            # Rules swapped in by reclassify() take over from the built-in rules below
+            replaced = self._uses_replaced_rules()
+            if replaced:
+                self._apply_compiled_rules(graph, scope)
             
             # Apply custom tax classification rules
-            for entity_uri, _, _ in self.graph.triples((None, RDF.type, TAX.AustrianResident)):
+            residents = () if replaced else self._scoped_triples(graph, scope, (None, RDF.type, TAX.AustrianResident))
+            for entity_uri, _, _ in list(residents):
                 # Get annual wage income
                 annual_wage = 0.0
-                for _, _, income in self.graph.triples((entity_uri, TAX.hasAnnualWageIncome, None)):
+                for _, _, income in graph.triples((entity_uri, TAX.hasAnnualWageIncome, None)):
                     annual_wage = float(income)
                     break
                 # Get non-wage income
                 non_wage_income = 0.0
-                for _, _, income in self.graph.triples((entity_uri, TAX.hasNonWageIncome, None)):
+                for _, _, income in graph.triples((entity_uri, TAX.hasNonWageIncome, None)):
                     non_wage_income = float(income)
                     break
+                # --- MANDATORY E1 FILER LOGIC ---
+                if non_wage_income > 730.0:
+                    self._add_inferred_type(graph, entity_uri, TAX.MandatoryE1Filer)
+                    self._add_inferred_type(graph, entity_uri, TAX.MandatoryFilingE1)
                 # --- MANDATORY L1 FILER LOGIC (MERGED) ---
                 is_mandatory_l1 = False
                 # Case 1: Wage > 14,517 AND (any of the three triggers)
                 if annual_wage > 14517.0 and any([
-                    (entity_uri, TAX.hasMultipleEmploymentsWithoutJointTax, Literal(True)) in self.graph,
-                    (entity_uri, TAX.hasIncorrectCommuterAllowance, Literal(True)) in self.graph,
-                    (entity_uri, TAX.hasIncorrectFamilyBonus, Literal(True)) in self.graph
+                    (entity_uri, TAX.hasMultipleEmploymentsWithoutJointTax, TRUE_LITERAL) in graph,
+                    (entity_uri, TAX.hasIncorrectCommuterAllowance, TRUE_LITERAL) in graph,
+                    (entity_uri, TAX.hasIncorrectFamilyBonus, TRUE_LITERAL) in graph
                 ]):
                     is_mandatory_l1 = True
                 # Case 2: Wage >= 13308 AND employment tax NOT filed
-                if annual_wage >= 13308.0 and (entity_uri, TAX.hasFiledEmploymentTax, Literal(False)) in self.graph:
+                if annual_wage >= 13308.0 and (entity_uri, TAX.hasFiledEmploymentTax, FALSE_LITERAL) in graph:
                     is_mandatory_l1 = True
                 # Case 3: Special payment situations
-                if (entity_uri, TAX.hasSpecialPaymentSituations, Literal(True)) in self.graph:
+                if (entity_uri, TAX.hasSpecialPaymentSituations, TRUE_LITERAL) in graph:
                     is_mandatory_l1 = True
                 # Case 4: Discretionary assessment
-                if (entity_uri, TAX.hasDiscretionaryAssessment, Literal(True)) in self.graph:
+                if (entity_uri, TAX.hasDiscretionaryAssessment, TRUE_LITERAL) in graph:
                     is_mandatory_l1 = True
                 # Case 5: Incorrect tax credits (standalone)
-                if (entity_uri, TAX.hasIncorrectTaxCredits, Literal(True)) in self.graph:
+                if (entity_uri, TAX.hasIncorrectTaxCredits, TRUE_LITERAL) in graph:
                     is_mandatory_l1 = True
-                if is_mandatory_l1:
-                    self.graph.add((entity_uri, RDF.type, TAX.MandatoryL1Filer))
-                    self.graph.add((entity_uri, RDF.type, TAX.MandatoryFilingL1))
+                # Mandatory L1 excludes E1 filers (owl:complementOf in the ontology)
+                if is_mandatory_l1 and (entity_uri, RDF.type, TAX.MandatoryE1Filer) not in graph:
+                    self._add_inferred_type(graph, entity_uri, TAX.MandatoryL1Filer)
+                    self._add_inferred_type(graph, entity_uri, TAX.MandatoryFilingL1)
                 # --- VOLUNTARY L1 FILER LOGIC ---
                 is_voluntary_l1 = False
-                if (entity_uri, RDF.type, TAX.MandatoryL1Filer) not in self.graph and (entity_uri, RDF.type, TAX.MandatoryE1Filer) not in self.graph:
+                if (entity_uri, RDF.type, TAX.MandatoryL1Filer) not in graph and (entity_uri, RDF.type, TAX.MandatoryE1Filer) not in graph:
                     # Case 1: Single employer with correct wage tax
-                    if (entity_uri, TAX.hasSingleEmployer, Literal(True)) in self.graph and (entity_uri, TAX.hasCorrectWageTax, Literal(True)) in self.graph:
+                    if (entity_uri, TAX.hasSingleEmployer, TRUE_LITERAL) in graph and (entity_uri, TAX.hasCorrectWageTax, TRUE_LITERAL) in graph:
                         is_voluntary_l1 = True
                     # Case 2: Any of the refund/voluntary triggers
                     if any([
-                        (entity_uri, TAX.hasVaryingIncomeNoRollup, Literal(True)) in self.graph,
-                        (entity_uri, TAX.hasEmployerChange, Literal(True)) in self.graph,
-                        (entity_uri, TAX.hasSVRepaymentEligibility, Literal(True)) in self.graph,
-                        (entity_uri, TAX.hasUnclaimedTaxCredits, Literal(True)) in self.graph,
-                        (entity_uri, TAX.hasUnclaimedDeductions, Literal(True)) in self.graph
+                        (entity_uri, TAX.hasVaryingIncomeNoRollup, TRUE_LITERAL) in graph,
+                        (entity_uri, TAX.hasEmployerChange, TRUE_LITERAL) in graph,
+                        (entity_uri, TAX.hasSVRepaymentEligibility, TRUE_LITERAL) in graph,
+                        (entity_uri, TAX.hasUnclaimedTaxCredits, TRUE_LITERAL) in graph,
+                        (entity_uri, TAX.hasUnclaimedDeductions, TRUE_LITERAL) in graph
                     ]):
                         is_voluntary_l1 = True
                 if is_voluntary_l1:
-                    self.graph.add((entity_uri, RDF.type, TAX.VoluntaryL1Filer))
-                    self.graph.add((entity_uri, RDF.type, TAX.VoluntaryFilingL1))
-                # --- MANDATORY E1 FILER LOGIC ---
-                if non_wage_income > 730.0:
-                    self.graph.add((entity_uri, RDF.type, TAX.MandatoryE1Filer))
-                    self.graph.add((entity_uri, RDF.type, TAX.MandatoryFilingE1))
+                    self._add_inferred_type(graph, entity_uri, TAX.VoluntaryL1Filer)
+                    self._add_inferred_type(graph, entity_uri, TAX.VoluntaryFilingL1)
                 # --- NO FILING REQUIRED ---
                 if not any([
-                    (entity_uri, RDF.type, TAX.MandatoryL1Filer) in self.graph,
-                    (entity_uri, RDF.type, TAX.VoluntaryL1Filer) in self.graph,
-                    (entity_uri, RDF.type, TAX.MandatoryE1Filer) in self.graph
+                    (entity_uri, RDF.type, TAX.MandatoryL1Filer) in graph,
+                    (entity_uri, RDF.type, TAX.VoluntaryL1Filer) in graph,
+                    (entity_uri, RDF.type, TAX.MandatoryE1Filer) in graph
                 ]):
-                    self.graph.add((entity_uri, RDF.type, TAX.NoFilingRequired))
+                    self._add_inferred_type(graph, entity_uri, TAX.NoFilingRequired)
             
             print("Basic RDF inference applied successfully")
-            print(f"Graph expanded to {len(self.graph)} triples after inference")
+            print(f"Graph expanded to {len(graph)} triples after inference")
+            new_violations = self.validator.violation_count - violations_before
+            if new_violations:
+                print(f"Consistency check: {new_violations} new violation(s) detected")
         except Exception as e:
             print(f"Error during inference: {e}")
     
+    def _inference_scope(self, graph: Graph) -> Optional[List[URIRef]]:
+        """Subjects inference has to look at, or None for every subject of graph"""
+        return None
+    
+    @staticmethod
+    def _scoped_triples(graph: Graph, scope: Optional[List[URIRef]], pattern):
+        """graph.triples(pattern), restricted to the subjects in scope unless it is None"""
+        if scope is None:
+            return graph.triples(pattern)
+        return [triple for subject in scope for triple in graph.triples((subject,) + tuple(pattern[1:]))]
+    
+    def _apply_compiled_rules(self, graph: Graph, scope: Optional[List[URIRef]] = None):
+        """Classify the residents of graph (those in scope, if given) with the compiled rules"""
+        from compiled_rules import derived_types
+        from population_counters import resident_columns
+        
+        subjects, wage, non_wage, flags = resident_columns(graph, scope)
+        for entity_uri, membership in zip(subjects, self.compiled_rules().classify_columns(wage, non_wage, flags)):
+            for class_uri in derived_types(int(membership)):
+                self._add_inferred_type(graph, entity_uri, class_uri)
+    
+    def _uses_replaced_rules(self) -> bool:
+        """True once reclassify() replaced the rules compiled from the ontology"""
+        return self._rules_replaced
+    
+    def _add_inferred_type(self, graph: Graph, entity_uri: URIRef, class_uri: URIRef):
+        """Assert an inferred type and feed it to the consistency validator"""
+        graph.add((entity_uri, RDF.type, class_uri))
+        self.validator.observe(entity_uri, class_uri)
+    
+    def check_consistency(self):
+        """Stream disjointness and priority violations found since the last call"""
+        return self.validator.drain()
+    
+    def compiled_rules(self):
+        """Filer rules compiled from the loaded ontology (compiled once, then cached)"""
+        from compiled_rules import compile_rules
+        
+        if self._compiled_rules is None:
+            self._compiled_rules = compile_rules(self.graph)
+        return self._compiled_rules
+    
+    def reclassify(self, rules, ontology_changes: Optional[Tuple[Graph, Graph]] = None):
+        """
+        Switch to another compiled rule set, e.g. after a threshold changed mid-year.
+        The old and new rules are diffed into the income cells and flag patterns
+        where they disagree; only residents found there through the income index
+        are re-evaluated and retyped. ontology_changes are (removed, added)
+        ontology triples published in the same generation. Returns the
+        Reclassification with the change feed of (entity, old status, new status).
+        """
+        from compiled_rules import DERIVED_CLASSES, derived_types
+        from income_index import IncomeIndex, register
+        from reclassification import reclassify
+        
+        index = self.income_index()
+        with self._write_lock:
+            if index.generation != self.generation:
+                index = IncomeIndex.from_graph(self.graph, self.generation)
+            result = reclassify(self.graph, index, self.compiled_rules(), rules)
+            # Retyping touches only the changed residents; publish it as a delta instead of a full copy
+            graph = self._delta_graph()
+            if ontology_changes is not None:
+                removed, added = ontology_changes
+                for triple in removed:
+                    graph.remove(triple)
+                graph += added
+            for change in result.changes:
+                if self.lazy:
+                    graph.forget(change.entity)
+                    continue
+                for class_uri in DERIVED_CLASSES:
+                    graph.remove((change.entity, RDF.type, class_uri))
+                    self.validator.retract(change.entity, class_uri)
+                for class_uri in derived_types(change.membership):
+                    self._add_inferred_type(graph, change.entity, class_uri)
+            self._compiled_rules = rules
+            self._rules_replaced = True
+            self.graph = graph
+            # Incomes did not change, so the index carries over; rule hits must be recounted
+            self._income_index = register(graph, IncomeIndex(self.generation, index.indexes))
+            self._population_counters = None
+        return result
+    
+    def income_index(self):
+        """
+        Sorted index of the income properties for the current generation.
+        Built on first use, then maintained by ingest_entities; it also lets
+        SPARQL range FILTERs on these properties skip the full scan.
+        """
+        from income_index import IncomeIndex, install_filter_pushdown
+        
+        install_filter_pushdown()
+        generation, graph = self.snapshot()
+        index = self._income_index
+        if index is None or index.generation != generation:
+            index = self._income_index = IncomeIndex.from_graph(graph, generation)
+        return index
+    
+    def population_counters(self):
+        """
+        Running status, rule-hit and wage-band counts of all residents.
+        Seeded from the graph on first use (and again after the rules changed),
+        then updated by every ingest; reading them is O(1) (see PopulationCounters.as_dict).
+        """
+        from population_counters import PopulationCounters
+        
+        with self._write_lock:
+            counters = self._population_counters
+            if counters is None or counters.rules is not self.compiled_rules():
+                self._population_counters = PopulationCounters.from_graph(self.graph, self.compiled_rules())
+        return self._population_counters
+    
+    def query_cache(self):
+        """SPARQL plan and result cache tied to this engine's generations (created on first use)"""
+        from query_cache import QueryCache
+        
+        if self._query_cache is None:
+            self._query_cache = QueryCache(self)
+        return self._query_cache
+    
+    def query(self, sparql: str, initBindings=None, initNs=None):
+        """Run SPARQL against the current generation; repeated queries are answered from the cache"""
+        return self.query_cache().query(sparql, initBindings=initBindings, initNs=initNs)
+    
+    def classify_store(self, store, out=None, chunk_size: int = 1 << 20):
+        """
+        Stream a columnar taxpayer store through the compiled rules.
+        Returns one status code per row (see compiled_rules.STATUS_NAMES).
+        """
+        from taxpayer_store import classify_store
+        
+        if self.decision_sink is None:
+            return classify_store(store, self.compiled_rules(), out=out, chunk_size=chunk_size)
+        # The sink classifies with rule hits anyway; take the status codes from the same pass
+        if out is None:
+            out = store.create_column("status", "uint8")
+        self.decision_sink.record_store(store, self.compiled_rules(), chunk_size=chunk_size, out=out)
+        return out
+    
+    def scenario_sweep(self, grid):
+        """
+        Transition matrices (current status -> scenario status) of all residents
+        for every combination of threshold values in grid (see ScenarioSweep.sweep).
+        """
+        from scenario_sweep import ScenarioSweep
+        
+        return ScenarioSweep.from_graph(self.graph, self.compiled_rules()).sweep(grid)
+    
+    def watch_ontology(self, poll_interval: float = 1.0):
+        """Start reloading the ontology in the background whenever its file changes"""
+        from ontology_reload import OntologyReloader
+        
+        return OntologyReloader(self, poll_interval=poll_interval).start()
+    
+    def session(self):
+        """Open a copy-on-write session that shares this engine's loaded ontology"""
+        from session_overlay import TaxSession
+        
+        return TaxSession(self)
+    
+    def batched(self):
+        """Open a knowledge base that keeps each ingest batch in its own named graph"""
+        from batch_graphs import BatchedTaxEngine
+        
+        return BatchedTaxEngine(self)
+    
     def add_entity_to_kb(self, entity: TaxEntity):
         """Add a tax entity to the knowledge base"""
+        self.ingest_entities([entity])
+        print(f"Added entity {entity.name} ({entity.id}) to knowledge base")
+    
+    def ingest_entities(self, entities: List[TaxEntity]):
+        """
+        Add a batch of entities and run inference once on the next graph generation.
+        Readers keep querying the previous generation until the new one is swapped in.
+        """
+        with self._write_lock:
+            graph = self._next_generation_graph()
+            for entity in entities:
+                self._write_entity(graph, entity)
+            if not self.lazy:
+                self._apply_inference(graph)
+            previous = self.generation
+            self.graph = graph
+            if self._population_counters is not None:
+                self._population_counters.update_entities(entities)
+            # Carry the income index over by inserting only the pairs written now
+            index = self._income_index
+            if index is not None and index.generation == previous:
+                self._income_index = index.updated(graph, {PERSON_KB[entity.id] for entity in entities},
+                                                   self.generation)
+    
+    def ingest_monthly_wages(self, entities: List[TaxEntity], monthly, rolled_up=None, year=2025):
+        """
+        Ingest entities whose wages are given per month (a persons x 12 matrix, one row per entity).
+        annual_income, has_varying_income_no_rollup and has_sv_repayment_eligibility are
+        derived from the wages (see wage_timeseries.derive_flags) instead of taken from the entities.
+        """
+        from wage_timeseries import with_monthly_wages
+        
+        self.ingest_entities(with_monthly_wages(entities, monthly, rolled_up, year))
+    
+    def add_household_links(self, partners: List[Tuple[str, str]] = (), children: List[Tuple[str, str]] = ()):
+        """
+        Record partner and child relationships between entity ids.
+        Household links do not change the filing classes, so no inference is run.
+        """
+        with self._write_lock:
+            graph = self._next_generation_graph()
+            for person_id, partner_id in partners:
+                graph.add((PERSON_KB[person_id], TAX.hasPartner, PERSON_KB[partner_id]))
+                graph.add((PERSON_KB[partner_id], TAX.hasPartner, PERSON_KB[person_id]))
+            for parent_id, child_id in children:
+                graph.add((PERSON_KB[parent_id], TAX.hasChild, PERSON_KB[child_id]))
+            self.graph = graph
+    
+    def _write_entity(self, graph: Graph, entity: TaxEntity):
+        """Write the asserted facts of one entity into graph"""
         entity_uri = PERSON_KB[entity.id]
         
         # Add basic type information
         if entity.entity_type == "Person":
-            self.graph.add((entity_uri, RDF.type, TAX.AustrianResident))
+            graph.add((entity_uri, RDF.type, TAX.AustrianResident))
         
-        # Add income properties
+        # Add income properties (a missing non-wage income reads as 0.0 during inference)
         if entity.annual_income is not None:
-            self.graph.add((entity_uri, TAX.hasAnnualWageIncome, 
-                           Literal(entity.annual_income, datatype=XSD.decimal)))
-        
-        if entity.has_non_wage_income is not None:
-            self.graph.add((entity_uri, TAX.hasNonWageIncome,
-                           Literal(entity.has_non_wage_income, datatype=XSD.decimal)))
-        
-        # Add L1 Mandatory Filing Conditions
-        self.graph.add((entity_uri, TAX.hasIncorrectTaxCredits,
-                       Literal(entity.has_incorrect_tax_credits, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasMultipleEmploymentsWithoutJointTax,
-                       Literal(entity.has_multiple_employments_without_joint_tax, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasIncorrectCommuterAllowance,
-                       Literal(entity.has_incorrect_commuter_allowance, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasIncorrectFamilyBonus,
-                       Literal(entity.has_incorrect_family_bonus, datatype=XSD.boolean)))
-        
-        # Add Additional L1 Mandatory Filing Conditions
-        self.graph.add((entity_uri, TAX.hasFiledEmploymentTax,
-                       Literal(entity.has_filed_employment_tax, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasSpecialPaymentSituations,
-                       Literal(entity.has_special_payment_situations, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasDiscretionaryAssessment,
-                       Literal(entity.has_discretionary_assessment, datatype=XSD.boolean)))
-        
-        # Add Voluntary L1 Filing Conditions
-        self.graph.add((entity_uri, TAX.hasSingleEmployer,
-                       Literal(entity.has_single_employer, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasCorrectWageTax,
-                       Literal(entity.has_correct_wage_tax, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasVaryingIncomeNoRollup,
-                       Literal(entity.has_varying_income_no_rollup, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasEmployerChange,
-                       Literal(entity.has_employer_change, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasSVRepaymentEligibility,
-                       Literal(entity.has_sv_repayment_eligibility, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasUnclaimedTaxCredits,
-                       Literal(entity.has_unclaimed_tax_credits, datatype=XSD.boolean)))
-        self.graph.add((entity_uri, TAX.hasUnclaimedDeductions,
-                       Literal(entity.has_unclaimed_deductions, datatype=XSD.boolean)))
-        
-        # Re-run inference after adding new data
-        self.setup_reasoner()
-        print(f"Added entity {entity.name} ({entity.id}) to knowledge base")
+            graph.add((entity_uri, TAX.hasAnnualWageIncome, decimal_literal(entity.annual_income)))
+        
+        if entity.has_non_wage_income is not None and not (self.sparse and entity.has_non_wage_income == 0.0):
+            graph.add((entity_uri, TAX.hasNonWageIncome, decimal_literal(entity.has_non_wage_income)))
+        
+        # Add L1/E1 filing condition flags; absent flags take their default during inference
+        for field_name, prop, default in FLAG_PROPERTIES:
+            value = bool(getattr(entity, field_name))
+            if self.sparse and value == default:
+                continue
+            graph.add((entity_uri, prop, TRUE_LITERAL if value else FALSE_LITERAL))
     
     def check_filing_requirement(self, entity_id: str) -> Dict[str, Any]:
         """
         Check filing requirements for a specific entity
         Returns a dictionary with filing status and reasoning
         """
+        graph = self.graph
         entity_uri = PERSON_KB[entity_id]
         
         # Check if entity exists
-        if (entity_uri, None, None) not in self.graph:
+        if (entity_uri, None, None) not in graph:
             return {"error": f"Entity {entity_id} not found in knowledge base"}
         
         result = {
@@ -255,7 +573,7 @@ class TaxReasoningEngine:
         filing_requirement = None
         
         # Check inferred classes
-        for _, _, class_uri in self.graph.triples((entity_uri, RDF.type, None)):
+        for _, _, class_uri in graph.triples((entity_uri, RDF.type, None)):
             if class_uri in base_classes:
                 continue
             
@@ -283,6 +601,7 @@ class TaxReasoningEngine:
         # Add filing requirement to result
         if filing_requirement:
             result["filing_requirement"] = filing_requirement
+            self._record_decision(graph, entity_uri, entity_id, filing_requirement)
         
         # Check specific rule classes
         rule_classes = [
@@ -296,7 +615,7 @@ class TaxReasoningEngine:
         ]
         
         for rule_class, description in rule_classes:
-            if (entity_uri, RDF.type, rule_class) in self.graph:
+            if (entity_uri, RDF.type, rule_class) in graph:
                 result["reasons"].append(f"Matches rule: {description}")
         
         return result
@@ -306,6 +625,7 @@ class TaxReasoningEngine:
         Query entities by their filing status
         status can be: 'must_file', 'optional', 'no_filing'
         """
+        graph = self.graph
         if status == 'must_file':
             class_uri = TAX.MandatoryFilingL1
         elif status == 'optional':
@@ -316,7 +636,7 @@ class TaxReasoningEngine:
             return []
         
         entities = []
-        for entity_uri, _, _ in self.graph.triples((None, RDF.type, class_uri)):
+        for entity_uri, _, _ in graph.triples((None, RDF.type, class_uri)):
             if str(entity_uri).startswith(str(PERSON_KB)):
                 entity_id = str(entity_uri).split('#')[-1]
                 entities.append(entity_id)
@@ -325,14 +645,21 @@ class TaxReasoningEngine:
     
     def get_entity_properties(self, entity_id: str) -> Dict[str, Any]:
         """Get all properties of an entity"""
+        graph = self.graph
         entity_uri = PERSON_KB[entity_id]
         properties = {}
         
-        for _, prop, value in self.graph.triples((entity_uri, None, None)):
+        for _, prop, value in graph.triples((entity_uri, None, None)):
             prop_name = str(prop).split('#')[-1] if '#' in str(prop) else str(prop)
             if prop_name not in ['type']:  # Skip RDF type
                 properties[prop_name] = str(value)
         
+        # Fill in the defaults that sparse mode leaves out of the graph
+        if self.sparse and properties:
+            for _, prop, default in FLAG_PROPERTIES:
+                properties.setdefault(str(prop).split('#')[-1], str(TRUE_LITERAL if default else FALSE_LITERAL))
+            properties.setdefault("hasNonWageIncome", str(decimal_literal(0.0)))
+        
         return properties
     
     def explain_rules(self) -> Dict[str, str]:
@@ -455,8 +782,9 @@ class TaxReasoningEngine:
     
     def _list_all_entities(self):
         """List all entities in the knowledge base"""
+        graph = self.graph
         entities = set()
-        for entity_uri, _, _ in self.graph.triples((None, RDF.type, TAX.TaxableEntity)):
+        for entity_uri, _, _ in graph.triples((None, RDF.type, TAX.TaxableEntity)):
             if str(entity_uri).startswith(str(PERSON_KB)):
                 entity_id = str(entity_uri).split('#')[-1]
                 entities.add(entity_id)
@@ -501,12 +829,55 @@ class TaxReasoningEngine:
         Determine filing requirements for a specific entity
         Returns a dictionary with filing status and reasoning
         """
+        graph = self.graph
         entity_uri = PERSON_KB[entity_id]
         
         # Check if entity exists
-        if (entity_uri, None, None) not in self.graph:
+        if (entity_uri, None, None) not in graph:
             return {"error": f"Entity {entity_id} not found in knowledge base"}
         
+        types = set(graph.objects(entity_uri, RDF.type))
+        result = self._filing_result(entity_id, types)
+        self._record_decision(graph, entity_uri, entity_id, result["filing_requirement"])
+        return result
+    
+    def _record_decision(self, graph: Graph, entity_uri: URIRef, entity_id: str, status: str):
+        """Pass a decision to the decision sink, with the rules that fired on the stored facts"""
+        if self.decision_sink is None:
+            return
+        from population_counters import resident_columns
+        
+        rules = self.compiled_rules()
+        _, wage, non_wage, flags = resident_columns(graph, [entity_uri])
+        _, hits = rules.classify_rule_hits(wage, non_wage, flags)
+        self.decision_sink.record(entity_id, status, int(hits[0]) if len(hits) else 0, rules.version)
+    
+    def classify_entity(self, entity: TaxEntity) -> Dict[str, Any]:
+        """
+        Classify an entity without adding it to the knowledge base.
+        Returns the same result as determine_filing_requirement would after
+        add_entity_to_kb, but evaluates the compiled rules in a transient scope,
+        so memory stays flat however many requests are served.
+        """
+        from compiled_rules import derived_types
+        
+        types = set()
+        if entity.entity_type == "Person":
+            types.update(derived_types(self.compiled_rules().classify_entity(entity)))
+        return self._filing_result(entity.id, types)
+
+    def classify_records(self, records, out=None, dtype=None):
+        """
+        Classify fixed-layout binary records (a NumPy structured array, or any
+        buffer with its dtype) without building entities or triples.
+        Status codes are written into out; see structured_records.
+        """
+        from structured_records import classify_structured
+
+        return classify_structured(self.compiled_rules(), records, out=out, dtype=dtype)
+
+    def _filing_result(self, entity_id: str, types) -> Dict[str, Any]:
+        """Build the filing requirement result from the rdf:type values of an entity"""
         result = {
             "entity_id": entity_id,
             "must_file": False,
@@ -516,21 +887,21 @@ class TaxReasoningEngine:
             "inferred_classes": []
         }
         
-        # Get all inferred classes for the entity
-        for _, _, class_uri in self.graph.triples((entity_uri, RDF.type, None)):
-            if class_uri in [TAX.MandatoryL1Filer, TAX.VoluntaryL1Filer, TAX.MandatoryE1Filer, TAX.NoFilingRequired]:
+        # Collect the inferred filer classes of the entity
+        for class_uri in [TAX.MandatoryL1Filer, TAX.VoluntaryL1Filer, TAX.MandatoryE1Filer, TAX.NoFilingRequired]:
+            if class_uri in types:
                 result["inferred_classes"].append(class_uri.split("#")[-1])
         
         # Determine filing requirement based on classifications
-        if (entity_uri, RDF.type, TAX.MandatoryFilingL1) in self.graph:
+        if TAX.MandatoryFilingL1 in types:
             result["filing_requirement"] = "MandatoryFilingL1"
             result["must_file"] = True
             result["reasons"].append("Entity classified as 'Mandatory Filing L1'")
-        elif (entity_uri, RDF.type, TAX.MandatoryFilingE1) in self.graph:
+        elif TAX.MandatoryFilingE1 in types:
             result["filing_requirement"] = "MandatoryFilingE1"
             result["must_file"] = True
             result["reasons"].append("Entity classified as 'Mandatory Filing E1'")
-        elif (entity_uri, RDF.type, TAX.VoluntaryFilingL1) in self.graph:
+        elif TAX.VoluntaryFilingL1 in types:
             result["filing_requirement"] = "VoluntaryFilingL1"
             result["optional_filing"] = True
             result["reasons"].append("Entity classified as 'Voluntary Filing L1'")
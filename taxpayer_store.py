@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped columnar taxpayer store.
+Keeps TaxEntity fields on disk as fixed-width columns so populations larger
+than RAM can be classified chunk by chunk through the OS page cache.
+
+Layout of a store directory:
+    meta.json              row count, column dtypes and flag bit order
+    annual_income.f8       wage income per row (NaN when unknown)
+    non_wage_income.f8     non-wage income per row
+    flags.u4               boolean TaxEntity fields packed as in FLAG_PROPERTIES
+    person.b1              whether the row is a person (only persons get a filing status)
+    ids.offsets.i8         n + 1 byte offsets into ids.bin
+    ids.bin                UTF-8 encoded entity ids
+    ids.hash.u8            64-bit id hashes in ascending order (the id index)
+    ids.rows.i8            row of each entry in ids.hash.u8
+    <name>.<dtype>         derived columns such as the classification status
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from tax_reasoning_engine import TaxEntity
+from compiled_rules import CompiledRuleSet, FLAG_FIELDS, NO_FILING, pack_flags, status_of_columns
+
+
+STORE_FORMAT_VERSION = 1
+INCOME_DTYPE = np.dtype("<f8")
+FLAGS_DTYPE = np.dtype("<u4")
+OFFSETS_DTYPE = np.dtype("<i8")
+PERSON_DTYPE = np.dtype("?")
+HASH_DTYPE = np.dtype("<u8")
+DEFAULT_CHUNK_SIZE = 1 << 20
+# Rows sorted at once while building the id index, and rows read per run in each merge step
+INDEX_RUN_ROWS = 1 << 22
+INDEX_MERGE_ROWS = 1 << 16
+
+
+def _column_file(path: str, name: str, dtype: np.dtype) -> str:
+    return os.path.join(path, f"{name}.{dtype.kind}{dtype.itemsize}")
+
+
+def _id_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _id_hashes(encoded: List[bytes]) -> np.ndarray:
+    return np.fromiter((_id_hash(key) for key in encoded), dtype=HASH_DTYPE, count=len(encoded))
+
+
+def _map_file(filename: str, dtype: np.dtype, count: int, mode: str = "r") -> np.ndarray:
+    if count == 0:
+        # numpy.memmap cannot map an empty file
+        return np.empty(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode=mode, shape=(count,))
+
+
+def _write_id_index(path: str, hashes: np.ndarray, run_rows: int = INDEX_RUN_ROWS,
+                    merge_rows: int = INDEX_MERGE_ROWS):
+    """
+    Sort (hash, row) pairs into ids.hash.u8 / ids.rows.i8 without holding all of them in RAM:
+    runs of run_rows are sorted and spilled to disk, then merged merge_rows at a time per run.
+    """
+    count = len(hashes)
+    runs = []
+    for index, start in enumerate(range(0, count, run_rows)):
+        run_hashes = np.asarray(hashes[start:start + run_rows])
+        order = np.argsort(run_hashes, kind="stable")
+        suffix = "" if count <= run_rows else f".run{index}"
+        names = (_column_file(path, "ids.hash" + suffix, HASH_DTYPE),
+                 _column_file(path, "ids.rows" + suffix, OFFSETS_DTYPE))
+        run_hashes[order].tofile(names[0])
+        (order + start).astype(OFFSETS_DTYPE).tofile(names[1])
+        runs.append((names, len(order)))
+    if len(runs) < 2:
+        if not runs:
+            open(_column_file(path, "ids.hash", HASH_DTYPE), "wb").close()
+            open(_column_file(path, "ids.rows", OFFSETS_DTYPE), "wb").close()
+        return
+
+    mapped = [(_map_file(names[0], HASH_DTYPE, n), _map_file(names[1], OFFSETS_DTYPE, n)) for names, n in runs]
+    cursors = [0] * len(mapped)
+    with open(_column_file(path, "ids.hash", HASH_DTYPE), "wb") as hash_out, \
+            open(_column_file(path, "ids.rows", OFFSETS_DTYPE), "wb") as rows_out:
+        while True:
+            live = [i for i, (run_hashes, _) in enumerate(mapped) if cursors[i] < len(run_hashes)]
+            if not live:
+                break
+            # Everything up to the smallest last key among the next blocks is final
+            bound = min(mapped[i][0][min(cursors[i] + merge_rows, len(mapped[i][0])) - 1] for i in live)
+            hash_parts, row_parts = [], []
+            for i in live:
+                run_hashes, run_rows_ = mapped[i]
+                block = np.asarray(run_hashes[cursors[i]:cursors[i] + merge_rows])
+                take = int(np.searchsorted(block, bound, side="right"))
+                hash_parts.append(block[:take])
+                row_parts.append(np.asarray(run_rows_[cursors[i]:cursors[i] + take]))
+                cursors[i] += take
+            merged_hashes, merged_rows = np.concatenate(hash_parts), np.concatenate(row_parts)
+            order = np.lexsort((merged_rows, merged_hashes))
+            hash_out.write(merged_hashes[order].tobytes())
+            rows_out.write(merged_rows[order].tobytes())
+    del mapped
+    for names, _ in runs:
+        for name in names:
+            os.remove(name)
+
+
+class ColumnarStoreWriter:
+    """Streams taxpayers into a new store directory; ids are written once, never rewritten"""
+
+    def __init__(self, path: str, buffer_rows: int = 65536, index_run_rows: int = INDEX_RUN_ROWS):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.count = 0
+        self.buffer_rows = buffer_rows
+        self.index_run_rows = index_run_rows
+        self._files = {
+            "annual_income": open(_column_file(path, "annual_income", INCOME_DTYPE), "wb"),
+            "non_wage_income": open(_column_file(path, "non_wage_income", INCOME_DTYPE), "wb"),
+            "flags": open(_column_file(path, "flags", FLAGS_DTYPE), "wb"),
+            "person": open(_column_file(path, "person", PERSON_DTYPE), "wb"),
+            "ids.offsets": open(_column_file(path, "ids.offsets", OFFSETS_DTYPE), "wb"),
+            "ids.bin": open(os.path.join(path, "ids.bin"), "wb"),
+            # Hashes in row order; close() sorts them into the id index and removes this file
+            "ids.unsorted_hash": open(_column_file(path, "ids.unsorted_hash", HASH_DTYPE), "wb"),
+        }
+        self._id_offset = 0
+        self._files["ids.offsets"].write(np.zeros(1, dtype=OFFSETS_DTYPE).tobytes())
+        self._pending: List[TaxEntity] = []
+
+    def append(self, entity: TaxEntity):
+        """Buffer one TaxEntity; rows are flushed to disk in column batches"""
+        self._pending.append(entity)
+        if len(self._pending) >= self.buffer_rows:
+            self._flush_pending()
+
+    def extend(self, entities: Iterable[TaxEntity]):
+        for entity in entities:
+            self.append(entity)
+
+    def append_columns(self, ids: List[str], annual_income: np.ndarray,
+                       non_wage_income: np.ndarray, flags: np.ndarray, person: Optional[np.ndarray] = None):
+        """Write a batch that is already in columnar form (rows are persons unless person says otherwise)"""
+        self._flush_pending()
+        encoded = [entity_id.encode("utf-8") for entity_id in ids]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=OFFSETS_DTYPE, count=len(encoded))
+        offsets = self._id_offset + np.cumsum(lengths, dtype=OFFSETS_DTYPE)
+
+        self._files["annual_income"].write(np.asarray(annual_income, dtype=INCOME_DTYPE).tobytes())
+        self._files["non_wage_income"].write(np.asarray(non_wage_income, dtype=INCOME_DTYPE).tobytes())
+        self._files["flags"].write(np.asarray(flags, dtype=FLAGS_DTYPE).tobytes())
+        person = np.ones(len(encoded), dtype=PERSON_DTYPE) if person is None else np.asarray(person, dtype=PERSON_DTYPE)
+        self._files["person"].write(person.tobytes())
+        self._files["ids.offsets"].write(offsets.tobytes())
+        self._files["ids.bin"].write(b"".join(encoded))
+        self._files["ids.unsorted_hash"].write(_id_hashes(encoded).tobytes())
+
+        if len(offsets):
+            self._id_offset = int(offsets[-1])
+        self.count += len(encoded)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self.append_columns(
+            [e.id for e in pending],
+            np.array([np.nan if e.annual_income is None else e.annual_income for e in pending], dtype=INCOME_DTYPE),
+            np.array([e.has_non_wage_income or 0.0 for e in pending], dtype=INCOME_DTYPE),
+            np.array([pack_flags(e) for e in pending], dtype=FLAGS_DTYPE),
+            np.array([e.entity_type == "Person" for e in pending], dtype=PERSON_DTYPE),
+        )
+
+    def close(self):
+        self._flush_pending()
+        for handle in self._files.values():
+            handle.close()
+        unsorted = _column_file(self.path, "ids.unsorted_hash", HASH_DTYPE)
+        _write_id_index(self.path, _map_file(unsorted, HASH_DTYPE, self.count), self.index_run_rows)
+        os.remove(unsorted)
+        meta = {
+            "format_version": STORE_FORMAT_VERSION,
+            "count": self.count,
+            "columns": {
+                "annual_income": INCOME_DTYPE.str,
+                "non_wage_income": INCOME_DTYPE.str,
+                "flags": FLAGS_DTYPE.str,
+                "person": PERSON_DTYPE.str,
+            },
+            "flag_fields": FLAG_FIELDS,
+            "id_index": "blake2b-64",
+        }
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self) -> "ColumnarStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ColumnarTaxpayerStore:
+    """Read-only view of a store directory; every column is a numpy.memmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format {self.meta.get('format_version')} in {path}")
+        if self.meta.get("flag_fields") != FLAG_FIELDS:
+            raise ValueError(f"Flag layout of {path} does not match this version of TaxEntity")
+        self.count = int(self.meta["count"])
+        self.annual_income = self._map("annual_income", INCOME_DTYPE, self.count)
+        self.non_wage_income = self._map("non_wage_income", INCOME_DTYPE, self.count)
+        self.flags = self._map("flags", FLAGS_DTYPE, self.count)
+        # Stores written before the person column existed hold persons only
+        self.person = (self._map("person", PERSON_DTYPE, self.count) if "person" in self.meta["columns"]
+                       else np.ones(self.count, dtype=PERSON_DTYPE))
+        self._id_offsets = self._map("ids.offsets", OFFSETS_DTYPE, self.count + 1)
+        self._id_blob = _map_file(os.path.join(path, "ids.bin"), np.dtype(np.uint8),
+                                       int(self._id_offsets[-1]))
+        self._id_index: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _map(self, name: str, dtype: np.dtype, count: int, mode: str = "r") -> np.ndarray:
+        return _map_file(_column_file(self.path, name, dtype), dtype, count, mode)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def entity_id(self, row: int) -> str:
+        start, end = int(self._id_offsets[row]), int(self._id_offsets[row + 1])
+        return self._id_blob[start:end].tobytes().decode("utf-8")
+
+    def entity_ids(self, start: int, end: int) -> List[str]:
+        """Ids of rows start..end-1, decoded from one slice of the id blob"""
+        offsets = np.asarray(self._id_offsets[start:end + 1], dtype=np.int64)
+        if len(offsets) < 2:
+            return []
+        blob = self._id_blob[offsets[0]:offsets[-1]].tobytes()
+        bounds = (offsets - offsets[0]).tolist()
+        return [blob[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+
+    def _open_id_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        if "id_index" not in self.meta:
+            # Stores written before the index existed get one next to their columns on first use
+            unsorted = self.create_column("ids.unsorted_hash", HASH_DTYPE)
+            for start in range(0, self.count, DEFAULT_CHUNK_SIZE):
+                encoded = [e.encode("utf-8") for e in self.entity_ids(start, start + DEFAULT_CHUNK_SIZE)]
+                unsorted[start:start + len(encoded)] = _id_hashes(encoded)
+            _write_id_index(self.path, unsorted)
+            del unsorted
+            os.remove(_column_file(self.path, "ids.unsorted_hash", HASH_DTYPE))
+        return self._map("ids.hash", HASH_DTYPE, self.count), self._map("ids.rows", OFFSETS_DTYPE, self.count)
+
+    def row_of(self, entity_id: str) -> Optional[int]:
+        """Row number for an id (the first one if it repeats), by binary search over the on-disk id index"""
+        if self._id_index is None:
+            self._id_index = self._open_id_index()
+        hashes, rows = self._id_index
+        key = _id_hash(entity_id.encode("utf-8"))
+        lo = int(np.searchsorted(hashes, np.uint64(key), side="left"))
+        hi = int(np.searchsorted(hashes, np.uint64(key), side="right"))
+        # Equal hashes are either the same id repeated or a collision; the id blob decides
+        for row in sorted(int(row) for row in rows[lo:hi]):
+            if self.entity_id(row) == entity_id:
+                return row
+        return None
+
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield (start row, annual_income, non_wage_income, flags) as memmap slices"""
+        for start in range(0, self.count, chunk_size):
+            end = min(start + chunk_size, self.count)
+            yield start, self.annual_income[start:end], self.non_wage_income[start:end], self.flags[start:end]
+
+    def create_column(self, name: str, dtype) -> np.ndarray:
+        """Create (or overwrite) a writable derived column next to the input columns"""
+        dtype = np.dtype(dtype)
+        if self.count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_file(self.path, name, dtype), dtype=dtype, mode="w+", shape=(self.count,))
+
+    def open_column(self, name: str, dtype) -> np.ndarray:
+        return self._map(name, np.dtype(dtype), self.count)
+
+
+def write_store(path: str, entities: Iterable[TaxEntity]) -> int:
+    """Write entities to a new store directory and return the row count"""
+    with ColumnarStoreWriter(path) as writer:
+        writer.extend(entities)
+    return writer.count
+
+
+def classify_chunks(store: ColumnarTaxpayerStore, rules: CompiledRuleSet, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    rule_hits: bool = False) -> Iterator[Tuple[int, np.ndarray, Optional[np.ndarray]]]:
+    """
+    Yield (start row, status codes, rule hit masks or None) chunk by chunk.
+    Rows that are not persons are NoFilingRequired with no rule hits, as in the
+    graph reasoner, which never types them AustrianResident.
+    """
+    for start, annual_income, non_wage_income, flags in store.iter_chunks(chunk_size):
+        person = np.asarray(store.person[start:start + len(flags)])
+        if rule_hits:
+            membership, hits = rules.classify_rule_hits(annual_income, non_wage_income, flags)
+            hits[~person] = 0
+        else:
+            membership, hits = rules.classify_columns(annual_income, non_wage_income, flags), None
+        status = status_of_columns(membership)
+        status[~person] = NO_FILING
+        yield start, status, hits
+
+
+def classify_store(store: ColumnarTaxpayerStore, rules: CompiledRuleSet,
+                   out: Optional[np.ndarray] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Classify every row of a store chunk by chunk and write status codes into out.
+    Defaults to a derived on-disk "status" column so results stay out of core too.
+    """
+    if out is None:
+        out = store.create_column("status", np.uint8)
+    for start, status, _ in classify_chunks(store, rules, chunk_size):
+        out[start:start + len(status)] = status
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
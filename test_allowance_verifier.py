@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Tests for the bulk commuter allowance and Family Bonus Plus verifier."""
+
+import numpy as np
+from compiled_rules import FLAG_BITS
+from tax_reasoning_engine import TAX
+from allowance_verifier import commuter_allowance, family_bonus, verify_allowances, apply_to_flags
+
+
+def test_commuter_allowance_tiers():
+    distance = np.array([1.5, 10.0, 20.0, 45.0, 80.0, 30.0, 30.0])
+    reasonable = np.array([False, False, True, True, True, False, False])
+    days = np.array([20, 20, 20, 20, 20, 9, 3])
+    assert list(commuter_allowance(distance, reasonable, days)) == [0.0, 372.0, 696.0, 1356.0, 2016.0, 984.0, 0.0]
+    assert commuter_allowance(np.array([10.0]), np.array([True]))[0] == 0.0
+
+
+def test_family_bonus_and_flags():
+    parent = np.array([0, 0, 1, 2])
+    age = np.array([5, 18, 20, 12])
+    birth_month = np.array([3, 4, 1, 1])
+    share = np.array([1.0, 1.0, 1.0, 0.5])
+    expected = family_bonus(parent, 4, age, birth_month, share=share)
+    assert np.allclose(expected, [2000.16 + 666.72 + 466.72, 700.08, 1000.08, 0.0])
+
+    verified = verify_allowances(np.array([372.0, 0.0, 696.0, 0.0]), np.array([372.0, 696.0, 0.0, 0.0]),
+                                 expected, np.array([expected[0], 2000.16, 1000.08, 0.0]))
+    assert list(verified["has_incorrect_commuter_allowance"]) == [False, True, False, False]
+    assert list(verified["has_unclaimed_deductions"]) == [False, False, True, False]
+    assert list(verified["has_incorrect_family_bonus"]) == [False, True, False, False]
+
+    commuter_bit = FLAG_BITS[TAX.hasIncorrectCommuterAllowance]
+    deductions_bit = FLAG_BITS[TAX.hasUnclaimedDeductions]
+    flags = apply_to_flags(np.array([commuter_bit, 0, 0, deductions_bit], dtype=np.uint32), verified)
+    assert list(flags & commuter_bit) == [0, commuter_bit, 0, 0]
+    assert list(flags & deductions_bit) == [0, 0, deductions_bit, deductions_bit]
+
+
+if __name__ == "__main__":
+    test_commuter_allowance_tiers()
+    test_family_bonus_and_flags()
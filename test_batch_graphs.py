@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Tests for batch-scoped named graphs."""
+
+from rdflib.namespace import RDF
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from batch_graphs import batch_uri, HOUSEHOLD_BATCH
+from household import verify_graph_households
+from population_counters import PopulationCounters
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+shared = TaxReasoningEngine(ontology_path=ONTOLOGY)
+
+
+def person(entity_id, **kwargs):
+    return TaxEntity(id=entity_id, name=entity_id, entity_type="Person", **kwargs)
+
+
+def test_batches_are_dropped_and_reloaded_whole():
+    kb = shared.batched()
+    kb.ingest_batch("employer_a", [person("A1", annual_income=20000.0, has_incorrect_tax_credits=True),
+                                   person("A2", annual_income=9000.0)], tax_year=2024)
+    kb.ingest_batch("employer_b", [person("B1", annual_income=30000.0, has_non_wage_income=2000.0)],
+                    tax_year=2025)
+    assert kb.determine_filing_requirement("A1")["filing_requirement"] == "MandatoryFilingL1"
+    assert kb.determine_filing_requirement("B1")["filing_requirement"] == "MandatoryFilingE1"
+    assert kb.query_entities_by_filing_status("must_file") == ["A1"]
+    # Inferred types are stored with their batch, the ontology graph stays untouched
+    assert (PERSON_KB["A1"], RDF.type, TAX.MandatoryL1Filer) in kb.batch_graph("employer_a", 2024)
+    assert (PERSON_KB["A1"], None, None) not in shared.graph
+
+    generation, snapshot = kb.snapshot()
+    assert kb.drop_batch("employer_a", 2024)
+    assert not kb.drop_batch("employer_a", 2024)
+    assert "error" in kb.determine_filing_requirement("A1")
+    assert (PERSON_KB["A1"], None, None) in snapshot
+    assert kb.generation > generation
+
+    kb.reload_batch("employer_b", [person("B2", annual_income=16000.0, has_employer_change=True)], tax_year=2025)
+    assert "error" in kb.determine_filing_requirement("B1")
+    assert kb.determine_filing_requirement("B2")["filing_requirement"] == "VoluntaryFilingL1"
+    rows = list(kb.query_batch("SELECT ?p WHERE { ?p a tax:VoluntaryL1Filer }", "employer_b", 2025,
+                               initNs={"tax": TAX}))
+    assert [row[0] for row in rows if str(row[0]).startswith(str(PERSON_KB))] == [PERSON_KB["B2"]]
+
+
+def test_tax_year_retention_and_dataset_export():
+    kb = shared.batched()
+    kb.ingest_entities([person("D1", annual_income=10000.0)])
+    kb.ingest_batch("jan", [person("Y1", annual_income=10000.0)], tax_year=2023)
+    kb.ingest_batch("feb", [person("Y2", annual_income=10000.0)], tax_year=2023)
+    kb.ingest_batch("feb", [person("Y3", annual_income=10000.0)], tax_year=2023)
+    assert [b.entities for b in kb.batches(2023)] == [1, 2]
+
+    dataset = kb.to_dataset()
+    assert (PERSON_KB["Y3"], RDF.type, TAX.NoFilingRequired) in dataset.graph(batch_uri("feb", 2023))
+
+    assert kb.drop_tax_year(2023) == 2
+    assert kb.batches(2023) == []
+    assert kb.determine_filing_requirement("D1")["filing_requirement"] == "NoFilingRequired"
+
+
+def test_household_links_live_in_their_own_batch():
+    kb = shared.batched()
+    kb.ingest_batch("payroll", [person("H1", annual_income=35000.0), person("H2", annual_income=3000.0)])
+    kb.add_household_links(partners=[("H1", "H2")])
+    kb.add_household_links(children=[("H1", "H_Child")])
+    assert (PERSON_KB["H2"], TAX.hasPartner, PERSON_KB["H1"]) in kb.batch_graph(HOUSEHOLD_BATCH)
+    assert (PERSON_KB["H1"], TAX.hasChild, PERSON_KB["H_Child"]) in kb.graph
+    flags = verify_graph_households(kb.graph, applied={"H2": 601.0})
+    assert flags["H1"]["has_unclaimed_tax_credits"] and flags["H2"]["has_incorrect_tax_credits"]
+
+    # Reloading the persons keeps their links
+    kb.reload_batch("payroll", [person("H1", annual_income=36000.0), person("H2", annual_income=3000.0)])
+    assert (PERSON_KB["H1"], TAX.hasPartner, PERSON_KB["H2"]) in kb.graph
+    assert [b.entities for b in kb.batches()] == [2, 0]
+
+
+def test_population_counters_follow_batches():
+    kb = shared.batched()
+    kb.ingest_batch("a", [person("C1", annual_income=20000.0, has_incorrect_tax_credits=True)])
+    counters = kb.population_counters()
+    start = counters.total
+    kb.ingest_batch("b", [person("C2", annual_income=30000.0, has_non_wage_income=2000.0),
+                          person("C3", annual_income=9000.0)])
+    assert kb.population_counters() is counters and counters.total == start + 2
+
+    kb.drop_batch("a")
+    kb.reload_batch("b", [person("C2", annual_income=10000.0)])
+    counters = kb.population_counters()
+    assert counters.total == start  # C1 and C3 gone, C2 kept
+    assert counters.as_dict() == PopulationCounters.from_graph(kb.graph, kb.compiled_rules()).as_dict()
+
+
+if __name__ == "__main__":
+    test_batches_are_dropped_and_reloaded_whole()
+    test_tax_year_retention_and_dataset_export()
+    test_household_links_live_in_their_own_batch()
+    test_population_counters_follow_batches()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Tests for the differential conformance harness."""
+
+import numpy as np
+from conformance_harness import ConformanceChecker, exhaustive_cases, random_cases, run_conformance
+from compiled_rules import MANDATORY_L1, NO_FILING, pack_flags
+from tax_reasoning_engine import TaxEntity
+
+checker = ConformanceChecker(graph_sample=64)
+
+
+def test_all_paths_agree():
+    chunks = list(exhaustive_cases(checker.rules))
+    assert sum(len(flags) for _, _, flags in chunks) > 100000
+    report = checker.check(chunks[0])
+    assert report.graph_cases == 64
+    assert report.ok, [d.describe() for d in report.disagreements]
+
+    report = run_conformance(random_cases(20000, seed=5), processes=1, graph_sample=32)
+    assert report.cases == 20000
+    assert report.ok, [d.describe() for d in report.disagreements]
+
+
+def test_disagreement_is_shrunk():
+    buggy = ConformanceChecker(paths=("scalar", "vectorized"))
+    correct = buggy.run_vectorized
+
+    def off_by_one_cent(wage, non_wage, flags):
+        # Treat the 13308 threshold as exclusive
+        status = correct(wage, non_wage, flags).copy()
+        status[(wage == 13308.0) & (status == MANDATORY_L1)] = NO_FILING
+        return status
+
+    buggy._runners["vectorized"] = off_by_one_cent
+    noisy = TaxEntity(id="n", name="n", entity_type="Person", annual_income=13308.0,
+                      has_non_wage_income=500.0, has_filed_employment_tax=False,
+                      has_employer_change=True, has_unclaimed_deductions=True)
+    report = buggy.check((np.array([20000.0, 13308.0]), np.array([0.0, 500.0]),
+                          np.array([0, pack_flags(noisy)], dtype=np.uint32)))
+    assert len(report.disagreements) == 1
+    minimal = report.disagreements[0]
+    assert minimal.original.has_employer_change
+    assert minimal.entity.annual_income == 13308.0
+    assert minimal.entity.has_non_wage_income == 0.0
+    assert not minimal.entity.has_filed_employment_tax
+    assert not minimal.entity.has_employer_change and not minimal.entity.has_unclaimed_deductions
+    assert minimal.statuses == {"scalar": "MandatoryFilingL1", "vectorized": "NoFilingRequired"}
+
+
+def test_graph_samples_depend_on_seed_and_chunk_only():
+    other = ConformanceChecker(graph_sample=64, rules=checker.rules, paths=("vectorized",))
+    other.graph_sample_rows(1000)  # draws from the checker's own stream must not matter
+    assert np.array_equal(checker.graph_sample_rows(1000, 3), other.graph_sample_rows(1000, 3))
+    assert not np.array_equal(checker.graph_sample_rows(1000, 3), checker.graph_sample_rows(1000, 4))
+    assert checker.graph_sample_rows(1000, 3).sum() == 64
+
+    serial = run_conformance(random_cases(3000, seed=2), processes=1, graph_sample=8)
+    parallel = run_conformance(random_cases(3000, seed=2), processes=2, graph_sample=8)
+    assert (parallel.cases, parallel.graph_cases) == (serial.cases, serial.graph_cases)
+    assert parallel.ok
+
+
+if __name__ == "__main__":
+    test_all_paths_agree()
+    test_disagreement_is_shrunk()
+    test_graph_samples_depend_on_seed_and_chunk_only()
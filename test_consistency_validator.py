@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Tests for the incremental DisjointClasses / priority consistency validator."""
+
+from rdflib import Graph
+from consistency_validator import ConsistencyValidator, read_disjoint_pairs
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_disjoint_pairs_read_from_ontology():
+    graph = Graph()
+    graph.parse(ONTOLOGY, format="turtle")
+    pairs = {frozenset(pair) for pair in read_disjoint_pairs(graph)}
+    assert pairs == {
+        frozenset((TAX.MandatoryE1Filer, TAX.MandatoryL1Filer)),
+        frozenset((TAX.MandatoryE1Filer, TAX.VoluntaryL1Filer)),
+        frozenset((TAX.MandatoryL1Filer, TAX.VoluntaryL1Filer)),
+    }
+
+
+def test_incremental_observe_and_audit():
+    validator = ConsistencyValidator([(TAX.MandatoryE1Filer, TAX.MandatoryL1Filer)])
+    person = PERSON_KB["p1"]
+    other = PERSON_KB["p2"]
+
+    assert validator.observe(person, TAX.MandatoryL1Filer) == []
+    assert validator.observe(other, TAX.NoFilingRequired) == []
+    found = validator.observe(person, TAX.MandatoryE1Filer)
+    assert len(found) == 1
+    assert found[0].kind == "disjoint"
+    assert found[0].preferred == TAX.MandatoryE1Filer
+    # Repeated observations of a known membership report nothing new
+    assert validator.observe(person, TAX.MandatoryE1Filer) == []
+
+    found = validator.observe(other, TAX.VoluntaryL1Filer)
+    assert [v.kind for v in found] == ["priority"]
+
+    assert len(list(validator.drain())) == 2
+    assert list(validator.drain()) == []
+    assert {v.entity for v in validator.audit()} == {person, other}
+
+    validator.retract(person, TAX.MandatoryL1Filer)
+    assert {v.entity for v in validator.audit()} == {other}
+
+
+def test_engine_applies_e1_before_l1():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    list(engine.check_consistency())
+    engine.add_entity_to_kb(TaxEntity(
+        id="Conflict_E1_L1",
+        name="Wage and non-wage income with incorrect credits",
+        entity_type="Person",
+        annual_income=20000.0,
+        has_non_wage_income=1000.0,
+        has_incorrect_tax_credits=True,
+    ))
+    # MandatoryL1Filer is defined as the complement of MandatoryE1Filer, so no conflict arises
+    assert [v for v in engine.check_consistency() if v.entity_id == "Conflict_E1_L1"] == []
+    result = engine.determine_filing_requirement("Conflict_E1_L1")
+    assert result["filing_requirement"] == "MandatoryFilingE1"
+    assert result["inferred_classes"] == ["MandatoryE1Filer"]
+
+
+if __name__ == "__main__":
+    test_disjoint_pairs_read_from_ontology()
+    test_incremental_observe_and_audit()
+    test_engine_applies_e1_before_l1()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Tests for the SQLite decision sink."""
+
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import numpy as np
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity
+from compiled_rules import STATUS_CODES
+from decision_sink import DecisionSink
+from taxpayer_store import ColumnarTaxpayerStore, write_store
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_engine_decisions_are_upserted():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "decisions.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+            engine.ingest_entities([TaxEntity(id="DS_A", name="a", entity_type="Person", annual_income=20000.0,
+                                              has_special_payment_situations=True, has_incorrect_tax_credits=True)])
+        rules = engine.compiled_rules()
+        with DecisionSink(path, tax_year=2024) as sink:
+            engine.decision_sink = sink
+            engine.determine_filing_requirement("DS_A")
+            engine.check_filing_requirement("DS_A")
+            # Single decisions are durable immediately, without waiting for a full batch
+            reader = sqlite3.connect(path)
+            assert reader.execute("SELECT status FROM decisions").fetchall() == [("MandatoryFilingL1",)]
+            reader.close()
+            decision = sink.decision("DS_A")
+            assert len(sink) == 1
+            assert decision["status"] == "MandatoryFilingL1" and decision["ontology_version"] == "2.1"
+            fired = [label for bit, label in enumerate(rules.rule_labels) if decision["rule_mask"] >> bit & 1]
+            assert fired == ["MandatoryL1Filer: hasSpecialPaymentSituations and not MandatoryE1Filer",
+                             "MandatoryL1Filer: hasIncorrectTaxCredits and not MandatoryE1Filer"]
+            sink.record("DS_A", "NoFilingRequired", 0, "2.1", tax_year=2023)
+            assert sink.decision("DS_A", tax_year=2023)["status"] == "NoFilingRequired"
+            assert sink.decision("DS_A")["status"] == "MandatoryFilingL1"
+
+        connection = sqlite3.connect(path)
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert connection.execute("SELECT COUNT(*) FROM decisions").fetchone()[0] == 2
+
+
+def test_bulk_store_run_records_every_row():
+    with tempfile.TemporaryDirectory() as directory:
+        entities = [TaxEntity(id=f"DS_{i}", name=str(i), entity_type="Person", annual_income=1000.0 * i,
+                              has_non_wage_income=800.0 if i % 7 == 0 else 0.0, has_employer_change=i % 3 == 0)
+                    for i in range(500)]
+        write_store(os.path.join(directory, "store"), entities)
+        store = ColumnarTaxpayerStore(os.path.join(directory, "store"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+        with DecisionSink(os.path.join(directory, "decisions.db"), tax_year=2024, batch_size=128) as sink:
+            engine.decision_sink = sink
+            status = engine.classify_store(store, out=np.empty(len(store), dtype=np.uint8))
+            assert len(sink) == 500 and sink.written == 500
+            assert [STATUS_CODES[sink.decision(f"DS_{i}")["status"]] for i in range(500)] == status.tolist()
+            # Re-running replaces the decisions instead of duplicating them
+            engine.classify_store(store, out=np.empty(len(store), dtype=np.uint8))
+            assert len(sink) == 500 and sink.written == 1000
+
+
+if __name__ == "__main__":
+    test_engine_decisions_are_upserted()
+    test_bulk_store_run_records_every_row()
+    print("All decision sink tests passed")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Tests for household joins and the single-earner/single-parent credit checks."""
+
+import numpy as np
+from rdflib import Graph
+from rdflib.compare import isomorphic
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from household import (join_households, entitled_credits, verify_credits, verify_graph_households,
+                       SINGLE_EARNER, SINGLE_PARENT, NO_CREDIT)
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_joins_and_entitlement():
+    ids = ["earner", "partner", "single", "couple_a", "couple_b", "outside"]
+    partners = [("earner", "partner"), ("couple_a", "couple_b"), ("outside", "not_loaded")]
+    children = [("earner", "c1"), ("earner", "c2"), ("earner", "c3"), ("earner", "c1"),
+                ("single", "c4"), ("couple_a", "c5"), ("outside", "c6")]
+    households = join_households(ids, partners, children)
+    assert list(households.partner_row) == [1, 0, -1, 4, 3, -2]
+    assert list(households.children) == [3, 3, 1, 1, 1, 1]
+
+    income = np.array([40000.0, 5000.0, 25000.0, 30000.0, 20000.0, 30000.0])
+    kind, amount = entitled_credits(households, income, 2025)
+    assert list(kind) == [SINGLE_EARNER, NO_CREDIT, SINGLE_PARENT, NO_CREDIT, NO_CREDIT, NO_CREDIT]
+    assert list(amount[:5]) == [813.0 + 268.0, 0.0, 601.0, 0.0, 0.0]
+    assert np.isnan(amount[5])
+
+    verified = verify_credits(amount, np.array([1081.0, 0.0, 0.0, 601.0, 0.0, 601.0]))
+    assert list(verified["has_incorrect_tax_credits"]) == [False, False, False, True, False, False]
+    assert list(verified["has_unclaimed_tax_credits"]) == [False, False, True, False, False, False]
+
+
+def test_children_and_ties_are_per_couple():
+    ids = ["earner", "partner", "tie_a", "tie_b"]
+    partners = [("earner", "partner"), ("tie_a", "tie_b")]
+    income = np.array([40000.0, 3000.0, 5000.0, 5000.0])
+    # The child may be linked to either partner, or to both
+    for children in ([("earner", "c1")], [("partner", "c1")], [("earner", "c1"), ("partner", "c1")]):
+        households = join_households(ids, partners, children + [("tie_b", "c2")])
+        assert list(households.children) == [1, 1, 1, 1]
+        kind, amount = entitled_credits(households, income, 2025)
+        # Equal incomes under the limit: only one partner gets the credit
+        assert list(kind) == [SINGLE_EARNER, NO_CREDIT, SINGLE_EARNER, NO_CREDIT]
+        assert list(amount) == [601.0, 0.0, 601.0, 0.0]
+
+
+def test_household_links_in_knowledge_base():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    engine.ingest_entities([TaxEntity(id="HH_Earner", name="e", entity_type="Person", annual_income=35000.0),
+                            TaxEntity(id="HH_Partner", name="p", entity_type="Person", annual_income=3000.0)])
+    engine.add_household_links(partners=[("HH_Earner", "HH_Partner")], children=[("HH_Earner", "HH_Child")])
+    assert (PERSON_KB["HH_Partner"], TAX.hasPartner, PERSON_KB["HH_Earner"]) in engine.graph
+
+    flags = verify_graph_households(engine.graph, applied={"HH_Partner": 601.0})
+    assert flags["HH_Earner"] == {"has_incorrect_tax_credits": False, "has_unclaimed_tax_credits": True}
+    assert flags["HH_Partner"]["has_incorrect_tax_credits"]
+
+
+def test_owl_export_matches_turtle():
+    # The OWL/XML file is generated from the Turtle source by convert_ttl_to_owl.py
+    turtle = Graph().parse(ONTOLOGY, format="turtle")
+    owl = Graph().parse(ONTOLOGY.replace(".ttl", ".owl"), format="xml")
+    assert isomorphic(turtle, owl)
+
+
+if __name__ == "__main__":
+    test_joins_and_entitlement()
+    test_children_and_ties_are_per_couple()
+    test_household_links_in_knowledge_base()
+    test_owl_export_matches_turtle()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Tests for the sorted income index and its SPARQL FILTER pushdown."""
+
+import numpy as np
+from rdflib import Graph
+from rdflib.plugins.sparql import prepareQuery
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from income_index import IncomeIndex, range_constraints
+from population_generator import PopulationConfig, generate_entities
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+COHORT_QUERY = f"""
+PREFIX tax: <{TAX}>
+SELECT ?person ?wage WHERE {{
+    ?person a tax:AustrianResident ;
+            tax:hasAnnualWageIncome ?wage .
+    FILTER(?wage > 13308 && 14517 >= ?wage && STRSTARTS(STR(?person), "{PERSON_KB}"))
+}}
+"""
+
+
+def _brute_force(graph, prop, low, high):
+    return sorted(s for s, _, o in graph.triples((None, prop, None)) if low <= float(o) <= high)
+
+
+def test_index_is_maintained_on_ingest():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    entities = list(generate_entities(400, PopulationConfig(seed=11, near_threshold_share=0.5)))
+    engine.ingest_entities(entities[:300])
+    index = engine.income_index()
+    assert engine.income_index() is index
+    assert sorted(index.range(TAX.hasAnnualWageIncome, 13058, 13558)) == \
+        _brute_force(engine.graph, TAX.hasAnnualWageIncome, 13058, 13558)
+
+    # New entities and a re-ingested one with a second wage value
+    engine.ingest_entities(entities[300:] + [TaxEntity(id=entities[0].id, name="again", entity_type="Person",
+                                                       annual_income=13400.0, has_non_wage_income=700.0)])
+    updated = engine.income_index()
+    assert updated is not index and updated.generation == engine.generation
+    rebuilt = IncomeIndex.from_graph(engine.graph, engine.generation)
+    for prop, expected in rebuilt.indexes.items():
+        assert np.array_equal(updated.indexes[prop].values, expected.values)
+        assert sorted(updated.indexes[prop].subjects) == sorted(expected.subjects)
+
+    cohort = updated.cohort(wage=(13308, 14517), non_wage=(0, 729.99))
+    assert PERSON_KB[entities[0].id] in cohort
+    assert cohort == set(_brute_force(engine.graph, TAX.hasAnnualWageIncome, 13308, 14517)) & \
+        set(_brute_force(engine.graph, TAX.hasNonWageIncome, 0, 729.99))
+    assert updated.count(TAX.hasAnnualWageIncome, 13308, include_low=False) == \
+        sum(1 for _, _, o in engine.graph.triples((None, TAX.hasAnnualWageIncome, None)) if float(o) > 13308)
+
+
+def test_sparql_filter_pushdown_matches_full_scan():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    entities = list(generate_entities(300, PopulationConfig(seed=3, near_threshold_share=0.5)))
+    engine.ingest_entities(entities + [TaxEntity(id="Edge", name="edge", entity_type="Person", annual_income=13308.0)])
+    unindexed = Graph()
+    unindexed += engine.graph
+    expected = sorted(unindexed.query(COHORT_QUERY))
+    assert expected
+
+    engine.income_index()
+    assert sorted(engine.graph.query(COHORT_QUERY)) == expected
+    # The pushdown only narrows the candidates; strict bounds are enforced by the FILTER itself
+    assert PERSON_KB["Edge"] in engine.income_index().range(TAX.hasAnnualWageIncome, 13308, 13308)
+    assert not any(row.person == PERSON_KB["Edge"] for row in expected)
+
+    # A blank node subject is a variable too
+    anonymous = f"SELECT ?w WHERE {{ [] <{TAX.hasAnnualWageIncome}> ?w . FILTER(?w > 14000) }}"
+    assert sorted(engine.graph.query(anonymous)) == sorted(unindexed.query(anonymous))
+    assert len(list(engine.graph.query(anonymous))) > 0
+
+    expr = prepareQuery(COHORT_QUERY).algebra.p.p.expr
+    assert list(range_constraints(expr).values()) == [[13308.0, 14517.0]]
+
+
+if __name__ == "__main__":
+    test_index_is_maintained_on_ingest()
+    test_sparql_filter_pushdown_matches_full_scan()
+    print("All income index tests passed")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Tests for the progressive income tax estimates."""
+
+import numpy as np
+import pytest
+from rdflib import Graph
+from compiled_rules import compile_rules, pack_flags
+from tax_reasoning_engine import TaxEntity
+from income_tax import (tariff_tax, non_wage_allowance, traffic_credit, assessed_tax,
+                        estimate_entity, rank_voluntary_refunds, tax_year)
+
+
+def test_tariff_per_year():
+    income = np.array([0.0, 13308.0, 21617.0, 30000.0, np.nan])
+    assert np.allclose(tariff_tax(income, 2025), [0.0, 0.0, 1661.8, 4176.7, 0.0])
+    assert np.isclose(tariff_tax(30000.0, 2024), (20818 - 12816) * 0.2 + (30000 - 20818) * 0.3)
+    # Continuous at every bracket limit
+    limits = np.array(tax_year(2025).limits)
+    assert np.allclose(tariff_tax(limits - 1e-6), tariff_tax(limits), atol=1e-3)
+    with pytest.raises(ValueError):
+        tariff_tax(1000.0, 1999)
+
+
+def test_credits_and_allowance():
+    assert list(non_wage_allowance(np.array([500.0, 730.0, 1000.0, 2000.0]))) == [500.0, 730.0, 460.0, 0.0]
+    assert list(traffic_credit(np.array([0.0, 15000.0, 40000.0]))) == [0.0, 487.0 + 790.0, 487.0]
+    # Non-wage income below the allowance adds no tax
+    assert assessed_tax(30000.0, 700.0) == assessed_tax(30000.0, 0.0)
+    # The SV refund is only paid to eligible taxpayers and is capped
+    assert assessed_tax(10000.0) == 0.0
+    assert assessed_tax(10000.0, sv_eligible=True) == -min(10000.0 * 0.22 * 0.55, 1277.0)
+    assert assessed_tax(10000.0, sv_eligible=True, sv_contributions=5000.0) == -1277.0
+
+
+def test_refund_ranking():
+    low = TaxEntity(id="low", name="low", entity_type="Person", annual_income=9000.0,
+                    has_employer_change=True, has_sv_repayment_eligibility=True)
+    assert estimate_entity(low)["refund"] == 9000.0 * 0.22 * 0.55
+    side_income = TaxEntity(id="side", name="side", entity_type="Person", annual_income=40000.0,
+                            has_non_wage_income=1000.0)
+    assert estimate_entity(side_income)["refund"] < 0
+
+    graph = Graph()
+    graph.parse("austrian_tax_ontology_resident_only.ttl", format="turtle")
+    rules = compile_rules(graph)
+    entities = [
+        low,
+        TaxEntity(id="mid", name="mid", entity_type="Person", annual_income=15000.0,
+                  has_unclaimed_deductions=True, has_sv_repayment_eligibility=True),
+        TaxEntity(id="none", name="none", entity_type="Person", annual_income=30000.0,
+                  has_unclaimed_deductions=True),
+        TaxEntity(id="mandatory", name="mandatory", entity_type="Person", annual_income=9000.0,
+                  has_special_payment_situations=True, has_sv_repayment_eligibility=True),
+    ]
+    wage = np.array([e.annual_income for e in entities])
+    non_wage = np.zeros(len(entities))
+    flags = np.array([pack_flags(e) for e in entities], dtype=np.uint32)
+    rows, refunds = rank_voluntary_refunds(rules, wage, non_wage, flags)
+    assert list(rows) == [0, 1, 2]
+    assert refunds[2] == 0.0
+    rows, _ = rank_voluntary_refunds(rules, wage, non_wage, flags, top=1)
+    assert list(rows) == [0]
+
+
+if __name__ == "__main__":
+    test_tariff_per_year()
+    test_credits_and_allowance()
+    test_refund_ranking()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Tests for the lazy classification mode."""
+
+import contextlib
+import io
+from rdflib.namespace import RDF
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from lazy_inference import LazyInferenceGraph, LazyOverlayGraph
+from test_austrian_tax_rules import test_cases
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_lazy_matches_eager():
+    eager = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    lazy = TaxReasoningEngine(ontology_path=ONTOLOGY, lazy=True)
+    entities = [case["entity"] for case in test_cases.values()]
+    eager.ingest_entities(entities)
+    lazy.ingest_entities(entities)
+    # Nothing is classified on ingest, and no type triples are materialized
+    assert lazy.graph.classified == 0
+    assert len(lazy.graph) < len(eager.graph)
+
+    for entity in entities:
+        assert lazy.determine_filing_requirement(entity.id) == eager.determine_filing_requirement(entity.id)
+        assert lazy.check_filing_requirement(entity.id) == eager.check_filing_requirement(entity.id)
+    classified = lazy.graph.classified
+    assert classified == len(entities)
+    for status in ("must_file", "optional", "no_filing"):
+        assert sorted(lazy.query_entities_by_filing_status(status)) == \
+            sorted(eager.query_entities_by_filing_status(status))
+
+
+def test_memo_is_invalidated_when_facts_change():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY, sparse=True, lazy=True)
+    engine.add_entity_to_kb(TaxEntity(id="Lazy_P", name="p", entity_type="Person", annual_income=20000.0))
+    assert engine.determine_filing_requirement("Lazy_P")["filing_requirement"] == "NoFilingRequired"
+    assert engine.determine_filing_requirement("Lazy_P")["filing_requirement"] == "NoFilingRequired"
+    assert engine.graph.classified == 1
+
+    # Memo entries of untouched entities carry over to the next generation
+    engine.add_entity_to_kb(TaxEntity(id="Lazy_Q", name="q", entity_type="Person", annual_income=1000.0))
+    assert engine.determine_filing_requirement("Lazy_P")["filing_requirement"] == "NoFilingRequired"
+    assert engine.graph.classified == 0
+
+    _, before = engine.snapshot()
+    engine.add_entity_to_kb(TaxEntity(id="Lazy_P", name="p", entity_type="Person", annual_income=20000.0,
+                                      has_special_payment_situations=True))
+    assert engine.determine_filing_requirement("Lazy_P")["filing_requirement"] == "MandatoryFilingL1"
+    assert (PERSON_KB["Lazy_P"], RDF.type, TAX.MandatoryL1Filer) in engine.graph
+    assert (PERSON_KB["Lazy_P"], RDF.type, TAX.NoFilingRequired) not in engine.graph
+    # The previous generation keeps answering from its own facts
+    assert (PERSON_KB["Lazy_P"], RDF.type, TAX.NoFilingRequired) in before
+
+
+def test_ingest_does_not_copy_the_published_graph():
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = TaxReasoningEngine(ontology_path=ONTOLOGY, lazy=True)
+        engine.ingest_entities([TaxEntity(id=f"Big_{i}", name="b", entity_type="Person",
+                                          annual_income=10000.0 + 100 * i) for i in range(500)])
+        # The first overlay outgrew the ontology, so this ingest flattens it into a plain lazy graph
+        engine.add_entity_to_kb(TaxEntity(id="Small_0", name="s", entity_type="Person", annual_income=1.0))
+        base = engine.graph
+        assert type(base) is LazyInferenceGraph
+        assert engine.determine_filing_requirement("Big_499")["filing_requirement"] == "NoFilingRequired"
+        classified = base.classified
+
+        for i in range(1, 20):
+            engine.add_entity_to_kb(TaxEntity(id=f"Small_{i}", name="s", entity_type="Person",
+                                              annual_income=20000.0, has_incorrect_tax_credits=True))
+        graph = engine.graph
+        # Every generation reads through to the same base; only the new entities live in the overlay
+        assert isinstance(graph, LazyOverlayGraph) and graph.base is base
+        assert graph.overlay_size() * 20 < len(base)
+        assert len(graph) == len(base) + graph.overlay_size()
+        assert engine.determine_filing_requirement("Small_19")["filing_requirement"] == "MandatoryFilingL1"
+        # Untouched entities keep the derived types memoized in the base
+        assert engine.determine_filing_requirement("Big_499")["filing_requirement"] == "NoFilingRequired"
+        assert base.classified == classified and graph.classified == 1
+        assert (PERSON_KB["Small_19"], RDF.type, TAX.MandatoryL1Filer) not in base
+
+
+if __name__ == "__main__":
+    test_lazy_matches_eager()
+    test_memo_is_invalidated_when_facts_change()
+    test_ingest_does_not_copy_the_published_graph()
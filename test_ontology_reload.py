@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Tests for hot-reloading the ontology."""
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from rdflib import Literal
+from rdflib.namespace import OWL, RDF, XSD
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from ontology_reload import OntologyReloader
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def _engine(directory):
+    path = os.path.join(directory, "ontology.ttl")
+    shutil.copy(ONTOLOGY, path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = TaxReasoningEngine(ontology_path=path)
+        engine.ingest_entities([
+            TaxEntity(id="HR_A", name="a", entity_type="Person", annual_income=14800.0,
+                      has_incorrect_commuter_allowance=True),
+            TaxEntity(id="HR_B", name="b", entity_type="Person", annual_income=20000.0,
+                      has_incorrect_commuter_allowance=True),
+        ])
+    return engine, path
+
+
+def _edit(path, old, new):
+    with open(path) as f:
+        text = f.read()
+    assert old in text
+    with open(path, "w") as f:
+        f.write(text.replace(old, new))
+
+
+def _status(engine, entity_id):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return engine.determine_filing_requirement(entity_id)["filing_requirement"]
+
+
+def test_reload_swaps_rules_and_ontology_atomically():
+    with tempfile.TemporaryDirectory() as directory:
+        engine, path = _engine(directory)
+        assert _status(engine, "HR_A") == "MandatoryFilingL1"
+        _, before = engine.snapshot()
+        _edit(path, '"14517.0"^^xsd:decimal', '"15000.0"^^xsd:decimal')
+        _edit(path, 'owl:versionInfo "2.1"', 'owl:versionInfo "2.2"')
+
+        reloader = OntologyReloader(engine)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = reloader.reload().result()
+        reloader.stop()
+        assert result.ok and result.version == "2.2" and result.report.cases > 0
+        assert [(c.entity, c.new_status) for c in result.reclassification.changes] == \
+            [(PERSON_KB["HR_A"], "NoFilingRequired")]
+        assert _status(engine, "HR_A") == "NoFilingRequired"
+        assert _status(engine, "HR_B") == "MandatoryFilingL1"
+        assert engine.compiled_rules().version == "2.2"
+        assert (None, XSD.minExclusive, Literal("15000.0", datatype=XSD.decimal)) in engine.graph
+        assert (None, XSD.minExclusive, Literal("14517.0", datatype=XSD.decimal)) not in engine.graph
+        assert len(list(engine.graph.subjects(RDF.type, OWL.Ontology))) == 1
+        # A reader holding the old generation still sees the old version
+        assert (PERSON_KB["HR_A"], RDF.type, TAX.MandatoryL1Filer) in before
+
+
+def test_rejected_versions_keep_the_active_rules():
+    with tempfile.TemporaryDirectory() as directory:
+        engine, path = _engine(directory)
+        rules = engine.compiled_rules()
+        with contextlib.redirect_stdout(io.StringIO()):
+            with engine.watch_ontology(poll_interval=0.05) as reloader:
+                with open(path, "a") as f:
+                    f.write("\nthis is not turtle .\n")
+                deadline = time.time() + 10
+                while not reloader.history and time.time() < deadline:
+                    time.sleep(0.05)
+                assert reloader.history and not reloader.history[0].ok
+                assert engine.compiled_rules() is rules
+
+                # A definition without any filer class is rejected before the swap
+                _edit(path, "\nthis is not turtle .\n", "")
+                _edit(path, "owl:equivalentClass", "rdfs:seeAlso")
+                result = reloader.reload().result()
+        assert not result.ok and "No definition" in result.error
+        assert engine.compiled_rules() is rules
+        assert _status(engine, "HR_A") == "MandatoryFilingL1"
+
+
+def test_conformance_rejects_a_version_the_reasoner_disagrees_with():
+    with tempfile.TemporaryDirectory() as directory:
+        engine, path = _engine(directory)
+        rules = engine.compiled_rules()
+        # The file parses and compiles, but the graph reasoner of an engine loaded from it keeps the E1 limit
+        _edit(path, '"730.0"^^xsd:decimal', '"0.0"^^xsd:decimal')
+        reloader = OntologyReloader(engine, checks=("graph", "scalar", "vectorized"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = reloader.reload().result()
+        reloader.stop()
+        assert not result.ok and "conformance disagreement" in result.error
+        assert result.report.graph_cases > 0
+        assert {d.statuses["graph"] for d in result.report.disagreements} == {"NoFilingRequired"}
+        assert engine.compiled_rules() is rules
+        assert (None, XSD.minExclusive, Literal("730.0", datatype=XSD.decimal)) in engine.graph
+
+
+if __name__ == "__main__":
+    test_reload_swaps_rules_and_ontology_atomically()
+    test_rejected_versions_keep_the_active_rules()
+    test_conformance_rejects_a_version_the_reasoner_disagrees_with()
+    print("All ontology reload tests passed")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Tests for payroll-line aggregation into TaxEntity objects."""
+
+import random
+from payroll_aggregation import PayrollLine, PayrollAggregator, aggregate_payroll, read_payroll_csv
+
+
+def sample_lines():
+    return [
+        PayrollLine("single", "A", 30000.0),
+        PayrollLine("change", "A", 8000.0, 1, 4),
+        PayrollLine("change", "B", 16000.0, 5, 12),
+        PayrollLine("parallel", "A", 12000.0),
+        PayrollLine("parallel", "B", 6000.0, 3, 8),
+        PayrollLine("joint", "A", 12000.0, joint_taxation=True),
+        PayrollLine("joint", "B", 6000.0, joint_taxation=True),
+        # Two slips from the same employer are not a change of employer
+        PayrollLine("corrected", "A", 10000.0, 1, 6),
+        PayrollLine("corrected", "A", 10500.0, 7, 12),
+    ]
+
+
+def test_features_are_derived():
+    entities = {e.id: e for e in aggregate_payroll(sample_lines())}
+    assert entities["single"].has_single_employer
+    assert entities["change"].annual_income == 24000.0
+    assert entities["change"].has_employer_change
+    assert not entities["change"].has_multiple_employments_without_joint_tax
+    assert entities["parallel"].has_multiple_employments_without_joint_tax
+    assert not entities["parallel"].has_single_employer
+    assert not entities["joint"].has_multiple_employments_without_joint_tax
+    assert entities["corrected"].has_single_employer and not entities["corrected"].has_employer_change
+
+
+def test_spilled_aggregation_matches_in_memory(tmp_path):
+    rng = random.Random(4)
+    lines = [PayrollLine(f"p{rng.randrange(500)}", f"e{rng.randrange(3)}", round(rng.uniform(100, 5000), 2),
+                         month, month)
+             for month in range(1, 13) for _ in range(400)]
+    rng.shuffle(lines)
+    expected = {e.id: e for e in aggregate_payroll(lines)}
+
+    aggregator = PayrollAggregator(max_groups=50, partitions=8, spill_dir=str(tmp_path))
+    aggregator.extend(lines)
+    assert aggregator.spills > 0
+    spilled = {e.id: e for e in aggregator.results()}
+    assert spilled == expected
+    assert list(tmp_path.iterdir()) == []
+
+    csv_path = tmp_path / "payroll.csv"
+    csv_path.write_text("person_id,employer_id,taxable_wage,start_month,end_month,joint_taxation\n"
+                        "x,A,1000.5,1,6,\nx,B,2000,4,12,true\n")
+    entity, = aggregate_payroll(read_payroll_csv(str(csv_path)))
+    assert entity.annual_income == 3000.5
+    assert not entity.has_multiple_employments_without_joint_tax and not entity.has_employer_change
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_features_are_derived()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_spilled_aggregation_matches_in_memory(pathlib.Path(tmp))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Tests for the incremental population counters."""
+
+from collections import Counter
+from rdflib.namespace import RDF
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from population_counters import PopulationCounters
+from population_generator import PopulationConfig, generate_entities
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def _graph_statuses(engine):
+    residents = engine.graph.subjects(RDF.type, TAX.AustrianResident)
+    return Counter(engine._filing_result(str(s), set(engine.graph.objects(s, RDF.type)))["filing_requirement"]
+                   for s in residents)
+
+
+def test_counters_follow_ingest():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    counters = engine.population_counters()
+    start = counters.total
+    entities = list(generate_entities(500, PopulationConfig(seed=21, near_threshold_share=0.3)))
+    engine.ingest_entities(entities[:300])
+    engine.ingest_entities(entities[300:])
+    assert engine.population_counters() is counters
+    assert counters.total == start + 500
+    assert counters.as_dict()["status"] == {name: _graph_statuses(engine)[name] for name in counters.as_dict()["status"]}
+
+    # Seeding from the stored graph gives the same counts as following the ingests
+    rebuilt = PopulationCounters.from_graph(engine.graph, engine.compiled_rules())
+    assert rebuilt.as_dict() == counters.as_dict()
+
+    # Reclassifying an entity moves its contribution instead of adding a second one
+    before = counters.as_dict()
+    engine.ingest_entities([TaxEntity(id=entities[0].id, name="again", entity_type="Person", annual_income=5000.0,
+                                      has_non_wage_income=2000.0)])
+    after = counters.as_dict()
+    assert after["total"] == before["total"]
+    assert counters._status[counters._row_of[PERSON_KB[entities[0].id]]] == 3
+    assert sum(after["income_bands"]["MandatoryFilingE1"].values()) == after["status"]["MandatoryFilingE1"]
+
+
+def test_rule_hits_count_every_clause_that_fires():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    counters = PopulationCounters(engine.compiled_rules())
+    counters.update_entities([
+        TaxEntity(id="RH_1", name="a", entity_type="Person", annual_income=20000.0,
+                  has_special_payment_situations=True, has_incorrect_tax_credits=True),
+        TaxEntity(id="RH_2", name="b", entity_type="Person", annual_income=20000.0, has_non_wage_income=1000.0,
+                  has_special_payment_situations=True),
+        TaxEntity(id="RH_3", name="c", entity_type="Person"),
+        TaxEntity(id="RH_3", name="c", entity_type="Person", annual_income=12000.0, has_employer_change=True),
+    ])
+    counts = counters.as_dict()
+    assert counts["total"] == 3
+    assert counts["status"] == {"NoFilingRequired": 0, "VoluntaryFilingL1": 1, "MandatoryFilingL1": 1,
+                                "MandatoryFilingE1": 1}
+    hits = {label: n for label, n in counts["rules"].items() if n}
+    assert hits == {
+        "MandatoryE1Filer: hasNonWageIncome > 730": 1,
+        "MandatoryL1Filer: hasSpecialPaymentSituations and not MandatoryE1Filer": 1,
+        "MandatoryL1Filer: hasIncorrectTaxCredits and not MandatoryE1Filer": 1,
+        "VoluntaryL1Filer: hasEmployerChange and not MandatoryE1Filer and not MandatoryL1Filer": 1,
+    }
+    assert counts["income_bands"]["VoluntaryFilingL1"]["10000 - 13308"] == 1
+
+
+if __name__ == "__main__":
+    test_counters_follow_ingest()
+    test_rule_hits_count_every_clause_that_fires()
+    print("All population counter tests passed")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Tests for the synthetic taxpayer population generator."""
+
+import json
+import numpy as np
+from rdflib import Graph
+from rdflib.namespace import RDF
+from compiled_rules import pack_flags
+from tax_reasoning_engine import TAX, TaxEntity
+from taxpayer_store import ColumnarTaxpayerStore
+from population_generator import (PopulationConfig, iter_blocks, generate_entities,
+                                  write_jsonl, write_ttl, write_columnar, BLOCK_ROWS)
+
+
+def test_generation_is_reproducible_and_clustered():
+    config = PopulationConfig(seed=7, near_threshold_share=0.5, near_threshold_width=100.0)
+    first = list(iter_blocks(BLOCK_ROWS + 10, config))
+    second = list(iter_blocks(BLOCK_ROWS + 10, config))
+    assert [len(ids) for ids, _, _, _ in first] == [BLOCK_ROWS, 10]
+    for a, b in zip(first, second):
+        assert a[0] == b[0]
+        assert np.array_equal(a[1], b[1], equal_nan=True)
+        assert np.array_equal(a[3], b[3])
+
+    wage = first[0][1]
+    near = np.zeros(len(wage), dtype=bool)
+    for threshold in config.wage_thresholds:
+        near |= np.abs(wage - threshold) <= 100.0
+    assert near.mean() > 0.4
+
+    entities = list(generate_entities(50, config))
+    ids, wage, non_wage, flags = next(iter_blocks(50, config))
+    assert [e.id for e in entities] == ids
+    assert [pack_flags(e) for e in entities] == list(flags)
+    assert not any(e.has_single_employer and e.has_employer_change for e in entities)
+
+
+def test_writers_agree(tmp_path):
+    config = PopulationConfig(seed=3)
+    entities = list(generate_entities(200, config))
+
+    assert write_jsonl(str(tmp_path / "pop.jsonl"), 200, config) == 200
+    with open(tmp_path / "pop.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert [TaxEntity(**r) for r in records] == entities
+
+    assert write_ttl(str(tmp_path / "pop.ttl"), 200, config) == 200
+    graph = Graph()
+    graph.parse(str(tmp_path / "pop.ttl"), format="turtle")
+    assert len(list(graph.subjects(RDF.type, TAX.AustrianResident))) == 200
+
+    assert write_columnar(str(tmp_path / "store"), 200, config) == 200
+    store = ColumnarTaxpayerStore(str(tmp_path / "store"))
+    assert store.entity_id(199) == entities[199].id
+    assert list(store.flags) == [pack_flags(e) for e in entities]
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_generation_is_reproducible_and_clustered()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_writers_agree(pathlib.Path(tmp))
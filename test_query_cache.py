@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Tests for the generation-aware SPARQL query cache."""
+
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB, decimal_literal
+from query_cache import QueryCache
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+AUDIT_QUERY = f"""
+PREFIX tax: <{TAX}>
+SELECT ?person ?wage ?nonWage WHERE {{
+    ?person a tax:MandatoryL1Filer ;
+            tax:hasAnnualWageIncome ?wage .
+    OPTIONAL {{ ?person tax:hasNonWageIncome ?nonWage }}
+    FILTER(STRSTARTS(STR(?person), "{PERSON_KB}"))
+}} ORDER BY ?person
+"""
+
+
+def _people(result):
+    return [str(row.person).split("#")[-1] for row in result]
+
+
+def test_results_are_reused_until_a_new_generation():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    engine.add_entity_to_kb(TaxEntity(id="QC_A", name="a", entity_type="Person", annual_income=20000.0,
+                                      has_special_payment_situations=True))
+    first = engine.query(AUDIT_QUERY)
+    assert _people(first) == ["QC_A"]
+    second = engine.query(AUDIT_QUERY)
+    assert _people(second) == ["QC_A"] and second.vars == first.vars
+    stats = engine.query_cache().stats
+    assert (stats.hits, stats.misses, stats.plan_misses) == (1, 1, 1)
+
+    engine.add_entity_to_kb(TaxEntity(id="QC_B", name="b", entity_type="Person", annual_income=30000.0,
+                                      has_non_wage_income=100.0, has_discretionary_assessment=True))
+    assert _people(engine.query(AUDIT_QUERY)) == ["QC_A", "QC_B"]
+    # The result was recomputed from the new generation but the plan was reused
+    assert (stats.hits, stats.misses, stats.plan_hits, stats.invalidations) == (1, 2, 1, 1)
+    assert stats.hit_rate == 1 / 3
+
+
+def test_bindings_are_part_of_the_key_and_entries_are_evicted():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    engine.ingest_entities([TaxEntity(id=f"QC_{i}", name=str(i), entity_type="Person",
+                                      annual_income=20000.0 + i, has_incorrect_tax_credits=True)
+                            for i in range(3)])
+    cache = QueryCache(engine, max_results=2)
+    ask = f"ASK {{ ?person <{TAX.hasAnnualWageIncome}> ?wage }}"
+    for i in range(3):
+        result = cache.query(AUDIT_QUERY, initBindings={"wage": decimal_literal(20000.0 + i)})
+        assert _people(result) == [f"QC_{i}"]
+    assert len(cache) == 2 and cache.stats.evictions == 1
+    assert _people(cache.query(AUDIT_QUERY, initBindings={"wage": decimal_literal(20002.0)})) == ["QC_2"]
+    assert cache.stats.hits == 1
+
+    assert cache.query(ask, initBindings={"person": PERSON_KB["QC_1"]}).askAnswer is True
+    assert cache.query(ask, initBindings={"person": PERSON_KB["missing"]}).askAnswer is False
+    assert cache.stats.as_dict()["plan_hit_rate"] > 0.5
+
+
+if __name__ == "__main__":
+    test_results_are_reused_until_a_new_generation()
+    test_bindings_are_part_of_the_key_and_entries_are_evicted()
+    print("All query cache tests passed")
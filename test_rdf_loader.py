@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Tests for the streaming N-Triples/Turtle taxpayer loader."""
+
+import io
+import numpy as np
+from rdflib import Graph, Literal
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF, RDFS
+from tax_reasoning_engine import TaxReasoningEngine, TAX, PERSON_KB
+from compiled_rules import FLAG_BITS, status_of_columns
+from taxpayer_store import ColumnarTaxpayerStore, classify_store
+from population_generator import PopulationConfig, iter_blocks, write_ttl
+from rdf_loader import load_records, load_lines, load_into_store
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def _split_reference(graph: Graph):
+    """Expected records and leftover triples, computed from an rdflib-parsed graph"""
+    rows, extra = {}, Graph()
+    income = {TAX.hasAnnualWageIncome: "annual_income", TAX.hasNonWageIncome: "has_non_wage_income"}
+    for s, p, o in graph:
+        if p == RDF.type and o == TAX.AustrianResident:
+            rows.setdefault(str(s), {})
+        elif p in income:
+            rows.setdefault(str(s), {})[income[p]] = float(o)
+        elif p in FLAG_BITS:
+            rows.setdefault(str(s), {})[p] = bool(o.toPython())
+        else:
+            extra.add((s, p, o))
+    return rows, extra
+
+
+def test_matches_rdflib_on_turtle_and_ntriples():
+    graph = Graph().parse(ONTOLOGY, format="turtle")
+    rows, extra = _split_reference(graph)
+    for loaded in (load_records(ONTOLOGY), load_lines(io.StringIO(graph.serialize(format="nt")))):
+        assert sorted(loaded.ids) == sorted(rows)
+        assert isomorphic(loaded.extra, extra)
+        for entity_id, record in zip(loaded.ids, loaded.records):
+            expected = rows[entity_id]
+            wage = expected.get("annual_income")
+            assert (np.isnan(record["annual_income"]) if wage is None else record["annual_income"] == wage)
+            assert record["has_non_wage_income"] == expected.get("has_non_wage_income", 0.0)
+            for prop, value in expected.items():
+                if prop in FLAG_BITS:
+                    assert bool(record["flags"] & FLAG_BITS[prop]) == value
+
+
+def test_population_export_roundtrip(tmp_path):
+    config = PopulationConfig(seed=5)
+    path = str(tmp_path / "population.ttl")
+    write_ttl(path, 300, config)
+    loaded = load_into_store(path, str(tmp_path / "store"))
+    ids, wage, non_wage, flags = next(iter_blocks(300, config))
+    assert loaded.ids == ids
+    assert loaded.fallback_statements == 0 and len(loaded.extra) == 0
+    assert np.array_equal(loaded.records["annual_income"], np.round(wage, 2), equal_nan=True)
+    assert np.allclose(loaded.records["has_non_wage_income"], non_wage)
+    assert np.array_equal(loaded.records["flags"], flags)
+    assert loaded.resident.all()
+
+    store = ColumnarTaxpayerStore(str(tmp_path / "store"))
+    assert len(store) == 300 and store.entity_id(299) == ids[299]
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    rules = engine.compiled_rules()
+    expected = status_of_columns(rules.classify_columns(store.annual_income, store.non_wage_income, store.flags))
+    assert np.array_equal(engine.classify_records(loaded.records), expected)
+
+
+def test_unusual_syntax_falls_back_to_rdflib():
+    text = '''PREFIX : <http://example.org/austrian-tax-resident#>
+@prefix kb: <http://example.org/person-kb#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+kb:A a :AustrianResident ;
+    rdfs:label "multi\\"quoted" ;
+    :hasAnnualWageIncome 20000.5 ; :hasSpecialPaymentSituations true .
+kb:B a :AustrianResident ; rdfs:seeAlso [ rdfs:label "nested" ] ;
+    :hasNonWageIncome "800"^^<http://www.w3.org/2001/XMLSchema#decimal> .
+kb:C :hasSingleEmployer false , false .
+'''
+    loaded = load_lines(io.StringIO(text))
+    assert loaded.ids == ["A", "B", "C"]
+    assert loaded.fallback_statements == 2
+    a, b, c = loaded.records
+    assert a["annual_income"] == 20000.5 and a["flags"] & FLAG_BITS[TAX.hasSpecialPaymentSituations]
+    assert np.isnan(b["annual_income"]) and b["has_non_wage_income"] == 800.0
+    assert not c["flags"] & FLAG_BITS[TAX.hasSingleEmployer]
+    assert (PERSON_KB["A"], RDFS.label, Literal('multi"quoted')) in loaded.extra
+    assert len(loaded.extra) == 3
+
+
+def test_blank_node_taxpayers_match_on_both_paths():
+    prefixes = ("@prefix : <http://example.org/austrian-tax-resident#> .\n"
+                "@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .\n")
+    fast = load_lines(io.StringIO(prefixes + '_:t a :AustrianResident .\n_:t rdfs:label "ab" .\n'))
+    fallback = load_lines(io.StringIO(prefixes + '_:t a :AustrianResident ; rdfs:label "a\\"b" .\n'))
+    assert fast.fallback_statements == 0 and fallback.fallback_statements == 1
+    assert fast.ids == fallback.ids == ["_:t"]
+    assert len(fast.extra) == len(fallback.extra) == 1
+
+
+def test_blank_node_labels_are_shared_with_the_fallback():
+    text = """@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+_:x rdfs:label "fast" .
+_:x rdfs:comment "escaped \\"_:x\\"" ; rdfs:seeAlso _:y .
+_:y rdfs:label "fast too" .
+"""
+    loaded = load_lines(io.StringIO(text))
+    assert loaded.fallback_statements == 1
+    assert len(set(loaded.extra.subjects())) == 2
+    x = loaded.extra.value(predicate=RDFS.label, object=Literal("fast"))
+    y = loaded.extra.value(predicate=RDFS.label, object=Literal("fast too"))
+    assert loaded.extra.value(x, RDFS.comment) == Literal('escaped "_:x"')
+    assert loaded.extra.value(x, RDFS.seeAlso) == y
+
+
+def test_only_residents_are_persons_in_the_store(tmp_path):
+    text = """@prefix : <http://example.org/austrian-tax-resident#> .
+@prefix kb: <http://example.org/person-kb#> .
+kb:R a :AustrianResident ; :hasAnnualWageIncome 50000 ; :hasIncorrectTaxCredits true .
+kb:N a :NonResident ; :hasAnnualWageIncome 50000 ; :hasIncorrectTaxCredits true .
+"""
+    path = tmp_path / "mixed.ttl"
+    path.write_text(text, encoding="utf-8")
+    loaded = load_into_store(str(path), str(tmp_path / "store"))
+    assert loaded.ids == ["R", "N"] and list(loaded.resident) == [True, False]
+    assert (PERSON_KB["N"], RDF.type, TAX.NonResident) in loaded.extra
+
+    store = ColumnarTaxpayerStore(str(tmp_path / "store"))
+    assert list(store.person) == [True, False]
+    rules = TaxReasoningEngine(ontology_path=ONTOLOGY).compiled_rules()
+    assert list(classify_store(store, rules, out=np.empty(2, dtype=np.uint8))) == [2, 0]
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_matches_rdflib_on_turtle_and_ntriples()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_population_export_roundtrip(pathlib.Path(tmp))
+    test_unusual_syntax_falls_back_to_rdflib()
+    test_blank_node_taxpayers_match_on_both_paths()
+    test_blank_node_labels_are_shared_with_the_fallback()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_only_residents_are_persons_in_the_store(pathlib.Path(tmp))
+    print("All RDF loader tests passed")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Tests for incremental reclassification after a rule change."""
+
+import contextlib
+import io
+from rdflib.namespace import RDF
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from compiled_rules import STATUS_NAMES, status_of_columns
+from population_counters import resident_columns
+from population_generator import PopulationConfig, generate_entities
+from reclassification import diff_rules
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+NEW_THRESHOLDS = {(TAX.hasAnnualWageIncome, 14517.0): 15000.0, (TAX.hasNonWageIncome, 730.0): 1000.0}
+
+
+def _statuses(rules, graph):
+    subjects, wage, non_wage, flags = resident_columns(graph)
+    return dict(zip(subjects, (STATUS_NAMES[s] for s in status_of_columns(rules.classify_columns(wage, non_wage, flags)))))
+
+
+def _graph_status(engine, subject):
+    types = set(engine.graph.objects(subject, RDF.type))
+    return engine._filing_result(str(subject), types)["filing_requirement"]
+
+
+def test_diff_finds_only_the_moved_thresholds():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    rules = engine.compiled_rules()
+    assert diff_rules(rules, rules).empty
+    diff = diff_rules(rules, rules.with_thresholds(NEW_THRESHOLDS))
+    described = [cell.describe() for cell in diff.cells]
+    assert any("hasAnnualWageIncome (14517, 15000)" in d for d in described)
+    assert any("hasNonWageIncome (730, 1000)" in d for d in described)
+    for cell in diff.cells:
+        if cell.wage is not None and cell.wage.low == 14517 and cell.non_wage.contains(0.0):
+            # Only wage earners with a multiple-employment/commuter/family-bonus error cross 14517
+            assert cell.required_flags(diff.flag_mask).get("has_special_payment_situations") is False
+
+
+def test_change_feed_matches_full_reclassification():
+    for lazy in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine = TaxReasoningEngine(ontology_path=ONTOLOGY, lazy=lazy)
+            engine.ingest_entities(list(generate_entities(600, PopulationConfig(seed=5, near_threshold_share=0.4))))
+        old_rules = engine.compiled_rules()
+        new_rules = old_rules.with_thresholds(NEW_THRESHOLDS)
+        before = _statuses(old_rules, engine.graph)
+        expected = {s: (before[s], after) for s, after in _statuses(new_rules, engine.graph).items()
+                    if before[s] != after}
+        assert expected
+
+        previous = engine.graph
+        previous_types = {s: set(previous.objects(s, RDF.type)) for s in expected}
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = engine.reclassify(new_rules)
+        assert {c.entity: (c.old_status, c.new_status) for c in result.changes} == expected
+        if not lazy:
+            # Published as a delta over the previous generation, which readers still see unchanged
+            assert engine.graph.base is previous
+            assert {s: set(previous.objects(s, RDF.type)) for s in expected} == previous_types
+        assert result.candidates < len(before) / 2
+        assert engine.compiled_rules() is new_rules
+        for subject, (_, status) in expected.items():
+            assert _graph_status(engine, subject) == status
+
+        # Later ingests classify with the new rules too
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.add_entity_to_kb(TaxEntity(id="RC_new", name="new", entity_type="Person", annual_income=14800.0,
+                                              has_incorrect_family_bonus=True, has_non_wage_income=900.0))
+        assert _graph_status(engine, PERSON_KB["RC_new"]) == "NoFilingRequired"
+
+
+if __name__ == "__main__":
+    test_diff_finds_only_the_moved_thresholds()
+    test_change_feed_matches_full_reclassification()
+    print("All reclassification tests passed")
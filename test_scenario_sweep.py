@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Tests for the threshold scenario sweep."""
+
+import numpy as np
+from tax_reasoning_engine import TaxReasoningEngine, TAX
+from compiled_rules import status_of_columns
+from conformance_harness import random_cases
+from population_generator import PopulationConfig, generate_entities
+from scenario_sweep import ScenarioSweep
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+GRID = {
+    (TAX.hasAnnualWageIncome, 14517.0): [14000.0, 14517.0, 15000.0],
+    (TAX.hasAnnualWageIncome, 13308.0): [13308.0, 12000.0],
+    (TAX.hasNonWageIncome, 730.0): [500.0, 730.0, 1000.0],
+}
+
+
+def test_transitions_match_full_reclassification():
+    rules = TaxReasoningEngine(ontology_path=ONTOLOGY).compiled_rules()
+    wage, non_wage, flags = next(random_cases(20000, seed=8, near_threshold_share=0.5))
+    wage = wage.copy()
+    wage[::50] = np.nan
+    wage[1::97] = 14517.0
+    non_wage = non_wage.copy()
+    non_wage[2::89] = 730.0
+    sweep = ScenarioSweep(rules, wage, non_wage, flags)
+    results = sweep.sweep(GRID)
+    assert len(results) == 18
+
+    before = status_of_columns(rules.classify_columns(wage, non_wage, flags))
+    for result in results:
+        after = status_of_columns(rules.with_thresholds(result.thresholds).classify_columns(wage, non_wage, flags))
+        expected = np.zeros((4, 4), dtype=np.int64)
+        np.add.at(expected, (before, after), 1)
+        assert np.array_equal(result.matrix, expected), result.thresholds
+    unchanged = [r for r in results if all(k[1] == v for k, v in r.thresholds.items())]
+    assert len(unchanged) == 1 and unchanged[0].moved == 0
+
+
+def test_sweep_over_engine_population():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    engine.ingest_entities(list(generate_entities(300, PopulationConfig(seed=2, near_threshold_share=0.5))))
+    results = engine.scenario_sweep({(TAX.hasNonWageIncome, 730.0): [2000.0]})
+    summary = results[0].as_dict()
+    assert summary["thresholds"] == {"hasNonWageIncome 730": 2000.0}
+    assert sum(sum(row.values()) for row in summary["transitions"].values()) == len(ScenarioSweep.from_graph(
+        engine.graph, engine.compiled_rules()))
+    # Raising the E1 threshold can only move residents out of MandatoryFilingE1
+    assert summary["moved"] == sum(summary["transitions"]["MandatoryFilingE1"].values()) - \
+        summary["transitions"]["MandatoryFilingE1"]["MandatoryFilingE1"]
+    try:
+        engine.scenario_sweep({(TAX.hasNonWageIncome, 731.0): [2000.0]})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown threshold accepted")
+
+
+if __name__ == "__main__":
+    test_transitions_match_full_reclassification()
+    test_sweep_over_engine_population()
+    print("All scenario sweep tests passed")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Tests for copy-on-write session knowledge bases over a shared ontology graph."""
+
+from session_overlay import OverlayGraph
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, PERSON_KB, TAX
+from rdflib.namespace import RDF
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def make_entity(entity_id, **kwargs):
+    return TaxEntity(id=entity_id, name=entity_id, entity_type="Person", **kwargs)
+
+
+def test_sessions_are_isolated_and_share_the_ontology():
+    shared = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    shared_size = len(shared.graph)
+
+    first = shared.session()
+    second = shared.session()
+    first.add_entity_to_kb(make_entity("Session_A", annual_income=35000.0, has_incorrect_tax_credits=True))
+    second.add_entity_to_kb(make_entity("Session_B", annual_income=20000.0, has_employer_change=True))
+
+    assert len(shared.graph) == shared_size
+    assert first.graph.base is second.graph.base is shared.graph
+    assert 0 < first.graph.overlay_size() < shared_size
+
+    assert first.determine_filing_requirement("Session_A")["filing_requirement"] == "MandatoryFilingL1"
+    assert "error" in first.determine_filing_requirement("Session_B")
+    assert second.determine_filing_requirement("Session_B")["filing_requirement"] == "VoluntaryFilingL1"
+    # Ontology individuals stay visible through the overlay
+    assert (TAX.TestCase_MandatoryL1_HighIncome, RDF.type, TAX.MandatoryL1Filer) in first.graph
+
+    rows = list(first.graph.query(
+        "SELECT ?s WHERE { ?s a <%s> }" % TAX.MandatoryFilingL1))
+    assert (PERSON_KB["Session_A"],) in [tuple(row) for row in rows]
+
+    first.discard()
+    assert first.graph.overlay_size() == 0
+    assert "error" in first.determine_filing_requirement("Session_A")
+
+
+def test_overlay_does_not_copy_base_triples():
+    shared = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    overlay = OverlayGraph(shared.graph)
+    existing = next(iter(shared.graph))
+    overlay.add(existing)
+    assert overlay.overlay_size() == 0
+    assert len(overlay) == len(shared.graph)
+
+
+def test_session_inference_only_touches_its_own_entities():
+    shared = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    shared.ingest_entities([make_entity(f"Shared_{i}", annual_income=20000.0 + i) for i in range(50)])
+    tracked = len(shared.validator._entities)
+
+    session = shared.session()
+    session.add_entity_to_kb(make_entity("Session_Only", annual_income=35000.0, has_incorrect_tax_credits=True))
+    assert session.validator._entities == [PERSON_KB["Session_Only"]]
+    assert set(session.graph.overlay_subjects()) == {PERSON_KB["Session_Only"]}
+    assert session.determine_filing_requirement("Session_Only")["filing_requirement"] == "MandatoryFilingL1"
+    assert (session.determine_filing_requirement("Shared_3")["filing_requirement"]
+            == shared.determine_filing_requirement("Shared_3")["filing_requirement"])
+    assert len(shared.validator._entities) == tracked
+
+
+if __name__ == "__main__":
+    test_sessions_are_isolated_and_share_the_ontology()
+    test_overlay_does_not_copy_base_triples()
+    test_session_inference_only_touches_its_own_entities()
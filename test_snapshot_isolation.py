@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Tests for generation-based snapshot reads during ingestion."""
+
+import threading
+from rdflib.namespace import RDF
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, PERSON_KB, TAX
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+FILER_TYPES = (TAX.MandatoryL1Filer, TAX.VoluntaryL1Filer, TAX.MandatoryE1Filer, TAX.NoFilingRequired)
+
+
+def make_entity(entity_id, **kwargs):
+    return TaxEntity(id=entity_id, name=entity_id, entity_type="Person", **kwargs)
+
+
+def test_snapshot_is_not_affected_by_later_ingest():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    generation, graph = engine.snapshot()
+    size = len(graph)
+
+    engine.ingest_entities([make_entity("Snap_A", annual_income=20000.0, has_employer_change=True),
+                            make_entity("Snap_B", annual_income=9000.0)])
+
+    assert engine.generation > generation
+    assert len(graph) == size
+    assert (PERSON_KB["Snap_A"], None, None) not in graph
+    assert engine.determine_filing_requirement("Snap_A")["filing_requirement"] == "VoluntaryFilingL1"
+    assert engine.determine_filing_requirement("Snap_B")["filing_requirement"] == "NoFilingRequired"
+
+
+def test_readers_only_see_fully_classified_generations():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        try:
+            while not done.is_set():
+                _, graph = engine.snapshot()
+                for person, _, _ in graph.triples((None, RDF.type, TAX.AustrianResident)):
+                    if not any((person, RDF.type, cls) in graph for cls in FILER_TYPES):
+                        errors.append(f"{person} visible before classification")
+        except Exception as e:  # pragma: no cover - reported through errors
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for batch in range(5):
+        engine.ingest_entities([make_entity(f"Batch{batch}_{i}", annual_income=1000.0 * i,
+                                            has_incorrect_tax_credits=i % 3 == 0)
+                                for i in range(20)])
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(engine.query_entities_by_filing_status("must_file")) == 5 * 7
+
+
+if __name__ == "__main__":
+    test_snapshot_is_not_affected_by_later_ingest()
+    test_readers_only_see_fully_classified_generations()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Tests for sparse entity encoding (only non-default facts are materialized)."""
+
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, PERSON_KB, TAX, FALSE_LITERAL
+from test_austrian_tax_rules import test_cases
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_sparse_matches_dense_classification():
+    dense = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    sparse = TaxReasoningEngine(ontology_path=ONTOLOGY, sparse=True)
+    for test_name, test_data in test_cases.items():
+        dense.add_entity_to_kb(test_data["entity"])
+        sparse.add_entity_to_kb(test_data["entity"])
+        assert sparse.determine_filing_requirement(test_name) == dense.determine_filing_requirement(test_name)
+        assert sparse.get_entity_properties(test_name) == dense.get_entity_properties(test_name)
+    assert len(sparse.graph) < len(dense.graph)
+
+
+def test_sparse_keeps_non_default_false_flag():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY, sparse=True)
+    engine.add_entity_to_kb(TaxEntity(
+        id="Sparse_NotFiled",
+        name="Employment tax not filed",
+        entity_type="Person",
+        annual_income=14000.0,
+        has_filed_employment_tax=False,
+    ))
+    entity_uri = PERSON_KB["Sparse_NotFiled"]
+    facts = set(engine.graph.predicate_objects(entity_uri))
+    assert (TAX.hasFiledEmploymentTax, FALSE_LITERAL) in facts
+    # Type, wage income and the single non-default flag
+    assert len([p for p, _ in facts if p != TAX.hasFiledEmploymentTax and str(p).startswith(str(TAX))]) == 1
+    assert engine.determine_filing_requirement("Sparse_NotFiled")["filing_requirement"] == "MandatoryFilingL1"
+
+
+if __name__ == "__main__":
+    test_sparse_matches_dense_classification()
+    test_sparse_keeps_non_default_false_flag()
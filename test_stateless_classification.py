@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Tests for stateless classify-and-forget classification."""
+
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity
+from population_generator import generate_entities
+from test_austrian_tax_rules import test_cases
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_classify_entity_matches_knowledge_base():
+    stateless = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    stateful = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    entities = [case["entity"] for case in test_cases.values()] + list(generate_entities(300))
+    stateful.ingest_entities(entities)
+    for entity in entities:
+        assert stateless.classify_entity(entity) == stateful.determine_filing_requirement(entity.id)
+
+    company = TaxEntity(id="Company", name="c", entity_type="Company", annual_income=50000.0,
+                        has_special_payment_situations=True)
+    assert stateless.classify_entity(company)["filing_requirement"] == "NoFilingRequired"
+
+
+def test_classify_entity_leaves_no_residue():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    generation, graph = engine.snapshot()
+    size = len(graph)
+    for entity in generate_entities(2000):
+        engine.classify_entity(entity)
+    assert engine.generation == generation
+    assert len(engine.graph) == size
+    assert "error" in engine.determine_filing_requirement("synthetic_0")
+
+
+if __name__ == "__main__":
+    test_classify_entity_matches_knowledge_base()
+    test_classify_entity_leaves_no_residue()
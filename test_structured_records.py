@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Tests for classifying structured arrays and binary record buffers."""
+
+import numpy as np
+from tax_reasoning_engine import TaxReasoningEngine
+from compiled_rules import STATUS_NAMES
+from structured_records import TAXPAYER_DTYPE, PACKED_TAXPAYER_DTYPE, to_records
+from test_austrian_tax_rules import test_cases
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_records_match_classify_entity():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    entities = [case["entity"] for case in test_cases.values() if case["entity"].entity_type == "Person"]
+    expected = [engine.classify_entity(entity)["filing_requirement"] for entity in entities]
+
+    for dtype in (TAXPAYER_DTYPE, PACKED_TAXPAYER_DTYPE):
+        records = to_records(entities, dtype)
+        out = np.full(len(records), 255, dtype=np.uint8)
+        result = engine.classify_records(records, out=out)
+        assert result is out
+        assert [STATUS_NAMES[code] for code in out] == expected
+
+        # Raw bytes plus the declared dtype, written into a bytearray
+        buffer = bytearray(len(records))
+        engine.classify_records(records.tobytes(), out=buffer, dtype=dtype)
+        assert list(buffer) == list(out)
+
+
+def test_missing_flag_fields_take_defaults():
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    dtype = np.dtype([("annual_income", "<f4"), ("has_special_payment_situations", "u1")])
+    records = np.array([(20000.0, 0), (20000.0, 1), (np.nan, 0)], dtype=dtype)
+    codes = engine.classify_records(records)
+    assert [STATUS_NAMES[code] for code in codes] == ["NoFilingRequired", "MandatoryFilingL1", "NoFilingRequired"]
+
+    try:
+        engine.classify_records(records, out=np.empty(2, dtype=np.uint8))
+        assert False, "short output buffer accepted"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_records_match_classify_entity()
+    test_missing_flag_fields_take_defaults()
+    print("All structured record tests passed")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Tests for the compiled rules and the memory-mapped columnar taxpayer store."""
+
+import json
+import os
+import numpy as np
+from compiled_rules import STATUS_NAMES, STATUS_CODES, pack_flags
+from taxpayer_store import ColumnarTaxpayerStore, ColumnarStoreWriter, write_store
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity
+from test_austrian_tax_rules import test_cases
+
+ONTOLOGY = "austrian_tax_ontology_resident_only.ttl"
+
+
+def test_store_roundtrip_and_classification(tmp_path):
+    entities = [test_data["entity"] for test_data in test_cases.values()]
+    entities.append(TaxEntity(id="Unknown_Wage", name="No wage", entity_type="Person"))
+    # The compiled rules would make this Mandatory L1, but only persons are classified
+    entities.append(TaxEntity(id="Company", name="GmbH", entity_type="Organization", annual_income=50000.0,
+                              has_incorrect_tax_credits=True))
+    path = str(tmp_path / "store")
+    assert write_store(path, entities) == len(entities)
+
+    store = ColumnarTaxpayerStore(path)
+    assert len(store) == len(entities)
+    assert isinstance(store.flags, np.memmap)
+    assert [store.entity_id(row) for row in range(len(store))] == [e.id for e in entities]
+    assert [store.row_of(e.id) for e in entities] == list(range(len(entities)))
+    assert store.row_of("TestCase") is None and store.row_of("") is None
+    assert np.isnan(store.annual_income[-2])
+    assert int(store.flags[0]) == pack_flags(entities[0])
+    assert list(store.person[-2:]) == [True, False]
+
+    # Reference: the graph reasoner on the same entities
+    engine = TaxReasoningEngine(ontology_path=ONTOLOGY)
+    engine.ingest_entities(entities)
+    expected = [STATUS_CODES[engine.determine_filing_requirement(e.id)["filing_requirement"]] for e in entities]
+
+    status = engine.classify_store(store, chunk_size=4)
+    assert list(status) == expected
+    assert np.array_equal(store.open_column("status", np.uint8), status)
+
+    by_name = {e.id: STATUS_NAMES[code] for e, code in zip(entities, status)}
+    assert by_name["TestCase_MandatoryE1_NonWageIncome"] == "MandatoryFilingE1"
+    assert by_name["TestCase_MandatoryL1_HighIncome"] == "MandatoryFilingL1"
+    assert by_name["TestCase_VoluntaryL1_SingleEmployer"] == "VoluntaryFilingL1"
+    assert by_name["Company"] == "NoFilingRequired"
+
+
+def test_id_index_merges_sorted_runs(tmp_path):
+    ids = [f"kb:person/{i * 7919 % 1000}" for i in range(1000)] + ["kb:person/3"]
+    path = str(tmp_path / "index")
+    # Small runs force the on-disk merge that large stores go through
+    with ColumnarStoreWriter(path, buffer_rows=100, index_run_rows=64) as writer:
+        writer.extend(TaxEntity(id=entity_id, name=entity_id, entity_type="Person") for entity_id in ids)
+    assert sorted(os.listdir(path)) == sorted(["meta.json", "annual_income.f8", "non_wage_income.f8", "flags.u4",
+                                               "person.b1", "ids.offsets.i8", "ids.bin", "ids.hash.u8",
+                                               "ids.rows.i8"])
+
+    store = ColumnarTaxpayerStore(path)
+    hashes, _ = store._open_id_index()
+    assert isinstance(hashes, np.memmap) and np.all(hashes[1:] >= hashes[:-1])
+    assert [store.row_of(entity_id) for entity_id in ids[:1000]] == list(range(1000))
+    assert store.row_of("kb:person/3") == ids.index("kb:person/3")
+    assert store.row_of("kb:person/1000") is None
+
+    # A store written before the index existed builds it on first lookup
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    del meta["id_index"]
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.remove(os.path.join(path, "ids.hash.u8"))
+    os.remove(os.path.join(path, "ids.rows.i8"))
+    assert ColumnarTaxpayerStore(path).row_of(ids[500]) == 500
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "empty")
+    with ColumnarStoreWriter(path):
+        pass
+    store = ColumnarTaxpayerStore(path)
+    assert len(store) == 0
+    assert list(store.iter_chunks()) == []
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as tmp:
+        test_store_roundtrip_and_classification(pathlib.Path(tmp))
+        test_id_index_merges_sorted_runs(pathlib.Path(tmp))
+        test_empty_store(pathlib.Path(tmp))
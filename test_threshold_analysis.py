@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Tests for threshold sensitivity and counterfactual analysis."""
+
+import numpy as np
+from rdflib import Graph
+from compiled_rules import compile_rules, pack_flags, MANDATORY_L1, VOLUNTARY_L1
+from tax_reasoning_engine import TaxEntity, TAX
+from threshold_analysis import (threshold_distances, income_for_target, distance_to_flip,
+                                near_threshold, single_flag_flips, minimal_flag_flips)
+
+graph = Graph()
+graph.parse("austrian_tax_ontology_resident_only.ttl", format="turtle")
+rules = compile_rules(graph)
+
+
+def test_wage_needed_for_mandatory_l1():
+    entity = TaxEntity(id="p", name="p", entity_type="Person", annual_income=14000.0,
+                       has_multiple_employments_without_joint_tax=True)
+    wage = income_for_target(rules, np.array([14000.0]), np.array([0.0]),
+                             np.array([pack_flags(entity)]), TAX.MandatoryL1Filer)
+    assert wage[0] == 14517.01
+
+    not_filed = TaxEntity(id="q", name="q", entity_type="Person", annual_income=12000.0,
+                          has_filed_employment_tax=False)
+    wage = income_for_target(rules, np.array([12000.0]), np.array([0.0]),
+                             np.array([pack_flags(not_filed)]), MANDATORY_L1)
+    assert wage[0] == 13308.0
+
+    distances = {d.threshold: d for d in threshold_distances(rules, not_filed)}
+    assert distances[13308.0].distance == 1308.0
+    assert distances[13308.0].changes_status
+    assert distances[730.0].crossing_value == 730.01
+    assert distances[730.0].status_after == "MandatoryFilingE1"
+
+    # A sub-cent income just past 14517 is already above it: the crossing is back down to 14517
+    sub_cent = TaxEntity(id="c", name="c", entity_type="Person", annual_income=14517.005,
+                         has_multiple_employments_without_joint_tax=True)
+    crossing = {d.threshold: d for d in threshold_distances(rules, sub_cent)}[14517.0]
+    assert crossing.crossing_value == 14517.0 and crossing.distance == -0.005
+    assert (crossing.status_before, crossing.status_after) == ("MandatoryFilingL1", "NoFilingRequired")
+
+
+def test_flag_counterfactuals():
+    e1 = TaxEntity(id="e", name="e", entity_type="Person", annual_income=20000.0, has_non_wage_income=5000.0)
+    # Only the non-wage income drives E1, so no flag change removes it
+    assert minimal_flag_flips(rules, e1, leave=TAX.MandatoryE1Filer) == []
+
+    simple = TaxEntity(id="s", name="s", entity_type="Person", annual_income=20000.0)
+    flips = minimal_flag_flips(rules, simple, reach=VOLUNTARY_L1)
+    assert ("has_employer_change",) in flips
+    assert ("has_single_employer", "has_correct_wage_tax") in flips
+    assert all("has_single_employer" not in combo or len(combo) == 2 for combo in flips)
+
+
+def test_vectorized_batch_analysis():
+    wage = np.array([14500.0, 20000.0, 5000.0, np.nan])
+    non_wage = np.array([0.0, 700.0, 0.0, 0.0])
+    entity = TaxEntity(id="b", name="b", entity_type="Person", has_incorrect_commuter_allowance=True)
+    flags = np.full(4, pack_flags(entity), dtype=np.uint32)
+
+    distance = distance_to_flip(rules, wage, non_wage, flags)
+    assert np.round(distance, 2).tolist() == [17.01, -5483.0, 9517.01, 14517.01]
+
+    mask = near_threshold(rules, wage, non_wage, flags, margin=50.0)
+    assert list(mask) == [True, True, False, False]
+
+    flips = single_flag_flips(rules, wage, non_wage, flags, leave=TAX.MandatoryL1Filer)
+    assert list(flips["has_incorrect_commuter_allowance"]) == [False, True, False, False]
+
+
+if __name__ == "__main__":
+    test_wage_needed_for_mandatory_l1()
+    test_flag_counterfactuals()
+    test_vectorized_batch_analysis()
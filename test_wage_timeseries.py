@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests for deriving flags from monthly wage time series."""
+
+import numpy as np
+from compiled_rules import FLAG_BITS
+from tax_reasoning_engine import TaxReasoningEngine, TaxEntity, TAX, PERSON_KB
+from wage_timeseries import derive_flags, derive_from_employments, apply_to_flags, with_monthly_wages
+
+
+def test_varying_income_and_rollup():
+    monthly = np.array([
+        [2500.0] * 12,                      # steady
+        [1500.0] * 6 + [4000.0] * 6,        # varying, rolled up by the employer
+        [0.0] * 3 + [2500.0] * 9,           # part of the year
+        [0.0] * 12,                         # no wages
+    ])
+    derived = derive_flags(monthly)
+    assert list(derived["annual_income"]) == [30000.0, 33000.0, 22500.0, 0.0]
+    assert list(derived["has_varying_income_no_rollup"]) == [False, False, True, False]
+    not_rolled = derive_flags(monthly, rolled_up=np.zeros(4, dtype=bool))
+    assert list(not_rolled["has_varying_income_no_rollup"]) == [False, True, True, False]
+
+    # Two consecutive employers: the full year is covered but nobody rolled it up
+    employments = np.array([[2000.0] * 6 + [0.0] * 6, [0.0] * 6 + [3000.0] * 6, [2500.0] * 12])
+    derived = derive_from_employments(employments, np.array([0, 0, 1]), persons=2)
+    assert list(derived["has_varying_income_no_rollup"]) == [True, False]
+
+
+def test_sv_eligibility_and_flag_columns():
+    monthly = np.array([[900.0] * 12, [400.0] * 12, [3000.0] * 12])
+    derived = derive_flags(monthly, year=2025)
+    # Marginal employment pays no SV; the high wage pays wage tax
+    assert list(derived["has_sv_repayment_eligibility"]) == [True, False, False]
+
+    sv_bit = FLAG_BITS[TAX.hasSVRepaymentEligibility]
+    flags = apply_to_flags(np.array([0, sv_bit, sv_bit], dtype=np.uint32), derived)
+    assert list(flags & sv_bit) == [sv_bit, 0, 0]
+
+    entities = [TaxEntity(id=str(i), name=str(i), entity_type="Person") for i in range(3)]
+    updated = with_monthly_wages(entities, monthly)
+    assert updated[0].annual_income == 10800.0 and updated[0].has_sv_repayment_eligibility
+    assert entities[0].annual_income is None
+
+
+def test_engine_ingests_monthly_wages():
+    engine = TaxReasoningEngine(ontology_path="austrian_tax_ontology_resident_only.ttl")
+    entities = [TaxEntity(id=f"Monthly_{i}", name=str(i), entity_type="Person") for i in range(2)]
+    monthly = np.array([[2500.0] * 12, [1500.0] * 6 + [4000.0] * 6])
+    engine.ingest_monthly_wages(entities, monthly, rolled_up=np.zeros(2, dtype=bool))
+    steady, varying = (engine.determine_filing_requirement(e.id) for e in entities)
+    assert steady["filing_requirement"] == "NoFilingRequired"
+    # Varying wages without a December roll-up make voluntary filing worthwhile
+    assert varying["filing_requirement"] == "VoluntaryFilingL1"
+    assert float(engine.graph.value(PERSON_KB["Monthly_1"], TAX.hasAnnualWageIncome)) == 33000.0
+
+
+if __name__ == "__main__":
+    test_varying_income_and_rollup()
+    test_sv_eligibility_and_flag_columns()
+    test_engine_ingests_monthly_wages()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Threshold sensitivity and counterfactual analysis.
+Answers "at what income would the status change?" and "which flag changes
+would flip the decision?" directly from the compiled rules. The filing status
+is piecewise constant along each income axis, changing only at rule
+thresholds, so evaluating one point on each side of every threshold is exact.
+"""
+
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple, Union
+from dataclasses import dataclass
+import numpy as np
+from rdflib import URIRef
+
+from tax_reasoning_engine import TAX, TaxEntity, FLAG_PROPERTIES
+from compiled_rules import (CompiledRuleSet, CLASS_BITS, FLAG_BITS, STATUS_NAMES,
+                            pack_flags, status_of, status_of_columns)
+
+
+# Smallest income step considered (one cent)
+DEFAULT_RESOLUTION = 0.01
+
+Target = Union[int, URIRef]  # a status code or a filer class
+
+
+@dataclass(frozen=True)
+class ThresholdDistance:
+    """How far an income is from one rule threshold and what crossing it does"""
+    prop: URIRef
+    threshold: float
+    op: str
+    crossing_value: float
+    distance: float  # signed: positive means the income has to rise
+    status_before: str
+    status_after: str
+
+    @property
+    def changes_status(self) -> bool:
+        return self.status_before != self.status_after
+
+
+def _field_values(entity: TaxEntity) -> Tuple[float, float, int]:
+    wage = entity.annual_income if entity.annual_income is not None else 0.0
+    non_wage = entity.has_non_wage_income if entity.has_non_wage_income is not None else 0.0
+    return float(wage), float(non_wage), pack_flags(entity)
+
+
+def boundary_points(op: str, threshold: float, resolution: float) -> Tuple[float, float]:
+    """Last value below and first value above the point where a comparison flips"""
+    if op in (">=", "<"):
+        return threshold - resolution, threshold
+    return threshold, threshold + resolution
+
+
+def _matches(membership, target: Target):
+    if isinstance(target, URIRef):
+        return (membership & CLASS_BITS[target]) != 0
+    if isinstance(membership, np.ndarray):
+        return status_of_columns(membership) == target
+    return status_of(membership) == target
+
+
+def relevant_flag_fields(rules: CompiledRuleSet) -> List[str]:
+    """TaxEntity flag fields referenced by at least one rule clause"""
+    used = {f.prop for rule in rules.rules for clause in rule.clauses for f in clause.flags}
+    return [field_name for field_name, prop, _ in FLAG_PROPERTIES if prop in used]
+
+
+def threshold_distances(rules: CompiledRuleSet, entity: TaxEntity,
+                        resolution: float = DEFAULT_RESOLUTION) -> List[ThresholdDistance]:
+    """Distance from the entity's incomes to every threshold, with the status on the far side"""
+    wage, non_wage, flags = _field_values(entity)
+    current = status_of(rules.classify(wage, non_wage, flags))
+    results = []
+    for t in rules.thresholds():
+        value = wage if t.prop == TAX.hasAnnualWageIncome else non_wage
+        below, above = boundary_points(t.op, t.value, resolution)
+        # Which side the income is on follows the rule's own comparison, so sub-cent
+        # incomes next to a threshold are placed like classify() places them
+        upper_side = value >= t.value if t.op in (">=", "<") else value > t.value
+        crossing = below if upper_side else above
+        probe = {TAX.hasAnnualWageIncome: wage, TAX.hasNonWageIncome: non_wage}
+        probe[t.prop] = crossing
+        after = status_of(rules.classify(probe[TAX.hasAnnualWageIncome], probe[TAX.hasNonWageIncome], flags))
+        results.append(ThresholdDistance(t.prop, t.value, t.op, crossing, round(crossing - value, 10),
+                                         STATUS_NAMES[current], STATUS_NAMES[after]))
+    return results
+
+
+def income_for_target(rules: CompiledRuleSet, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                      flags: np.ndarray, target: Target, prop: URIRef = TAX.hasAnnualWageIncome,
+                      resolution: float = DEFAULT_RESOLUTION) -> np.ndarray:
+    """
+    Nearest value of one income (all other facts fixed) at which each row reaches target.
+    Rows that already match return their own value; unreachable rows return NaN.
+    """
+    wage = np.nan_to_num(np.asarray(annual_income, dtype=np.float64))
+    non_wage = np.nan_to_num(np.asarray(non_wage_income, dtype=np.float64))
+    flags = np.asarray(flags)
+    current = wage if prop == TAX.hasAnnualWageIncome else non_wage
+
+    best = np.where(_matches(rules.classify_columns(wage, non_wage, flags), target), current, np.nan)
+    for t in rules.thresholds():
+        if t.prop != prop:
+            continue
+        for point in boundary_points(t.op, t.value, resolution):
+            candidate = np.full(len(flags), point)
+            if prop == TAX.hasAnnualWageIncome:
+                membership = rules.classify_columns(candidate, non_wage, flags)
+            else:
+                membership = rules.classify_columns(wage, candidate, flags)
+            hit = _matches(membership, target)
+            closer = hit & (np.isnan(best) | (np.abs(candidate - current) < np.abs(best - current)))
+            best = np.where(closer, candidate, best)
+    return best
+
+
+def distance_to_flip(rules: CompiledRuleSet, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                     flags: np.ndarray, prop: URIRef = TAX.hasAnnualWageIncome,
+                     resolution: float = DEFAULT_RESOLUTION) -> np.ndarray:
+    """Signed distance along one income to the nearest status change (NaN if it never changes)"""
+    wage = np.nan_to_num(np.asarray(annual_income, dtype=np.float64))
+    non_wage = np.nan_to_num(np.asarray(non_wage_income, dtype=np.float64))
+    flags = np.asarray(flags)
+    current = wage if prop == TAX.hasAnnualWageIncome else non_wage
+    status = status_of_columns(rules.classify_columns(wage, non_wage, flags))
+
+    best = np.full(len(flags), np.nan)
+    for t in rules.thresholds():
+        if t.prop != prop:
+            continue
+        for point in boundary_points(t.op, t.value, resolution):
+            candidate = np.full(len(flags), point)
+            if prop == TAX.hasAnnualWageIncome:
+                membership = rules.classify_columns(candidate, non_wage, flags)
+            else:
+                membership = rules.classify_columns(wage, candidate, flags)
+            changed = status_of_columns(membership) != status
+            delta = candidate - current
+            closer = changed & (np.isnan(best) | (np.abs(delta) < np.abs(best)))
+            best = np.where(closer, delta, best)
+    return best
+
+
+def near_threshold(rules: CompiledRuleSet, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                   flags: np.ndarray, margin: float, resolution: float = DEFAULT_RESOLUTION) -> np.ndarray:
+    """Rows whose status changes if either income moves by at most margin"""
+    mask = np.zeros(len(flags), dtype=bool)
+    for prop in (TAX.hasAnnualWageIncome, TAX.hasNonWageIncome):
+        distance = distance_to_flip(rules, annual_income, non_wage_income, flags, prop, resolution)
+        mask |= np.abs(np.nan_to_num(distance, nan=np.inf)) <= margin
+    return mask
+
+
+def single_flag_flips(rules: CompiledRuleSet, annual_income: np.ndarray, non_wage_income: np.ndarray,
+                      flags: np.ndarray, reach: Optional[Target] = None,
+                      leave: Optional[Target] = None) -> Dict[str, np.ndarray]:
+    """
+    For each rule-relevant flag, which rows would newly reach (or stop matching)
+    the target by toggling that flag alone.
+    """
+    wage = np.nan_to_num(np.asarray(annual_income, dtype=np.float64))
+    non_wage = np.nan_to_num(np.asarray(non_wage_income, dtype=np.float64))
+    flags = np.asarray(flags)
+    props = {field_name: prop for field_name, prop, _ in FLAG_PROPERTIES}
+    before = rules.classify_columns(wage, non_wage, flags)
+    results = {}
+    for field_name in relevant_flag_fields(rules):
+        membership = rules.classify_columns(wage, non_wage, flags ^ FLAG_BITS[props[field_name]])
+        ok = np.ones(len(flags), dtype=bool)
+        if reach is not None:
+            ok &= ~_matches(before, reach) & _matches(membership, reach)
+        if leave is not None:
+            ok &= _matches(before, leave) & ~_matches(membership, leave)
+        results[field_name] = ok
+    return results
+
+
+def minimal_flag_flips(rules: CompiledRuleSet, entity: TaxEntity, reach: Optional[Target] = None,
+                       leave: Optional[Target] = None, max_size: int = 2) -> List[Tuple[str, ...]]:
+    """
+    Smallest sets of flag toggles that make the entity reach and/or leave a target.
+    Only flags used by the rules are considered; supersets of a found set are skipped.
+    Returns [()] when the entity already satisfies the request.
+    """
+    if reach is None and leave is None:
+        raise ValueError("Specify a status or class to reach or to leave")
+    wage, non_wage, flags = _field_values(entity)
+    membership = rules.classify(wage, non_wage, flags)
+    if (reach is None or _matches(membership, reach)) and (leave is None or not _matches(membership, leave)):
+        return [()]
+    props = {field_name: prop for field_name, prop, _ in FLAG_PROPERTIES}
+    fields = relevant_flag_fields(rules)
+
+    found: List[Tuple[str, ...]] = []
+    for size in range(1, max_size + 1):
+        for combo in combinations(fields, size):
+            if any(set(smaller) <= set(combo) for smaller in found):
+                continue
+            toggled = flags
+            for field_name in combo:
+                toggled ^= FLAG_BITS[props[field_name]]
+            membership = rules.classify(wage, non_wage, toggled)
+            if reach is not None and not _matches(membership, reach):
+                continue
+            if leave is not None and _matches(membership, leave):
+                continue
+            found.append(combo)
+    return found
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Monthly wage time series.
+Derives has_varying_income_no_rollup and has_sv_repayment_eligibility from
+per-month wages instead of asking callers to precompute them. Everything
+works on a (persons x 12) matrix in one vectorized pass; per-employment
+matrices are reduced to persons with np.add.at.
+
+Wage tax is withheld month by month, so it is only correct for a year if
+the monthly wage was steady, or if the employer rolled up (Aufrollung) the
+whole year in December, which requires employment by that employer in all
+twelve months.
+"""
+
+from dataclasses import replace
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+
+from tax_reasoning_engine import TaxEntity
+from compiled_rules import set_flag_column
+from income_tax import TaxYear, tax_year, withheld_tax
+
+
+MONTHS = 12
+
+# Monthly marginal earnings limit (Geringfuegigkeitsgrenze): below it no employee SV is paid
+MARGINAL_EARNINGS_LIMIT = {2024: 518.44, 2025: 551.10}
+
+# Relative spread (std / mean) of the monthly wage above which income counts as varying
+DEFAULT_TOLERANCE = 0.15
+
+
+def _check_matrix(monthly: np.ndarray) -> np.ndarray:
+    monthly = np.asarray(monthly, dtype=np.float64)
+    if np.isnan(monthly).any():
+        monthly = np.nan_to_num(monthly)
+    if monthly.ndim != 2 or monthly.shape[1] != MONTHS:
+        raise ValueError(f"Expected a (rows x {MONTHS}) monthly wage matrix, got shape {monthly.shape}")
+    return monthly
+
+
+def person_matrix(employment_wages: np.ndarray, person_index: np.ndarray, persons: int) -> np.ndarray:
+    """Sum (employments x 12) wages into a (persons x 12) matrix"""
+    employment_wages = _check_matrix(employment_wages)
+    monthly = np.zeros((persons, MONTHS))
+    np.add.at(monthly, np.asarray(person_index), employment_wages)
+    return monthly
+
+
+def monthly_variation(monthly: np.ndarray) -> np.ndarray:
+    """Coefficient of variation of the wage over the months actually paid (0 when never paid)"""
+    monthly = _check_matrix(monthly)
+    paid = monthly > 0.0
+    months = paid.sum(axis=1)
+    safe_months = np.maximum(months, 1)
+    mean = monthly.sum(axis=1) / safe_months
+    variance = (((monthly - mean[:, None]) ** 2) * paid).sum(axis=1) / safe_months
+    return np.divide(np.sqrt(variance), mean, out=np.zeros_like(mean), where=mean > 0.0)
+
+
+def varying_income(monthly: np.ndarray, tolerance: float = DEFAULT_TOLERANCE) -> np.ndarray:
+    """Wage levels vary, or wages were paid for only part of the year"""
+    monthly = _check_matrix(monthly)
+    months = (monthly > 0.0).sum(axis=1)
+    part_year = (months > 0) & (months < MONTHS)
+    return part_year | (monthly_variation(monthly) > tolerance)
+
+
+def sv_repayment_eligible(monthly: np.ndarray, year: Union[int, TaxYear] = 2025) -> np.ndarray:
+    """
+    Low pay that still carries employee SV contributions: the annual wage tax
+    is fully offset by the credits, and at least one month is above the
+    marginal earnings limit.
+    """
+    monthly = _check_matrix(monthly)
+    params = tax_year(year)
+    if params.year not in MARGINAL_EARNINGS_LIMIT:
+        raise ValueError(f"No marginal earnings limit for {params.year}")
+    annual = monthly.sum(axis=1)
+    insured = (monthly > MARGINAL_EARNINGS_LIMIT[params.year]).any(axis=1)
+    return insured & (annual > 0.0) & (withheld_tax(annual, params) == 0.0)
+
+
+def derive_flags(monthly: np.ndarray, rolled_up: Optional[np.ndarray] = None,
+                 year: Union[int, TaxYear] = 2025,
+                 tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, np.ndarray]:
+    """
+    Annual income and the two derived flags for a (persons x 12) matrix.
+    rolled_up marks persons whose employer rolled up the year; by default
+    that is assumed whenever wages were paid in all twelve months.
+    """
+    monthly = _check_matrix(monthly)
+    if rolled_up is None:
+        rolled_up = (monthly > 0.0).all(axis=1)
+    return {
+        "annual_income": monthly.sum(axis=1),
+        "has_varying_income_no_rollup": varying_income(monthly, tolerance) & ~np.asarray(rolled_up, dtype=bool),
+        "has_sv_repayment_eligibility": sv_repayment_eligible(monthly, year),
+    }
+
+
+def derive_from_employments(employment_wages: np.ndarray, person_index: np.ndarray, persons: int,
+                            rolled_up: Optional[np.ndarray] = None, year: Union[int, TaxYear] = 2025,
+                            tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, np.ndarray]:
+    """
+    derive_flags for per-employment wages. An employer can only roll up its
+    own payments, so a person counts as rolled up only with a single
+    employment that was rolled up (by default: paid in all twelve months).
+    """
+    employment_wages = _check_matrix(employment_wages)
+    person_index = np.asarray(person_index)
+    if rolled_up is None:
+        rolled_up = (employment_wages > 0.0).all(axis=1)
+    employments = np.bincount(person_index, minlength=persons)
+    rolled = np.bincount(person_index, weights=np.asarray(rolled_up, dtype=np.float64), minlength=persons)
+    person_rolled_up = (employments == 1) & (rolled == 1)
+    monthly = person_matrix(employment_wages, person_index, persons)
+    return derive_flags(monthly, person_rolled_up, year, tolerance)
+
+
+def apply_to_flags(flags: np.ndarray, derived: Dict[str, np.ndarray]) -> np.ndarray:
+    """Overwrite the derived flag bits in a packed flags column"""
+    for field_name in ("has_varying_income_no_rollup", "has_sv_repayment_eligibility"):
+        flags = set_flag_column(flags, field_name, derived[field_name])
+    return flags
+
+
+def with_monthly_wages(entities: Sequence[TaxEntity], monthly: np.ndarray,
+                       rolled_up: Optional[np.ndarray] = None, year: Union[int, TaxYear] = 2025,
+                       tolerance: float = DEFAULT_TOLERANCE) -> List[TaxEntity]:
+    """Copies of the entities with annual_income and both flags derived from their monthly wages"""
+    derived = derive_flags(monthly, rolled_up, year, tolerance)
+    if len(entities) != len(derived["annual_income"]):
+        raise ValueError(f"Got {len(entities)} entities but {len(derived['annual_income'])} wage rows")
+    return [
+        replace(entity,
+                annual_income=round(float(derived["annual_income"][row]), 2),
+                has_varying_income_no_rollup=bool(derived["has_varying_income_no_rollup"][row]),
+                has_sv_repayment_eligibility=bool(derived["has_sv_repayment_eligibility"][row]))
+        for row, entity in enumerate(entities)
+    ]